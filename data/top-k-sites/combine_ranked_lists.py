@@ -3,36 +3,93 @@ Combine multiple ranked lists to a single one using the Dowdall rule,
 see https://en.wikipedia.org/wiki/Borda_count#Dowdall
 """
 
-import fileinput
-import sys
+import argparse
+import gzip
+import logging
 
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 
-def combine_sorted_with_rank(input, sep: str = ','):
-    """Fast combination of multiple ranked lists where ranks are given
-    and the concatenated lists are sorted by values. The highest rank
-    must be '1', the rank field is expected to be the first field in a
-    line."""
 
-    last_value = None
-    combined_rank = 0
+logging.basicConfig(level='INFO',
+                    format='%(asctime)s %(levelname)s %(name)s: %(message)s')
 
-    for line in input:
-        try:
-            (rank, value) = line.rstrip('\r\n').split(sep, 1)
-            if value == last_value:
-                combined_rank += 1/int(rank)
-            else:
-                if last_value is not None:
-                    print(combined_rank, last_value, sep=sep)
-                combined_rank = 1/int(rank)
-                last_value = value
-        except Exception as e:
-            sys.stderr.write('Failed to read line <' + line + '>: ' + str(e))
-            exit(1)
 
-    if last_value is not None:
-        print(combined_rank, last_value, sep=sep)
+combined_list_schema = pa.schema([
+    pa.field('rank',    pa.int32()),
+    pa.field('host',    pa.string()),
+    pa.field('score',   pa.float64())
+])
+
+
+def read_ranked_list(path: str, sep: str = ',') -> tuple:
+    """Read a ranked list (lines `rank,value`, optionally compressed,
+    e.g. a zipped Tranco list), return the values as Arrow array and
+    the ranks as NumPy array"""
+    df = pd.read_csv(path, sep=sep, header=None, names=['rank', 'value'],
+                     dtype={'rank': 'int64', 'value': str},
+                     keep_default_na=False, compression='infer')
+    return pa.array(df['value'], type=pa.string()), df['rank'].to_numpy()
+
+
+def combine_ranked_lists(paths: list, sep: str = ',') -> pa.Table:
+    """Combine ranked lists by the Dowdall rule (sum of 1/rank over all
+    lists). The lists are read one by one, values are dictionary-encoded
+    and the scores are accumulated per dictionary index, no sorting of
+    the input is required. Returns a table with the columns rank, host
+    and score, sorted by descending score. Ties are ordered by the value
+    (byte order, same as `sort` run in the C locale)."""
+    values, weights = [], []
+    for path in paths:
+        v, ranks = read_ranked_list(path, sep)
+        logging.info('Read %d ranks from %s', len(v), path)
+        values.append(v)
+        weights.append(1.0 / ranks)
+    values = pa.chunked_array(values, type=pa.string())
+    weights = np.concatenate(weights)
+
+    dictionary = pc.unique(values)
+    indices = pc.index_in(values, value_set=dictionary)
+    indices = indices.to_numpy()
+    scores = np.bincount(indices, weights=weights, minlength=len(dictionary))
+    logging.info('Combined %d ranks into %d unique values', len(values), len(dictionary))
+
+    table = pa.table({'host': dictionary, 'score': scores})
+    table = table.sort_by([('score', 'descending'), ('host', 'ascending')])
+    ranks = pa.array(np.arange(1, table.num_rows + 1, dtype=np.int32))
+    return pa.table([ranks, table['host'], table['score']], schema=combined_list_schema)
+
+
+def write_ranked_list_text(table: pa.Table, path: str):
+    """Write the combined list as text (lines `rank<TAB>host`),
+    gzip-compressed if the file name ends with `.gz`"""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'wt', encoding='utf-8') as fh:
+        for rank, host in zip(table['rank'].to_numpy(), table['host'].to_pylist()):
+            fh.write('%d\t%s\n' % (rank, host))
 
 
 if __name__ == "__main__":
-    combine_sorted_with_rank(fileinput.input())
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('output',
+                        help='Output file (Parquet, zstd-compressed)'
+                        ' with the columns rank, host and score')
+    parser.add_argument('input', nargs='+',
+                        help='Ranked lists (CSV, `rank,host` per line),'
+                        ' optionally compressed (.gz, .zip, etc.)')
+    parser.add_argument('--output_text', default=None,
+                        help='Write the combined list additionally as text'
+                        ' (`rank<TAB>host` per line, gzip-compressed if the name ends with .gz)')
+    parser.add_argument('--sep', default=',',
+                        help='Separator between rank and host in the input lists')
+    args = parser.parse_args()
+
+    table = combine_ranked_lists(args.input, args.sep)
+    pq.write_table(table, args.output, compression='zstd')
+    logging.info('Combined ranked list saved to %s', args.output)
+    if args.output_text:
+        write_ranked_list_text(table, args.output_text)
+        logging.info('Combined ranked list saved to %s', args.output_text)
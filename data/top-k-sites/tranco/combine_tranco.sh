@@ -2,12 +2,7 @@
 
 DIR=$(dirname $0)
 
-for l in "$DIR"/*-subdomain/*; do
-    zcat "$l"
-done \
-    | sort -t, -k2,2 \
-    | python3 "$DIR"/../combine_ranked_lists.py \
-    | sort -t, -k1,1gr \
-    | cut -d, -f2 \
-    | perl -lne 'print $., "\t", $_' \
-    | gzip >"$DIR"/tranco_combined.txt.gz
\ No newline at end of file
+python3 "$DIR"/../combine_ranked_lists.py \
+    --output_text "$DIR"/tranco_combined.txt.gz \
+    "$DIR"/tranco_combined_scores.zstd.parquet \
+    "$DIR"/*-subdomain/*
\ No newline at end of file
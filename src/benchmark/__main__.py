@@ -0,0 +1,219 @@
+"""Generate benchmark data, run benchmarks and compare results.
+
+    cd src/
+    python -m benchmark generate /tmp/benchmark --sizes 10k 1M 10M
+    python -m benchmark run --data /tmp/benchmark --size 1M --output baseline.json
+    # ... change the code ...
+    python -m benchmark run --data /tmp/benchmark --size 1M --output results.json
+    python -m benchmark compare baseline.json results.json
+"""
+
+import argparse
+import gc
+import logging
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+from datetime import datetime, timezone
+
+from benchmark import synthetic
+from benchmark.benchmarks import Context, SkipBenchmark, benchmarks
+
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+
+# the imported scripts configure logging on level INFO,
+# keep the benchmark output readable
+logging.getLogger().setLevel(logging.WARNING)
+
+
+def log(msg, *args):
+    sys.stderr.write((msg % args) + '\n')
+
+
+def generate(args):
+    os.makedirs(os.path.join(args.data_dir, 'warc'), exist_ok=True)
+    for i in range(args.warc_files):
+        path = synthetic.warc_path(args.data_dir, i)
+        synthetic.write_warc(path, args.warc_records, args.seed + i)
+        log('WARC file %s written (%d records)', path, args.warc_records)
+    path = synthetic.rulesets_path(args.data_dir)
+    synthetic.write_rulesets(path, args.rulesets, args.seed)
+    log('Rulesets written to %s', path)
+    for size in args.sizes:
+        path = synthetic.capture_table_path(args.data_dir, size)
+        synthetic.write_capture_table(path, synthetic.parse_size(size), args.seed)
+        log('Capture table written to %s (%s rows)', path, size)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return None
+
+
+def package_versions() -> dict:
+    versions = dict()
+    for module in ('numpy', 'pandas', 'pyarrow', 'warcio', 'ujson'):
+        try:
+            versions[module] = __import__(module).__version__
+        except (ImportError, AttributeError):
+            pass
+    return versions
+
+
+def time_benchmark(run, repeat: int, warmup: int) -> list:
+    for _ in range(warmup):
+        run()
+    times = list()
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def run_benchmarks(args):
+    ctx = Context(args.data, args.size, args.seed, args.payloads)
+    pattern = re.compile(args.filter) if args.filter else None
+    results = dict()
+    for name, (suite, func) in benchmarks.items():
+        if suite not in args.suite:
+            continue
+        if pattern and not pattern.search(name):
+            continue
+        try:
+            run, n_items = func(ctx)
+        except SkipBenchmark as e:
+            log('%-40s skipped: %s', name, e)
+            results[name] = {'suite': suite, 'skipped': str(e)}
+            continue
+        try:
+            times = time_benchmark(run, args.repeat, args.warmup)
+        finally:
+            if hasattr(run, 'cleanup'):
+                run.cleanup()
+        best = min(times)
+        results[name] = {
+            'suite': suite,
+            'items': n_items,
+            'times': times,
+            'min': best,
+            'median': statistics.median(times),
+            'mean': statistics.mean(times),
+            'items_per_sec': (n_items / best) if best > 0 else None,
+        }
+        log('%-40s %10.4f s (min of %d) %12.0f items/s',
+            name, best, len(times), results[name]['items_per_sec'] or 0)
+
+    report = {
+        'meta': {
+            'time': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'git_commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'packages': package_versions(),
+            'args': {k: v for k, v in vars(args).items() if k != 'func'},
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(report, fh, indent=1)
+        log('Results saved to %s', args.output)
+
+
+def compare(args):
+    with open(args.baseline) as fh:
+        baseline = json.load(fh)['results']
+    with open(args.results) as fh:
+        results = json.load(fh)['results']
+    regressions = 0
+    print('%-40s %12s %12s %8s' % ('benchmark', 'baseline', 'result', 'ratio'))
+    for name, res in results.items():
+        base = baseline.get(name)
+        if base is None or 'min' not in base or 'min' not in res:
+            continue
+        if base.get('items') != res.get('items'):
+            # different input sizes, compare per item
+            ratio = (res['min'] / res['items']) / (base['min'] / base['items'])
+        else:
+            ratio = res['min'] / base['min']
+        flag = ''
+        if ratio > 1 + args.threshold:
+            flag = 'slower'
+            regressions += 1
+        elif ratio < 1 - args.threshold:
+            flag = 'faster'
+        print('%-40s %12.4f %12.4f %8.2f %s' % (name, base['min'], res['min'], ratio, flag))
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog='python -m benchmark', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    p = subparsers.add_parser('generate', help='Generate benchmark data',
+                              formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    p.add_argument('data_dir', help='Output directory')
+    p.add_argument('--sizes', nargs='+', default=['10k', '1M'],
+                   help='Number of rows of the capture tables (suffixes k and M allowed)')
+    p.add_argument('--warc_files', type=int, default=2,
+                   help='Number of WARC files')
+    p.add_argument('--warc_records', type=int, default=5000,
+                   help='Number of robots.txt captures per WARC file')
+    p.add_argument('--rulesets', type=int, default=20000,
+                   help='Number of rulesets (input of classify_robotstxt_rulesets.py)')
+    p.add_argument('--seed', type=int, default=0,
+                   help='Seed of the random number generators')
+    p.set_defaults(func=generate)
+
+    p = subparsers.add_parser('run', help='Run benchmarks',
+                              formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    p.add_argument('--data', required=True,
+                   help='Directory with the generated benchmark data')
+    p.add_argument('--size', default='10k',
+                   help='Size of the capture table used by the benchmarks')
+    p.add_argument('--suite', nargs='+', default=['micro', 'macro'],
+                   choices=['micro', 'macro'], help='Benchmark suites to run')
+    p.add_argument('--filter', default=None,
+                   help='Run only benchmarks whose name matches this regular expression')
+    p.add_argument('--repeat', type=int, default=5,
+                   help='Number of timed runs per benchmark')
+    p.add_argument('--warmup', type=int, default=1,
+                   help='Number of untimed runs per benchmark')
+    p.add_argument('--payloads', type=int, default=1000,
+                   help='Number of robots.txt payloads of the parser micro-benchmarks')
+    p.add_argument('--seed', type=int, default=0,
+                   help='Seed of the random number generators'
+                   ' (payloads generated in memory)')
+    p.add_argument('--output', default=None,
+                   help='Save results to this JSON file')
+    p.set_defaults(func=run_benchmarks)
+
+    p = subparsers.add_parser('compare', help='Compare results of two benchmark runs',
+                              formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    p.add_argument('baseline', help='Results of the baseline run (JSON)')
+    p.add_argument('results', help='Results to compare with the baseline (JSON)')
+    p.add_argument('--threshold', type=float, default=0.1,
+                   help='Relative change of the min. time flagged as slower or faster')
+    p.add_argument('--fail_on_regression', action='store_true',
+                   help='Exit with status 1 if any benchmark is slower')
+    p.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    args.func(args)
@@ -0,0 +1,356 @@
+"""Micro- and macro-benchmarks.
+
+Every benchmark is a function registered by the decorator `benchmark`.
+It receives the benchmark context and prepares its input (not timed),
+then returns a tuple (run, n_items): `run` is the callable to be timed
+and `n_items` the number of items (payloads, records, rows) processed
+per call, used to report the throughput. A benchmark which cannot run
+in the current environment (e.g. PySpark not installed or input data
+not generated) raises `SkipBenchmark`.
+
+Micro-benchmarks measure single functions on in-memory inputs,
+macro-benchmarks measure whole processing steps on the generated data
+(WARC files, capture tables and rulesets), see `synthetic.py`.
+"""
+
+import argparse
+import glob
+import io
+import os
+import shutil
+import tempfile
+
+from collections import Counter, OrderedDict
+
+import pandas as pd
+
+from warcio.archiveiterator import ArchiveIterator
+
+import robotstxt_parser
+
+from benchmark import reference, synthetic
+from classify_robotstxt_rulesets import classify_robotstxt_rules, classify_rulesets, read_rulesets
+from get_robotstxt_download_list import is_robotstxt_mime_type, robotstxt_download_list
+from get_robotstxt_ranked_list import fetch_status_classify, robotstxt_ranked_list
+from robotstxt_metrics import (explode_ruleset_classes, robotstxt_status_counts_topk,
+                               user_agent_counts_topk)
+
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+
+class SkipBenchmark(Exception):
+    """Raised by a benchmark which cannot run in the current environment"""
+    pass
+
+
+# registered benchmarks: name -> (suite, function)
+benchmarks = OrderedDict()
+
+
+def benchmark(suite: str, name: str):
+    """Register a benchmark function in a suite (`micro` or `macro`)"""
+    def register(func):
+        benchmarks[name] = (suite, func)
+        return func
+    return register
+
+
+class Context:
+    """Inputs of the benchmarks: payloads are generated in memory from the
+    seed, all other inputs are read from the data directory (see `python
+    -m benchmark generate`). Inputs are created once and shared by all
+    benchmarks."""
+
+    def __init__(self, data_dir: str, size: str, seed: int = 0, n_payloads: int = 1000):
+        self.data_dir = data_dir
+        self.size = size
+        self.seed = seed
+        self.n_payloads = n_payloads
+        self._inputs = dict()
+
+    def get(self, name: str, create):
+        if name not in self._inputs:
+            self._inputs[name] = create()
+        return self._inputs[name]
+
+    @staticmethod
+    def require(path: str) -> str:
+        if not os.path.exists(path):
+            raise SkipBenchmark('input %s not found, run `python -m benchmark generate`' % path)
+        return path
+
+    def warc_data(self) -> list:
+        """Content of the WARC files (read once, not timed)"""
+        def read():
+            pattern = synthetic.warc_pattern(self.data_dir)
+            paths = sorted(glob.glob(pattern))
+            if not paths:
+                raise SkipBenchmark('no WARC files %s, run `python -m benchmark generate`'
+                                    % pattern)
+            data = list()
+            for path in paths:
+                with open(path, 'rb') as fh:
+                    data.append(fh.read())
+            return data
+        return self.get('warc_data', read)
+
+    def n_warc_records(self) -> int:
+        return self.get('n_warc_records',
+                        lambda: sum(1 for data in self.warc_data()
+                                    for _ in ArchiveIterator(io.BytesIO(data))))
+
+    def captures(self) -> pd.DataFrame:
+        """Capture table of the selected size (all crawls)"""
+        def read():
+            path = self.require(synthetic.capture_table_path(self.data_dir, self.size))
+            return pd.read_parquet(path)
+        return self.get('captures', read)
+
+    def ranked_captures(self) -> pd.DataFrame:
+        """Capture table with fetch status and MIME type classified, and
+        whether rules were extracted, as used in the metrics notebook"""
+        def create():
+            df = self.captures().copy()
+            df['robotstxt_fetch_status'] = df['fetch_status'].map(fetch_status_classify)
+            df['is_robotstxt_mime_type'] = is_robotstxt_mime_type(df)
+            # about every second robots.txt has rules
+            df['robotstxt_parsed'] = (df['rank'] % 2 == 0)
+            return df
+        return self.get('ranked_captures', create)
+
+    def ruleset_classes(self) -> pd.DataFrame:
+        return self.get('ruleset_classes',
+                        lambda: synthetic.ruleset_classes_table(self.captures(), self.seed))
+
+    def top_k_list(self) -> list:
+        """Top-k strata as in the metrics notebook, up to the max. rank"""
+        max_rank = int(self.captures()['rank'].max())
+        top_k_list = [(name, k) for name, k in (('1k', 1_000), ('10k', 10_000),
+                                                ('50k', 50_000), ('100k', 100_000),
+                                                ('1M', 1_000_000))
+                      if k < max_rank]
+        top_k_list.append(('all', max_rank))
+        return top_k_list
+
+
+# micro-benchmarks
+
+def _bodies(ctx: Context, kind: str) -> list:
+    n = ctx.n_payloads
+    if kind == 'huge_disallow':
+        # 5k - 20k lines per payload
+        n = max(1, n // 100)
+    return ctx.get('bodies/' + kind, lambda: synthetic.robotstxt_bodies(n, ctx.seed, kind))
+
+
+def _register_parse_benchmarks(kind: str):
+
+    @benchmark('micro', 'parse/' + kind)
+    def bench_parse(ctx):
+        bodies = _bodies(ctx, kind)
+        def run():
+            for payload in bodies:
+                robotstxt_parser.parse(payload)
+        return run, len(bodies)
+
+    @benchmark('micro', 'parse_rulesets/' + kind)
+    def bench_parse_rulesets(ctx):
+        bodies = _bodies(ctx, kind)
+        def run():
+            for payload in bodies:
+                robotstxt_parser.parse(payload, extract_rulesets=True)
+        return run, len(bodies)
+
+
+for _kind in synthetic.robotstxt_kinds:
+    _register_parse_benchmarks(_kind)
+
+
+def _register_tokenize_benchmarks(kind: str):
+    """Single-pass tokenizer vs. the regex cascade it replaced"""
+
+    def payloads(ctx):
+        return ctx.get('payloads/' + kind,
+                       lambda: [p[3:] if p.startswith(robotstxt_parser.bom) else p
+                                for p in _bodies(ctx, kind)])
+
+    @benchmark('micro', 'tokenize/' + kind)
+    def bench_tokenize(ctx):
+        bodies = payloads(ctx)
+        def run():
+            for payload in bodies:
+                for _ in robotstxt_parser.tokenize(payload):
+                    pass
+        return run, len(bodies)
+
+    @benchmark('micro', 'tokenize_regex_cascade/' + kind)
+    def bench_tokenize_regex_cascade(ctx):
+        bodies = payloads(ctx)
+        def run():
+            for payload in bodies:
+                for _ in reference.tokenize_regex_cascade(payload):
+                    pass
+        return run, len(bodies)
+
+
+for _kind in synthetic.robotstxt_kinds:
+    _register_tokenize_benchmarks(_kind)
+
+
+@benchmark('micro', 'classify_robotstxt_rules')
+def bench_classify_robotstxt_rules(ctx):
+    def create():
+        rules = list()
+        for payload in synthetic.robotstxt_bodies(ctx.n_payloads, ctx.seed):
+            result = robotstxt_parser.parse(payload, extract_rulesets=True)
+            if result.ruleset is not None:
+                rules.extend(json.loads(result.ruleset).values())
+        return rules
+    rules = ctx.get('rules', create)
+    def run():
+        for r in rules:
+            classify_robotstxt_rules(r)
+    return run, len(rules)
+
+
+@benchmark('micro', 'fetch_status_classify')
+def bench_fetch_status_classify(ctx):
+    status = ctx.captures()['fetch_status']
+    def run():
+        status.apply(fetch_status_classify)
+    return run, len(status)
+
+
+@benchmark('micro', 'is_robotstxt_mime_type')
+def bench_is_robotstxt_mime_type(ctx):
+    df = ctx.captures()[['content_mime_type', 'content_mime_detected']]
+    def run():
+        is_robotstxt_mime_type(df)
+    return run, df.shape[0]
+
+
+# macro-benchmarks
+
+def _register_process_record_benchmark(name: str, options: list):
+
+    @benchmark('macro', name)
+    def bench_process_record(ctx):
+        try:
+            from robotstxt_statistics import RobotstxtStatsJob
+        except ImportError as e:
+            raise SkipBenchmark('cannot import RobotstxtStatsJob: %s' % e)
+        warc_data = ctx.warc_data()
+        job = RobotstxtStatsJob()
+        parser = argparse.ArgumentParser()
+        job.add_arguments(parser)
+        job.args = parser.parse_args(options)
+        def run():
+            # records of one partition, same as `iterate_records`
+            # called by `process_warcs`, but without Spark
+            job.counts = Counter()
+            robotstxt_parser._parse_result_cache = None
+            for data in warc_data:
+                for record in ArchiveIterator(io.BytesIO(data)):
+                    for _ in job.process_record(record):
+                        pass
+        return run, ctx.n_warc_records()
+
+
+_register_process_record_benchmark('process_record', [])
+_register_process_record_benchmark('process_record/extract_rulesets', ['--extract_rulesets'])
+_register_process_record_benchmark('process_record/parse_cache',
+                                   ['--parse_cache_size', '100000'])
+
+
+@benchmark('macro', 'warc_parse')
+def bench_warc_parse(ctx):
+    """Read the WARC records and parse all response payloads (no Spark
+    required, no filtering by HTTP status or MIME type)"""
+    warc_data = ctx.warc_data()
+    def run():
+        for data in warc_data:
+            for record in ArchiveIterator(io.BytesIO(data)):
+                if record.rec_type == 'response':
+                    robotstxt_parser.parse(record.content_stream().read())
+    return run, ctx.n_warc_records()
+
+
+@benchmark('macro', 'robotstxt_download_list')
+def bench_robotstxt_download_list(ctx):
+    df = ctx.captures()
+    def run():
+        for crawl, d in df.groupby('crawl', sort=False):
+            robotstxt_download_list(d, crawl)
+    return run, df.shape[0]
+
+
+@benchmark('macro', 'robotstxt_ranked_list')
+def bench_robotstxt_ranked_list(ctx):
+    df = ctx.captures()
+    columns = ['host', 'domain', 'rank', 'url', 'fetch_status', 'fetch_redirect',
+               'content_mime_type', 'content_mime_detected']
+    def run():
+        for crawl, d in df.groupby('crawl', sort=False):
+            robotstxt_ranked_list(d[columns].copy(), crawl)
+    return run, df.shape[0]
+
+
+@benchmark('macro', 'classify_rulesets')
+def bench_classify_rulesets(ctx):
+    path = ctx.require(synthetic.rulesets_path(ctx.data_dir))
+    n_rulesets = ctx.get('n_rulesets', lambda: sum(1 for _ in read_rulesets(path)))
+    output_dir = tempfile.mkdtemp(prefix='benchmark-')
+    def run():
+        classify_rulesets(path, os.path.join(output_dir, 'ruleset-classes.parquet'))
+    run.cleanup = lambda: shutil.rmtree(output_dir, ignore_errors=True)
+    return run, n_rulesets
+
+
+@benchmark('macro', 'classify_rulesets/reuse_unchanged')
+def bench_classify_rulesets_reuse_unchanged(ctx):
+    """Classify the rulesets of a crawl where all rulesets are unchanged
+    since the previous crawl (the same input file is classified twice)"""
+    path = ctx.require(synthetic.rulesets_path(ctx.data_dir))
+    n_rulesets = ctx.get('n_rulesets', lambda: sum(1 for _ in read_rulesets(path)))
+    output_dir = tempfile.mkdtemp(prefix='benchmark-')
+    output_path = os.path.join(output_dir, 'ruleset-classes.parquet')
+    reuse = dict()
+    # previous crawl (not timed)
+    classify_rulesets(path, output_path, reuse=reuse)
+    def run():
+        classify_rulesets(path, output_path, reuse=reuse)
+    run.cleanup = lambda: shutil.rmtree(output_dir, ignore_errors=True)
+    return run, n_rulesets
+
+
+@benchmark('macro', 'robotstxt_status_counts_topk')
+def bench_robotstxt_status_counts_topk(ctx):
+    df = ctx.ranked_captures()
+    crawls = sorted(df['crawl'].unique())
+    top_k_list = ctx.top_k_list()
+    def run():
+        robotstxt_status_counts_topk(df, crawls, top_k_list)
+    return run, df.shape[0]
+
+
+@benchmark('macro', 'explode_ruleset_classes')
+def bench_explode_ruleset_classes(ctx):
+    df = ctx.ranked_captures()
+    df_ruleset_classes = ctx.ruleset_classes()
+    def run():
+        explode_ruleset_classes(df, df_ruleset_classes)
+    return run, df_ruleset_classes.shape[0]
+
+
+@benchmark('macro', 'user_agent_counts_topk')
+def bench_user_agent_counts_topk(ctx):
+    df = ctx.get('user_agents',
+                 lambda: explode_ruleset_classes(ctx.ranked_captures(), ctx.ruleset_classes()))
+    crawls = sorted(df['crawl'].unique())
+    top_k_list = ctx.top_k_list()
+    def run():
+        user_agent_counts_topk(df, crawls, top_k_list)
+    return run, df.shape[0]
@@ -0,0 +1,46 @@
+"""Reference implementations of replaced code, kept to compare results
+(parity tests) and throughput (benchmarks) with the current code.
+"""
+
+import io
+import re
+
+
+# the regex cascade of `robotstxt_statistics.py` before the single-pass
+# tokenizer (`robotstxt_parser.tokenize`)
+robotstxt_commentline_pattern = re.compile(b'^\\s*#')
+robotstxt_emptyline_pattern = re.compile(b'^\\s*$')
+robotstxt_known_directive_pattern = re.compile(b'^\\s*(user-agent|disallow|allow|crawl-delay|sitemap|clean-param|host|noindex)\\s*:\\s*([^\r#]*)',
+                                               re.IGNORECASE|re.ASCII)
+robotstxt_unknown_directive_pattern = re.compile(b'^\\s*([a-z_]+(?:-[a-z_]+)*)\\s*:',
+                                                 re.IGNORECASE|re.ASCII)
+white_space_pattern = re.compile('\\s+')
+
+
+def tokenize_regex_cascade(payload):
+    """Tokenize a robots.txt payload (BOM already stripped) line by line
+    as `RobotstxtStatsJob.process_record` did before: lines are read by
+    `readline()` (line break `\\n` only) and classified by up to four
+    regular expressions"""
+    stream = io.BytesIO(payload)
+    line = stream.readline()
+    while line:
+        if robotstxt_commentline_pattern.match(line):
+            yield ('(comment line)', None)
+        elif robotstxt_emptyline_pattern.match(line):
+            yield ('(empty line)', None)
+        else:
+            m = robotstxt_known_directive_pattern.match(line)
+            if m:
+                directive = m.group(1).lower().decode('utf-8', errors='replace')
+                value = m.group(2).strip().decode('utf-8', errors='replace')
+                value = white_space_pattern.sub(' ', value)
+                yield (directive, value)
+            else:
+                m = robotstxt_unknown_directive_pattern.match(line)
+                if m:
+                    directive = m.group(1).lower().decode('utf-8', errors='replace')
+                    yield ('(unknown directive)', directive)
+                else:
+                    yield ('(unknown line)', None)
+        line = stream.readline()
@@ -0,0 +1,353 @@
+"""Generators of synthetic but realistic benchmark data:
+ - robots.txt bodies of various kinds, including the edge cases seen in
+   the Common Crawl robots.txt captures (BOM, HTML sent as text/plain,
+   huge disallow lists, CRLF and CR-only line breaks, long user-agent
+   blocks)
+ - WARC files with robots.txt captures (responses with different HTTP
+   status and MIME types, repeated payloads)
+ - tables of robots.txt captures, same schema as the result of
+   `get_robotstxt_captures_athena.py`
+All data is generated from a seed and is reproducible.
+"""
+
+import io
+import os
+import random
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import zstandard
+
+from warcio.statusandheaders import StatusAndHeaders
+from warcio.warcwriter import WARCWriter
+
+import robotstxt_parser
+
+from classify_robotstxt_rulesets import robotstxt_ruleset_classes
+
+
+user_agents = ['*', 'Googlebot', 'Bingbot', 'CCBot', 'GPTBot', 'ChatGPT-User',
+               'Google-Extended', 'anthropic-ai', 'ClaudeBot', 'Baiduspider',
+               'YandexBot', 'AhrefsBot', 'SemrushBot', 'MJ12bot', 'DotBot',
+               'PetalBot', 'Bytespider', 'facebookexternalhit', 'Applebot',
+               'ia_archiver', 'Slurp', 'DuckDuckBot', 'Mediapartners-Google']
+
+path_segments = ['admin', 'wp-admin', 'cgi-bin', 'search', 'cart', 'checkout',
+                 'account', 'login', 'api', 'private', 'tmp', 'cache', 'tag',
+                 'category', 'print', 'feed', 'comments', 'user', 'node', 'media']
+
+# kinds of robots.txt bodies and their share in the generated data
+robotstxt_kinds = {
+    'simple': 40,
+    'bom': 5,
+    'html': 5,
+    'huge_disallow': 2,
+    'crlf': 20,
+    'cr_only': 3,
+    'long_user_agent_blocks': 10,
+    'comments_unknown': 15,
+}
+
+# top-level domains of generated host names
+tlds = ['com', 'com', 'com', 'net', 'org', 'de', 'co.uk', 'fr', 'jp', 'ru', 'com.br', 'io']
+
+crawls = ['CC-MAIN-2022-05', 'CC-MAIN-2023-06', 'CC-MAIN-2024-10', 'CC-MAIN-2025-05']
+
+# HTTP status of robots.txt captures and their share (in percent)
+fetch_status_distribution = {200: 72, 404: 12, 301: 4, 302: 2, 403: 3, 503: 2, 500: 1,
+                             429: 1, 410: 1, 401: 1, 400: 1}
+
+# pairs of (Content-Type, detected MIME type) and their share
+mime_type_distribution = {('text/plain', 'text/plain'): 80,
+                          ('text/html', 'text/html'): 8,
+                          ('text/plain; charset=utf-8', 'text/plain'): 5,
+                          (None, None): 3,
+                          ('application/octet-stream', 'text/plain'): 2,
+                          ('text/plain', 'message/rfc822'): 1,
+                          ('text/html', None): 1}
+
+
+def parse_size(size: str) -> int:
+    """Parse a size given as number with optional suffix `k` or `M`"""
+    size = size.strip()
+    if size[-1] in 'kK':
+        return int(float(size[:-1]) * 1_000)
+    if size[-1] in 'mM':
+        return int(float(size[:-1]) * 1_000_000)
+    return int(size)
+
+
+def _path(rng: random.Random) -> str:
+    path = '/' + '/'.join(rng.choice(path_segments) for _ in range(rng.randint(1, 3)))
+    r = rng.random()
+    if r < 0.2:
+        path += '/'
+    elif r < 0.3:
+        path += '*.php$'
+    elif r < 0.4:
+        path += '?*'
+    return path
+
+
+def _group(rng: random.Random, agents: list, n_rules: int) -> list:
+    lines = ['User-agent: ' + agent for agent in agents]
+    r = rng.random()
+    if r < 0.15:
+        # disallow-all or allow-all rulesets
+        lines.append('Disallow: /' if r < 0.1 else 'Disallow:')
+        return lines
+    for _ in range(n_rules):
+        directive = 'Disallow' if rng.random() < 0.8 else 'Allow'
+        lines.append(directive + ': ' + _path(rng))
+    if rng.random() < 0.2:
+        lines.append('Crawl-delay: %d' % rng.randint(1, 30))
+    return lines
+
+
+def _simple_lines(rng: random.Random) -> list:
+    lines = list()
+    for agent in rng.sample(user_agents, rng.randint(1, 4)):
+        lines += _group(rng, [agent], rng.randint(0, 12))
+        lines.append('')
+    if rng.random() < 0.7:
+        lines.append('Sitemap: https://www.example.com/sitemap%d.xml' % rng.randint(0, 9))
+    return lines
+
+
+def robotstxt_body(rng: random.Random, kind: str) -> bytes:
+    """Generate a robots.txt body of the given kind (see `robotstxt_kinds`)"""
+    if kind == 'html':
+        body = ('<!DOCTYPE html>\n<html><head><title>Page not found</title></head>\n'
+                '<body>' + '<p>Lorem ipsum dolor sit amet.</p>\n' * rng.randint(10, 200)
+                + '</body></html>\n')
+        return body.encode('utf-8')
+    if kind == 'huge_disallow':
+        lines = ['User-agent: *']
+        lines += ['Disallow: /%s/%d/' % (rng.choice(path_segments), i)
+                  for i in range(rng.randint(5_000, 20_000))]
+        return ('\n'.join(lines) + '\n').encode('utf-8')
+    if kind == 'long_user_agent_blocks':
+        lines = list()
+        for _ in range(rng.randint(2, 6)):
+            agents = rng.sample(user_agents, rng.randint(8, len(user_agents)))
+            lines += _group(rng, agents, rng.randint(1, 30))
+            lines.append('')
+        return ('\n'.join(lines) + '\n').encode('utf-8')
+    if kind == 'comments_unknown':
+        lines = ['# robots.txt for www.example.com', '#', '# last modified 2024-01-01']
+        for line in _simple_lines(rng):
+            lines.append(line)
+            r = rng.random()
+            if r < 0.1:
+                lines.append('# ' + _path(rng))
+            elif r < 0.15:
+                lines.append('Request-rate: 1/10')
+            elif r < 0.18:
+                lines.append('Disalow: ' + _path(rng))
+            elif r < 0.2:
+                lines.append('<meta name="robots" content="noindex">')
+            elif r < 0.22:
+                lines.append('Disallow: /café/  # comment')
+        return ('\n'.join(lines) + '\n').encode('utf-8')
+
+    lines = _simple_lines(rng)
+    if kind == 'crlf':
+        return ('\r\n'.join(lines) + '\r\n').encode('utf-8')
+    if kind == 'cr_only':
+        return ('\r'.join(lines) + '\r').encode('utf-8')
+    body = ('\n'.join(lines) + '\n').encode('utf-8')
+    if kind == 'bom':
+        body = b'\xef\xbb\xbf' + body
+    return body
+
+
+def robotstxt_bodies(n: int, seed: int = 0, kind: str = None) -> list:
+    """Generate a list of n robots.txt bodies (bytes), either all of the
+    given kind or a mix of all kinds"""
+    rng = random.Random(seed)
+    if kind is not None:
+        return [robotstxt_body(rng, kind) for _ in range(n)]
+    kinds = rng.choices(list(robotstxt_kinds), weights=list(robotstxt_kinds.values()), k=n)
+    return [robotstxt_body(rng, k) for k in kinds]
+
+
+def write_warc(path: str, n_records: int, seed: int = 0, n_distinct: int = None) -> str:
+    """Write a WARC file with n robots.txt captures (response records).
+    Payloads are drawn from a pool of `n_distinct` bodies (default: half
+    the number of records), so that some payloads (and their digests)
+    are repeated, as in the Common Crawl robots.txt captures."""
+    rng = random.Random(seed)
+    if n_distinct is None:
+        n_distinct = max(1, n_records // 2)
+    bodies = robotstxt_bodies(n_distinct, seed)
+    status_codes = list(fetch_status_distribution)
+    status_weights = list(fetch_status_distribution.values())
+    mime_types = list(mime_type_distribution)
+    mime_weights = list(mime_type_distribution.values())
+    with open(path, 'wb') as fh:
+        writer = WARCWriter(fh, gzip=True)
+        writer.write_record(writer.create_warcinfo_record(
+            os.path.basename(path), {'software': 'benchmark/synthetic.py'}))
+        for i in range(n_records):
+            url = 'https://www.site%d.%s/robots.txt' % (i, rng.choice(tlds))
+            status = rng.choices(status_codes, status_weights)[0]
+            content_type, mime_detected = rng.choices(mime_types, mime_weights)[0]
+            if status == 200:
+                body = bodies[min(int(rng.paretovariate(1.0)) - 1, n_distinct - 1)
+                              if rng.random() < 0.5 else rng.randrange(n_distinct)]
+            else:
+                body = b''
+            headers = [('Content-Length', str(len(body)))]
+            if content_type:
+                headers.append(('Content-Type', content_type))
+            if 300 <= status < 400:
+                headers.append(('Location', url.replace('https://www.', 'https://')))
+            http_headers = StatusAndHeaders('%d Status' % status, headers, protocol='HTTP/1.1')
+            warc_headers = dict()
+            if mime_detected:
+                warc_headers['WARC-Identified-Payload-Type'] = mime_detected
+            record = writer.create_warc_record(url, 'response', payload=io.BytesIO(body),
+                                               http_headers=http_headers,
+                                               warc_headers_dict=warc_headers)
+            writer.write_record(record)
+    return path
+
+
+def _choice(rng: np.random.Generator, distribution: dict, n: int) -> np.ndarray:
+    weights = np.array(list(distribution.values()), dtype=np.float64)
+    return rng.choice(len(distribution), size=n, p=(weights / weights.sum()))
+
+
+def capture_table(n_rows: int, seed: int = 0, n_hosts: int = None) -> pd.DataFrame:
+    """Generate a table of robots.txt captures with n rows, spread over
+    the crawls in `crawls`. Columns are the same as in the result table of
+    `get_robotstxt_captures_athena.py` (without the redirect columns).
+    Hosts are drawn from the top `n_hosts` ranks (default: about 90% of
+    the rows per crawl). Every host has a unique rank; a host may have
+    more than one capture per crawl (e.g. http:// and https://)."""
+    rng = np.random.default_rng(seed)
+    n_crawls = len(crawls)
+    if n_hosts is None:
+        n_hosts = max(1, int(n_rows / n_crawls / 1.1))
+    crawl = np.repeat(np.arange(n_crawls), n_rows // n_crawls + 1)[:n_rows]
+    rank = rng.integers(1, n_hosts + 1, size=n_rows, dtype=np.int32)
+    rank_str = pa.array(rank).cast(pa.string())
+    tld = pa.array(np.array(tlds, dtype=object)[rank % len(tlds)], type=pa.string())
+    domain = pc.binary_join_element_wise('site', rank_str, '.', tld, '')
+    host = pc.if_else(pa.array(rank % 3 == 0), domain,
+                      pc.binary_join_element_wise('www.', domain, ''))
+    scheme = pa.array(np.where(rng.random(n_rows) < 0.8, 'https://', 'http://'), type=pa.string())
+    url = pc.binary_join_element_wise(scheme, host, '/robots.txt', '')
+
+    status_codes = np.array(list(fetch_status_distribution), dtype=np.int32)
+    fetch_status = status_codes[_choice(rng, fetch_status_distribution, n_rows)]
+    is_redirect = (fetch_status >= 300) & (fetch_status < 400)
+    fetch_redirect = pc.if_else(pa.array(is_redirect),
+                                pc.binary_join_element_wise('https://', domain, '/robots.txt', ''),
+                                pa.scalar(None, pa.string()))
+
+    mime_types = list(mime_type_distribution)
+    mime = _choice(rng, mime_type_distribution, n_rows)
+    content_mime_type = pa.array(np.array([m[0] for m in mime_types], dtype=object)[mime],
+                                 type=pa.string())
+    content_mime_detected = pa.array(np.array([m[1] for m in mime_types], dtype=object)[mime],
+                                     type=pa.string())
+
+    crawl_names = np.array(crawls, dtype=object)[crawl]
+    warc_file = rng.integers(0, 1000, size=n_rows)
+    warc_filename = pc.binary_join_element_wise(
+        pa.array(crawl_names, type=pa.string()),
+        pa.array(warc_file).cast(pa.string()), '.warc.gz', '')
+    warc_filename = pc.binary_join_element_wise('crawl-data/', warc_filename, '')
+
+    table = pa.table({
+        'host': host,
+        'domain': domain,
+        'rank': rank,
+        'url': url,
+        'fetch_status': fetch_status,
+        'fetch_redirect': fetch_redirect,
+        'content_mime_type': content_mime_type,
+        'content_mime_detected': content_mime_detected,
+        'warc_filename': warc_filename,
+        'warc_record_offset': rng.integers(0, 1_000_000_000, size=n_rows, dtype=np.int64),
+        'warc_record_length': rng.integers(500, 20_000, size=n_rows, dtype=np.int32),
+        'crawl': pa.array(crawl_names, type=pa.string()),
+    })
+    return table.to_pandas()
+
+
+def write_capture_table(output_location: str, n_rows: int, seed: int = 0,
+                        chunk_size: int = 1_000_000) -> str:
+    """Write the capture table partitioned by crawl (hive-style, same
+    layout as the table written by `get_robotstxt_captures_athena.py`).
+    Large tables are generated and written in chunks, one file per chunk
+    and crawl."""
+    n_hosts = max(1, int(n_rows / len(crawls) / 1.1))
+    for i, offset in enumerate(range(0, n_rows, chunk_size)):
+        df = capture_table(min(chunk_size, n_rows - offset), seed + i, n_hosts)
+        for crawl, d in df.groupby('crawl', sort=True):
+            output_dir = os.path.join(output_location, 'crawl=' + crawl, 'redirects=0')
+            os.makedirs(output_dir, exist_ok=True)
+            table = pa.Table.from_pandas(d.drop(columns=['crawl']), preserve_index=False)
+            pq.write_table(table, os.path.join(output_dir, 'part-%05d.zstd.parquet' % i),
+                           compression='zstd')
+    return output_location
+
+
+def ruleset_classes_table(df_captures: pd.DataFrame, seed: int = 0) -> pd.DataFrame:
+    """Generate ruleset classes (see `classify_robotstxt_rulesets.py`)
+    for the successfully fetched captures: one to six user-agents per
+    robots.txt, one row per URL and user-agent"""
+    rng = np.random.default_rng(seed)
+    d = df_captures[df_captures['fetch_status'] == 200]
+    n_agents = rng.integers(1, 7, size=d.shape[0])
+    rows = np.repeat(np.arange(d.shape[0]), n_agents)
+    # first user-agent is the wildcard for most of the rulesets
+    agents = rng.integers(0, len(user_agents), size=len(rows))
+    first = np.concatenate([[0], np.cumsum(n_agents)[:-1]])
+    agents[first] = np.where(rng.random(len(first)) < 0.85, 0, agents[first])
+    classes = rng.choice(len(robotstxt_ruleset_classes), size=len(rows), p=[0.2, 0.3, 0.5])
+    return pd.DataFrame({
+        'crawl': d['crawl'].to_numpy()[rows],
+        'url': d['url'].to_numpy()[rows],
+        'user_agent': np.array(user_agents, dtype=object)[agents],
+        'ruleset_class': pd.Categorical.from_codes(classes, categories=robotstxt_ruleset_classes),
+    })
+
+
+def write_rulesets(path: str, n: int, seed: int = 0) -> str:
+    """Write n rulesets (zstd-compressed JSONL, same format as the
+    rulesets extracted by `robotstxt_statistics.py --extract_rulesets`)"""
+    bodies = robotstxt_bodies(n, seed)
+    with open(path, 'wb') as fh:
+        with zstandard.ZstdCompressor().stream_writer(fh) as writer:
+            for i, body in enumerate(bodies):
+                result = robotstxt_parser.parse(body, extract_rulesets=True)
+                if result.is_html:
+                    continue
+                url = 'https://www.site%d.com/robots.txt' % i
+                line = robotstxt_parser.ruleset_json(url, result.ruleset) + '\n'
+                writer.write(line.encode('utf-8'))
+    return path
+
+
+# layout of the data directory written by `python -m benchmark generate`
+
+def warc_path(data_dir: str, i: int) -> str:
+    return os.path.join(data_dir, 'warc', 'robotstxt-%05d.warc.gz' % i)
+
+
+def warc_pattern(data_dir: str) -> str:
+    return os.path.join(data_dir, 'warc', 'robotstxt-*.warc.gz')
+
+
+def capture_table_path(data_dir: str, size: str) -> str:
+    return os.path.join(data_dir, 'captures-' + size)
+
+
+def rulesets_path(data_dir: str) -> str:
+    return os.path.join(data_dir, 'rulesets.jsonl.zst')
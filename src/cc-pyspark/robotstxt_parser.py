@@ -0,0 +1,387 @@
+"""Tokenizer for robots.txt files: split the payload into lines and
+classify every line as comment, empty line, known or unknown directive.
+
+The module does not depend on Spark and is shared by the Spark job
+`robotstxt_statistics.py` and other tools processing robots.txt captures.
+"""
+
+import os
+import pickle
+import re
+import sqlite3
+
+from collections import Counter, OrderedDict, defaultdict, namedtuple
+from time import perf_counter
+from urllib.parse import urlparse
+
+import ujson as json
+
+
+# version of the parsing logic, to be incremented if the parse results
+# change (invalidates cached parse results)
+version = 2
+
+bom = b'\xef\xbb\xbf'
+
+# Limits applied when parsing a payload:
+#  - max. number of bytes parsed per payload, longer payloads are truncated
+#    (RFC 9309 allows crawlers to limit the parsed size to 500 KiB)
+#  - max. length of a line (bytes), longer lines are truncated
+#  - number of bytes at the start of the payload inspected to detect HTML
+max_payload_bytes = 500 * 1024
+max_line_length = 16 * 1024
+html_sniff_bytes = 1024
+
+# MIME types (detected or sent in the Content-Type header) of plain-text
+# robots.txt files, including frequent misspellings
+plain_text_mime_types = {'text/x-robots', 'text/plain', 'message/rfc822', 'text/text', 'text/txt',
+                         'text', 'plain/text', 'text/pain', 'text/plan'}
+
+# HTML document: optional white space, comments and XML declaration
+# followed by a doctype, html, head or body tag
+content_html_pattern = re.compile(b'\\s*(?:<!--.*?-->\\s*|<\\?xml[^>]*>\\s*)*'
+                                  b'<(?:!DOCTYPE\\s+html|html|head|body)\\b',
+                                  re.IGNORECASE|re.ASCII|re.DOTALL)
+
+known_directives = {'user-agent', 'disallow', 'allow', 'crawl-delay', 'sitemap',
+                    'clean-param', 'host', 'noindex'}
+
+# One pattern to classify a single line (without line break), the line type
+# is signaled by the last matched group:
+#  - None: empty line
+#  - 1: comment line
+#  - 3: known directive (group 2) and value (group 3)
+#  - 4: unknown directive
+#  - no match: unknown line
+robotstxt_line_pattern = re.compile(
+    b'\\s*(?:'
+    b'(#)'
+    b'|$'
+    b'|(user-agent|disallow|allow|crawl-delay|sitemap|clean-param|host|noindex)\\s*:\\s*([^#]*)'
+    b'|([a-z_]+(?:-[a-z_]+)*)\\s*:'
+    b')',
+    re.IGNORECASE|re.ASCII)
+
+white_space_pattern = re.compile('\\s+')
+
+BOM_STRIPPED = ('(bom stripped)', None)
+COMMENT_LINE = ('(comment line)', None)
+EMPTY_LINE = ('(empty line)', None)
+UNKNOWN_LINE = ('(unknown line)', None)
+UNKNOWN_DIRECTIVE = '(unknown directive)'
+
+# lowercase directive names (bytes) mapped to interned strings
+_directive_names = {d.encode('ascii'): d for d in known_directives}
+
+
+def check_record(record):
+    """Check whether a WARC record holds a successfully fetched plain-text
+    robots.txt. Returns None if the record is to be parsed, otherwise the
+    reason why it is skipped, one of `records_not_response`,
+    `records_not_http_200`, `records_not_plain_text` or `records_no_mime_type`
+    (neither a detected MIME type nor a Content-Type header)."""
+    if not record.rec_type == 'response':
+        # warcinfo, request, metadata records
+        return 'records_not_response'
+
+    if record.http_headers.get_statuscode() != '200':
+        return 'records_not_http_200'
+
+    mime_detected = record.rec_headers.get_header('WARC-Identified-Payload-Type')
+    if mime_detected:
+        if not mime_detected in plain_text_mime_types:
+            return 'records_not_plain_text'
+    else:
+        mime_type = record.http_headers.get_header('Content-Type')
+        if not mime_type:
+            return 'records_no_mime_type'
+        mime_type = mime_type.split(';')[0].strip().lower()
+        if not mime_type in plain_text_mime_types:
+            return 'records_not_plain_text'
+
+    return None
+
+
+def is_html(payload):
+    """Whether the payload (BOM already stripped) starts with HTML content,
+    only the first `html_sniff_bytes` are inspected"""
+    return content_html_pattern.match(payload, 0, html_sniff_bytes) is not None
+
+
+def split_lines(payload):
+    """Split payload into lines, line breaks are `\\n`, `\\r\\n` and `\\r`"""
+    return payload.splitlines()
+
+
+def read_payload(stream, max_bytes=max_payload_bytes):
+    """Read the payload from a stream, but not more than needed to parse
+    it with a byte budget of `max_bytes` (0: no limit): the budget, a BOM
+    and one byte to detect whether the payload is truncated"""
+    if not max_bytes:
+        return stream.read()
+    return stream.read(max_bytes + len(bom) + 1)
+
+
+def truncate_payload(payload, max_bytes):
+    """Truncate the payload to at most `max_bytes` (0: no limit), at the
+    last line break if there is one. Returns the payload and whether it
+    was truncated."""
+    if not max_bytes or len(payload) <= max_bytes:
+        return payload, False
+    payload = payload[:max_bytes]
+    end = max(payload.rfind(b'\n'), payload.rfind(b'\r'))
+    if end > 0:
+        payload = payload[:end]
+    return payload, True
+
+
+def truncate_lines(lines, max_length):
+    """Truncate lines longer than `max_length` bytes (0: no limit).
+    Returns the lines and the number of truncated lines."""
+    if not max_length or not lines or max(map(len, lines)) <= max_length:
+        return lines, 0
+    n_truncated = sum(1 for line in lines if len(line) > max_length)
+    return [line[:max_length] for line in lines], n_truncated
+
+
+def tokenize(payload, unknown_line_handler=None):
+    """Tokenize robots.txt payload, yield one (directive, value) key
+    per line. Comments are excluded from the directive values, white
+    space in values is normalized. The optional `unknown_line_handler`
+    is called with the raw line for every line which cannot be
+    classified."""
+    return tokenize_lines(split_lines(payload), unknown_line_handler)
+
+
+def tokenize_lines(lines, unknown_line_handler=None):
+    """Tokenize the lines of a robots.txt payload, see `tokenize`"""
+    match = robotstxt_line_pattern.match
+    for line in lines:
+        m = match(line)
+        if m is None:
+            if unknown_line_handler:
+                unknown_line_handler(line)
+            yield UNKNOWN_LINE
+            continue
+        kind = m.lastindex
+        if kind == 3:
+            directive = _directive_names[m.group(2).lower()]
+            value = m.group(3).strip().decode('utf-8', errors='replace')
+            # all white space except a single space character is not printable
+            if '  ' in value or not value.isprintable():
+                value = white_space_pattern.sub(' ', value)
+            yield directive, value
+        elif kind is None:
+            yield EMPTY_LINE
+        elif kind == 1:
+            yield COMMENT_LINE
+        else:
+            yield UNKNOWN_DIRECTIVE, m.group(4).lower().decode('utf-8', errors='replace')
+
+
+# Result of parsing a robots.txt payload:
+#  - counts: list of ((directive, value), count)
+#  - ruleset: rulesets per user-agent serialized as JSON (None if not extracted)
+#  - is_html: payload is HTML (counts include only the stripped BOM)
+#  - lines: number of lines
+#  - directives: number of known directives
+#  - truncated: payload truncated to the max. number of bytes
+#  - truncated_lines: number of lines truncated to the max. line length
+ParseResult = namedtuple('ParseResult', ['counts', 'ruleset', 'is_html', 'lines', 'directives',
+                                         'truncated', 'truncated_lines'])
+
+
+def parse(payload, extract_rulesets=False, unknown_line_handler=None, profile=None,
+          max_bytes=max_payload_bytes, max_line_length=max_line_length):
+    """Parse a robots.txt payload, return a ParseResult. At most
+    `max_bytes` of the payload are parsed and lines are truncated to
+    `max_line_length` bytes, so that the parsing time is bounded. If a
+    profile (see `robotstxt_profile.py`) is given, the time spent
+    tokenizing, counting, building and serializing the rulesets is added
+    to it."""
+    bom_stripped = payload.startswith(bom)
+    if bom_stripped:
+        payload = payload[3:]
+    if is_html(payload):
+        counts = [(BOM_STRIPPED, 1)] if bom_stripped else []
+        return ParseResult(counts, None, True, 0, 0, False, 0)
+
+    if profile is not None:
+        start = perf_counter()
+    payload, truncated = truncate_payload(payload, max_bytes)
+    payload_lines, truncated_lines = truncate_lines(split_lines(payload), max_line_length)
+    tokens = tokenize_lines(payload_lines, unknown_line_handler)
+    if profile is not None:
+        # tokenize all lines first, to time tokenization separately
+        tokens = list(tokens)
+        start = _profile_stage(profile, 'tokenize', start, len(payload))
+
+    ruleset = None
+    if extract_rulesets:
+        counts = Counter()
+        rules_by_agent = defaultdict(list)
+        active_agents = set()
+        inblock = False
+        for key in tokens:
+            counts[key] += 1
+            directive = key[0]
+            if directive == 'user-agent':
+                if inblock:
+                    active_agents = set()
+                active_agents.add(key[1])
+            elif directive == 'allow' or directive == 'disallow':
+                inblock = True
+                for agent in active_agents:
+                    rules_by_agent[agent].append(key)
+        if profile is not None:
+            start = _profile_stage(profile, 'rulesets', start)
+        ruleset = format_ruleset(rules_by_agent)
+        if profile is not None:
+            _profile_stage(profile, 'serialize', start, len(ruleset))
+    else:
+        counts = Counter(tokens)
+        if profile is not None:
+            _profile_stage(profile, 'count', start)
+
+    lines = sum(counts.values())
+    directives = sum(cnt for key, cnt in counts.items() if key[0] in known_directives)
+    if bom_stripped:
+        counts[BOM_STRIPPED] += 1
+    return ParseResult(list(counts.items()), ruleset, False, lines, directives,
+                       truncated, truncated_lines)
+
+
+def _profile_stage(profile, stage, start, nbytes=0):
+    """Add the time since start to the stage, return the current time"""
+    now = perf_counter()
+    profile.add(stage, now - start, nbytes)
+    return now
+
+
+def format_ruleset(rules_by_agent):
+    """Serialize rules per user-agent as JSON, user-agents and rules sorted"""
+    d = OrderedDict()
+    for agent in sorted(rules_by_agent):
+        d[agent] = defaultdict(list)
+        for (directive, value) in sorted(rules_by_agent[agent]):
+            d[agent][directive].append(value)
+    return json.dumps(d)
+
+
+def ruleset_rows(ruleset):
+    """Unnest serialized ruleset into (user_agent, directive, value) tuples"""
+    for agent, rules in json.loads(ruleset).items():
+        for directive, values in rules.items():
+            for value in values:
+                yield agent, directive, value
+
+
+def ruleset_json(url, ruleset):
+    """JSON object mapping the robots.txt URL to the serialized ruleset"""
+    return '{' + json.dumps(url) + ':' + ruleset + '}'
+
+
+def ruleset_table_rows(crawl, url, ruleset):
+    """Rows of the ruleset table (url, host, user_agent, user_agent_lc,
+    directive, value, crawl), one row per user-agent and rule"""
+    host = urlparse(url).hostname
+    empty = True
+    for agent, directive, value in ruleset_rows(ruleset):
+        empty = False
+        yield (url, host, agent, agent.lower(), directive, value, crawl)
+    if empty:
+        # keep robots.txt captures without rules
+        yield (url, host, None, None, None, None, crawl)
+
+
+def count_table_row(crawl, key, cnt):
+    """Row of the counts table (directive, value, value_lc, cnt, crawl),
+    `value_lc` is the lowercase value of user-agent directives"""
+    directive, value = key
+    value_lc = None
+    if directive == 'user-agent' and value is not None:
+        value_lc = value.lower()
+    return (directive, value, value_lc, cnt, crawl)
+
+
+def cache_signature(extract_rulesets, max_bytes=max_payload_bytes,
+                    max_line_length=max_line_length):
+    """Signature of the parse results (parser version and options),
+    part of the key of cached parse results"""
+    return 'v{}:{}:{}:{}:'.format(version, 'rulesets' if extract_rulesets else 'counts',
+                                  max_bytes, max_line_length)
+
+
+class ParseResultCache(object):
+    """LRU cache of parse results keyed by the WARC-Payload-Digest,
+    optionally backed by a SQLite database on local disk, so that parse
+    results can be reused by later jobs. The `signature` identifies the
+    parsing options and is part of the cache key."""
+
+    store_file_name = 'robotstxt-parse-cache.sqlite'
+
+    def __init__(self, max_size, signature, store_dir=None):
+        self.max_size = max_size
+        self.signature = signature
+        self.store_dir = store_dir
+        self.cache = OrderedDict()
+        self.store = None
+        self.pending = []
+        if store_dir:
+            os.makedirs(store_dir, exist_ok=True)
+            self.store = sqlite3.connect(os.path.join(store_dir, self.store_file_name),
+                                         timeout=60)
+            self.store.execute('CREATE TABLE IF NOT EXISTS parse_results'
+                               ' (key TEXT PRIMARY KEY, result BLOB)')
+            self.store.commit()
+
+    def get(self, digest):
+        """Look up the parse result, return a tuple (result, source) where
+        source is one of 'memory', 'disk' or None if not found"""
+        key = self.signature + digest
+        result = self.cache.get(key)
+        if result is not None:
+            self.cache.move_to_end(key)
+            return result, 'memory'
+        if self.store is not None:
+            row = self.store.execute('SELECT result FROM parse_results WHERE key = ?',
+                                     (key,)).fetchone()
+            if row:
+                result = pickle.loads(row[0])
+                self._add(key, result)
+                return result, 'disk'
+        return None, None
+
+    def put(self, digest, result):
+        key = self.signature + digest
+        self._add(key, result)
+        if self.store is not None:
+            self.pending.append((key, pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)))
+
+    def _add(self, key, result):
+        self.cache[key] = result
+        if len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
+
+    def flush(self):
+        """Write new parse results to the on-disk store"""
+        if self.store is None or not self.pending:
+            return
+        self.store.executemany('INSERT OR IGNORE INTO parse_results VALUES (?, ?)',
+                               self.pending)
+        self.store.commit()
+        self.pending = []
+
+
+# one cache per Python worker process, reused by all tasks run by the worker
+_parse_result_cache = None
+
+
+def get_parse_result_cache(max_size, signature, store_dir=None):
+    global _parse_result_cache
+    cache = _parse_result_cache
+    if (cache is None or cache.max_size != max_size
+            or cache.signature != signature or cache.store_dir != store_dir):
+        cache = ParseResultCache(max_size, signature, store_dir)
+        _parse_result_cache = cache
+    return cache
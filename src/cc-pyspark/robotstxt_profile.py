@@ -0,0 +1,127 @@
+"""Profile of the robots.txt processing: wall time and bytes per processing
+stage, histograms of payload sizes and parse times, and the slowest
+records. A profile is collected per partition and merged with the
+profiles of other partitions (by a Spark accumulator in the Spark job).
+
+The module does not depend on Spark, see also `robotstxt_parser.py`.
+"""
+
+import heapq
+
+from collections import Counter
+
+
+# Processing stages in processing order:
+#  - warc_read: read the WARC and HTTP headers of the next record,
+#               includes skipping the payload of the previous record
+#  - header_checks: filter by record type, HTTP status and MIME type
+#  - parse_cache: look up the parse result in the cache
+#  - payload_read: read and decompress the payload
+#  - tokenize: split the payload into lines and classify the lines
+#  - count: count directives (rulesets not extracted)
+#  - rulesets: count directives and build the rulesets
+#  - serialize: serialize the rulesets as JSON
+#  - emit: emit counts and rulesets
+stages = ['warc_read', 'header_checks', 'parse_cache', 'payload_read',
+          'tokenize', 'count', 'rulesets', 'serialize', 'emit']
+
+
+def stage_order(stage):
+    """Sort key of stages: processing order, unknown stages last"""
+    if stage in stages:
+        return stages.index(stage), stage
+    return len(stages), stage
+
+
+def log2_bin(value):
+    """Histogram bin of a non-negative integer value: 0 for 0,
+    otherwise n for values in [2^(n-1), 2^n)"""
+    return int(value).bit_length()
+
+
+def log2_bin_range(n):
+    """Lower and upper bound (exclusive) of a histogram bin"""
+    if n == 0:
+        return 0, 1
+    return 2 ** (n - 1), 2 ** n
+
+
+class Profile(object):
+    """Wall time, calls and bytes per stage, histograms of payload size
+    (bytes) and parse time (microseconds) per record, the `top_n`
+    records with the longest parse time"""
+
+    def __init__(self, top_n=20):
+        self.top_n = top_n
+        # stage -> [calls, seconds, bytes]
+        self.stages = dict()
+        self.size_histogram = Counter()
+        self.parse_time_histogram = Counter()
+        # min-heap of (seconds, size, url)
+        self.slowest = []
+
+    def add(self, stage, seconds, nbytes=0):
+        s = self.stages.get(stage)
+        if s is None:
+            self.stages[stage] = [1, seconds, nbytes]
+        else:
+            s[0] += 1
+            s[1] += seconds
+            s[2] += nbytes
+
+    def add_record(self, url, size, seconds):
+        """Add payload size and parse time of a record"""
+        self.size_histogram[log2_bin(size)] += 1
+        self.parse_time_histogram[log2_bin(seconds * 1000000)] += 1
+        if len(self.slowest) < self.top_n:
+            heapq.heappush(self.slowest, (seconds, size, url))
+        elif seconds > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, (seconds, size, url))
+
+    def merge(self, other):
+        """Add the profile of another partition"""
+        for stage, (calls, seconds, nbytes) in other.stages.items():
+            s = self.stages.get(stage)
+            if s is None:
+                self.stages[stage] = [calls, seconds, nbytes]
+            else:
+                s[0] += calls
+                s[1] += seconds
+                s[2] += nbytes
+        self.size_histogram.update(other.size_histogram)
+        self.parse_time_histogram.update(other.parse_time_histogram)
+        self.slowest = heapq.nlargest(self.top_n, self.slowest + other.slowest)
+        heapq.heapify(self.slowest)
+        return self
+
+    @staticmethod
+    def _histogram(histogram, unit):
+        rows = []
+        for n in sorted(histogram):
+            low, high = log2_bin_range(n)
+            rows.append({'min_' + unit: low, 'max_' + unit: high, 'count': histogram[n]})
+        return rows
+
+    def to_dict(self):
+        """Profile as dictionary, to be serialized as JSON"""
+        total = sum(s[1] for s in self.stages.values())
+        stage_rows = []
+        for stage in sorted(self.stages, key=stage_order):
+            calls, seconds, nbytes = self.stages[stage]
+            stage_rows.append({
+                'stage': stage,
+                'calls': calls,
+                'seconds': seconds,
+                'share': (seconds / total) if total else None,
+                'bytes': nbytes,
+                'mb_per_sec': (nbytes / seconds / 1e6) if nbytes and seconds else None,
+            })
+        slowest = [{'url': url, 'size': size, 'seconds': seconds}
+                   for seconds, size, url in sorted(self.slowest, reverse=True)]
+        return {
+            'stages': stage_rows,
+            'seconds_total': total,
+            'payload_size_histogram': self._histogram(self.size_histogram, 'bytes'),
+            'parse_time_histogram': self._histogram(self.parse_time_histogram, 'microseconds'),
+            'slowest_records': slowest,
+        }
@@ -1,14 +1,39 @@
-import re
+import json
+import os
+import time
 
-from collections import defaultdict, OrderedDict
+from collections import Counter
 from urllib.parse import urlparse
 
-import ujson as json
-
+from pyspark import AccumulatorParam, StorageLevel
 from pyspark.sql.types import StructType, StructField, StringType, LongType
 
 from sparkcc import CCSparkJob
 
+import robotstxt_parser
+import robotstxt_profile
+import robotstxt_topk
+
+
+class ProfileAccumulatorParam(AccumulatorParam):
+    """Merge the profiles of all partitions"""
+
+    def zero(self, value):
+        return robotstxt_profile.Profile(value.top_n)
+
+    def addInPlace(self, value1, value2):
+        return value1.merge(value2)
+
+
+class SpaceSavingAccumulatorParam(AccumulatorParam):
+    """Merge the top-k sketches of all partitions"""
+
+    def zero(self, value):
+        return robotstxt_topk.SpaceSaving(value.capacity)
+
+    def addInPlace(self, value1, value2):
+        return value1.merge(value2)
+
 
 class RobotstxtStatsJob(CCSparkJob):
     """ Collect robots.txt statistics from WARC response records
@@ -16,17 +41,7 @@ class RobotstxtStatsJob(CCSparkJob):
 
     name = "RobotstxtStats"
 
-    plain_text_mime_types = {'text/x-robots', 'text/plain', 'message/rfc822', 'text/text', 'text/txt',
-                             'text', 'plain/text', 'text/pain', 'text/plan'}
-
-    content_html_pattern = re.compile(b'^(?:<html|<!DOCTYPE html)\\b', re.IGNORECASE|re.ASCII)
-    robotstxt_commentline_pattern = re.compile(b'^\\s*#')
-    robotstxt_emptyline_pattern = re.compile(b'^\\s*$')
-    robotstxt_known_directive_pattern = re.compile(b'^\\s*(user-agent|disallow|allow|crawl-delay|sitemap|clean-param|host|noindex)\\s*:\\s*([^\r#]*)',
-                                                   re.IGNORECASE|re.ASCII)
-    robotstxt_unknown_directive_pattern = re.compile(b'^\\s*([a-z_]+(?:-[a-z_]+)*)\\s*:',
-                                                     re.IGNORECASE|re.ASCII)
-    white_space_pattern = re.compile('\\s+')
+    plain_text_mime_types = robotstxt_parser.plain_text_mime_types
 
     output_schema = StructType([
         StructField("key", StructType([
@@ -35,9 +50,122 @@ class RobotstxtStatsJob(CCSparkJob):
         StructField("cnt", LongType(), True)
     ])
 
+    # schema of the counts written by --counts_output, same as the output
+    # schema but flat, with the lowercase value of user-agent directives
+    counts_table_schema = StructType([
+        StructField("directive", StringType(), True),
+        StructField("value", StringType(), True),
+        StructField("value_lc", StringType(), True),
+        StructField("cnt", LongType(), True),
+        StructField("crawl", StringType(), True)
+    ])
+
+    # schema of rulesets written by --ruleset_output,
+    # one row per robots.txt URL, user-agent and rule
+    ruleset_schema = StructType([
+        StructField("url", StringType(), True),
+        StructField("host", StringType(), True),
+        StructField("user_agent", StringType(), True),
+        StructField("user_agent_lc", StringType(), True),
+        StructField("directive", StringType(), True),
+        StructField("value", StringType(), True),
+        StructField("crawl", StringType(), True)
+    ])
+
+    # estimated memory (bytes) per key held in the partition-level
+    # combining counter, excluding the length of the value string
+    combine_key_overhead = 200
+
+    # counters kept locally per partition and added in bulk
+    # to the accumulators of the same name
+    detailed_counters = ('records_not_response', 'records_not_http_200',
+                         'records_not_plain_text', 'records_no_mime_type',
+                         'robots_lines', 'robots_directives', 'combine_flushes',
+                         'parse_cache_hits', 'parse_cache_disk_hits',
+                         'parse_cache_misses', 'records_truncated',
+                         'lines_truncated')
+
+    counts = None
+    # whether the detailed counters are incremented (not --no_detailed_counters)
+    count_details = True
+    profile = None
+    user_agent_topk = None
+
     def add_arguments(self, parser):
         parser.add_argument("--extract_rulesets", action='store_true',
                             help="Extract rulesets per host as JSON (note: this adds a lot of output data)")
+        parser.add_argument("--ruleset_output", default=None,
+                            help="Write the extracted rulesets into a separate"
+                            " Parquet table at this location, partitioned by crawl,"
+                            " instead of JSON strings in the output table."
+                            " Implies --extract_rulesets and requires --crawl")
+        parser.add_argument("--ruleset_output_compression", default="zstd",
+                            help="Compression codec of the ruleset Parquet table")
+        parser.add_argument("--counts_output", default=None,
+                            help="Write the directive counts into a Parquet table at"
+                            " this location, partitioned by crawl, instead of the output"
+                            " table. Directive and value are dictionary-encoded, the"
+                            " column value_lc holds the lowercase user-agent names."
+                            " Requires --crawl")
+        parser.add_argument("--counts_output_compression", default="zstd",
+                            help="Compression codec of the counts Parquet table")
+        parser.add_argument("--crawl", default=None,
+                            help="Crawl identifier (e.g. CC-MAIN-2025-05), value"
+                            " of the partition column of the ruleset and counts table")
+        parser.add_argument("--combine_partitions", action='store_true',
+                            help="Pre-aggregate directive counts per partition"
+                            " before the shuffle")
+        parser.add_argument("--combine_memory_budget", type=int, default=256,
+                            help="Memory budget (MiB) of the per-partition counter"
+                            " used by --combine_partitions. If the budget is exhausted"
+                            " the partial counts are flushed")
+        parser.add_argument("--parse_cache_size", type=int, default=0,
+                            help="Cache parse results of identical robots.txt payloads,"
+                            " identified by the WARC-Payload-Digest. Max. number of"
+                            " cached results per executor, 0 disables the cache")
+        parser.add_argument("--parse_cache_dir", default=None,
+                            help="Directory on the local disk of the executors to"
+                            " persist cached parse results, so that they are reused"
+                            " by later jobs")
+        parser.add_argument("--max_payload_bytes", type=int,
+                            default=robotstxt_parser.max_payload_bytes,
+                            help="Max. number of bytes read and parsed per robots.txt"
+                            " payload, longer payloads are truncated (at the last line"
+                            " break). 0 means no limit")
+        parser.add_argument("--max_line_length", type=int,
+                            default=robotstxt_parser.max_line_length,
+                            help="Max. length (bytes) of a robots.txt line, longer lines"
+                            " are truncated. 0 means no limit")
+        parser.add_argument("--no_detailed_counters", action='store_true',
+                            help="Do not count skipped records, robots.txt lines"
+                            " and directives")
+        parser.add_argument("--profile_output", default=None,
+                            help="Profile the record processing: wall time and bytes"
+                            " per processing stage, histograms of payload sizes and parse"
+                            " times, slowest records. The profile is aggregated over all"
+                            " partitions and written as JSON to this path on the driver"
+                            " at the end of the job")
+        parser.add_argument("--profile_top_n", type=int, default=20,
+                            help="Number of slowest records listed in the profile")
+        parser.add_argument("--user_agent_topk_output", default=None,
+                            help="Count the lowercased user-agent names approximately"
+                            " by a top-k sketch (Space-Saving), merged over all"
+                            " partitions and written as JSON to this path on the"
+                            " driver at the end of the job")
+        parser.add_argument("--user_agent_topk_size", type=int, default=20000,
+                            help="Capacity of the user-agent top-k sketch. Counts are"
+                            " overestimated by at most (total count / capacity)")
+
+    def validate_arguments(self, args):
+        if args.ruleset_output:
+            if not args.crawl:
+                self.get_logger().error("Option --ruleset_output requires --crawl")
+                return False
+            args.extract_rulesets = True
+        if args.counts_output and not args.crawl:
+            self.get_logger().error("Option --counts_output requires --crawl")
+            return False
+        return super(RobotstxtStatsJob, self).validate_arguments(args)
 
     def init_accumulators(self, session):
         super(RobotstxtStatsJob, self).init_accumulators(session)
@@ -46,136 +174,399 @@ class RobotstxtStatsJob(CCSparkJob):
         self.records_not_response = sc.accumulator(0)
         self.records_not_http_200 = sc.accumulator(0)
         self.records_not_plain_text = sc.accumulator(0)
+        self.records_no_mime_type = sc.accumulator(0)
         self.robots_lines = sc.accumulator(0)
         self.robots_directives = sc.accumulator(0)
+        self.combine_flushes = sc.accumulator(0)
+        self.parse_cache_hits = sc.accumulator(0)
+        self.parse_cache_disk_hits = sc.accumulator(0)
+        self.parse_cache_misses = sc.accumulator(0)
+        self.records_truncated = sc.accumulator(0)
+        self.lines_truncated = sc.accumulator(0)
+        if self.args.profile_output:
+            self.profile_start = time.time()
+            self.profile_stats = sc.accumulator(
+                robotstxt_profile.Profile(self.args.profile_top_n),
+                ProfileAccumulatorParam())
+        if self.args.user_agent_topk_output:
+            self.user_agent_topk_sketch = sc.accumulator(
+                robotstxt_topk.SpaceSaving(self.args.user_agent_topk_size),
+                SpaceSavingAccumulatorParam())
 
     def log_accumulators(self, session):
         super(RobotstxtStatsJob, self).log_accumulators(session)
 
+        if self.args.profile_output:
+            self.write_profile()
+        if self.args.user_agent_topk_output:
+            self.write_user_agent_topk()
+
+        if self.args.no_detailed_counters:
+            return
         self.log_accumulator(session, self.records_not_response,
                              'records not WARC response = {}')
         self.log_accumulator(session, self.records_not_http_200,
                              'records not HTTP 200 ok = {}')
         self.log_accumulator(session, self.records_not_plain_text,
                              'records not plain text = {}')
+        self.log_accumulator(session, self.records_no_mime_type,
+                             'records without MIME type = {}')
         self.log_accumulator(session, self.robots_lines,
                              'robots.txt lines processed = {}')
         self.log_accumulator(session, self.robots_directives,
                              'robots.txt directives found = {}')
-
-    def process_record(self, record):
-        if not record.rec_type == 'response':
-            # warcinfo, request, metadata records
-            self.records_not_response.add(1)
-            return
-
-        if record.http_headers.get_statuscode() != '200':
-            self.records_not_http_200.add(1)
+        self.log_accumulator(session, self.records_truncated,
+                             'robots.txt payloads truncated (max. payload bytes) = {}')
+        self.log_accumulator(session, self.lines_truncated,
+                             'robots.txt lines truncated (max. line length) = {}')
+        if self.args.combine_partitions:
+            self.log_accumulator(session, self.combine_flushes,
+                                 'partition counters flushed (memory budget exhausted) = {}')
+        if self.args.parse_cache_size > 0:
+            self.log_accumulator(session, self.parse_cache_hits,
+                                 'parse cache hits = {}')
+            self.log_accumulator(session, self.parse_cache_disk_hits,
+                                 'parse cache hits (on-disk store) = {}')
+            self.log_accumulator(session, self.parse_cache_misses,
+                                 'parse cache misses = {}')
+
+    def flush_counters(self):
+        """Add the counts of the current partition to the accumulators"""
+        self.records_processed.add(self.counts.pop('records_processed', 0))
+        if self.count_details:
+            for name in RobotstxtStatsJob.detailed_counters:
+                if self.counts[name]:
+                    getattr(self, name).add(self.counts[name])
+        self.counts.clear()
+
+    def write_profile(self):
+        """Log the time per stage and write the profile as JSON"""
+        profile = self.profile_stats.value.to_dict()
+        for stage in profile['stages']:
+            self.get_logger().info('profile stage %s: %.3f sec. (%.1f%%), %d calls, %d bytes',
+                                   stage['stage'], stage['seconds'], 100.0 * stage['share'],
+                                   stage['calls'], stage['bytes'])
+        report = {
+            'job': self.name,
+            'args': vars(self.args),
+            'wall_time_seconds': time.time() - self.profile_start,
+            'records_processed': self.records_processed.value,
+        }
+        report.update(profile)
+        with open(self.args.profile_output, 'w') as fh:
+            json.dump(report, fh, indent=1)
+        self.get_logger().info('Profile written to %s', self.args.profile_output)
+
+    def write_user_agent_topk(self):
+        """Write the merged user-agent top-k sketch as JSON"""
+        sketch = self.user_agent_topk_sketch.value
+        path = self.args.user_agent_topk_output
+        dir_name = os.path.dirname(path)
+        if dir_name:
+            os.makedirs(dir_name, exist_ok=True)
+        robotstxt_topk.write_sketch(sketch, path, self.args.crawl,
+                                    records_processed=self.records_processed.value)
+        self.get_logger().info('User-agent top-k sketch (%d of %d user-agent directives'
+                               ' counted, min. count %d) written to %s',
+                               len(sketch), sketch.total, sketch.min_count(), path)
+
+    def get_parse_result_cache(self):
+        signature = robotstxt_parser.cache_signature(self.args.extract_rulesets,
+                                                     self.args.max_payload_bytes,
+                                                     self.args.max_line_length)
+        return robotstxt_parser.get_parse_result_cache(self.args.parse_cache_size,
+                                                       signature,
+                                                       self.args.parse_cache_dir)
+
+    def process_warcs(self, _id, iterator):
+        self.counts = Counter()
+        self.count_details = not self.args.no_detailed_counters
+        if self.args.profile_output:
+            self.profile = robotstxt_profile.Profile(self.args.profile_top_n)
+        if self.args.user_agent_topk_output:
+            self.user_agent_topk = robotstxt_topk.SpaceSaving(self.args.user_agent_topk_size)
+        records = super(RobotstxtStatsJob, self).process_warcs(_id, iterator)
+        if self.args.combine_partitions:
+            records = self.combine_counts(records)
+        try:
+            for res in records:
+                yield res
+        finally:
+            self.flush_counters()
+            if self.profile is not None:
+                self.profile_stats.add(self.profile)
+                self.profile = None
+            if self.user_agent_topk is not None:
+                self.user_agent_topk_sketch.add(self.user_agent_topk)
+                self.user_agent_topk = None
+            if self.args.parse_cache_size > 0:
+                self.get_parse_result_cache().flush()
+
+    def iterate_records(self, _warc_uri, archive_iterator):
+        # same as in CCSparkJob, but records are counted locally
+        counts = self.counts
+        if self.profile is not None:
+            for res in self.iterate_records_profiled(archive_iterator):
+                yield res
             return
-
-        mime_detected = record.rec_headers.get_header('WARC-Identified-Payload-Type')
-        if mime_detected:
-            if not mime_detected in RobotstxtStatsJob.plain_text_mime_types:
-                self.records_not_plain_text.add(1)
-                return
-        else:
-            mime_type = record.http_headers.get_header('Content-Type')
-            if not mime_type:
-                return # todo
-            mime_type = mime_type.split(';')[0].strip().lower()
-            if mime_type in RobotstxtStatsJob.plain_text_mime_types:
-                pass # ok
+        for record in archive_iterator:
+            for res in self.process_record(record):
+                yield res
+            counts['records_processed'] += 1
+
+    def iterate_records_profiled(self, archive_iterator):
+        counts = self.counts
+        profile = self.profile
+        records = iter(archive_iterator)
+        while True:
+            start = time.perf_counter()
+            record = next(records, None)
+            if record is None:
+                break
+            profile.add('warc_read', time.perf_counter() - start, record.length)
+            for res in self.process_record_profiled(record):
+                yield res
+            counts['records_processed'] += 1
+
+    def combine_counts(self, iterator):
+        """Combine counts of identical keys within one partition, so that
+        only (key, partial_count) pairs are shuffled. Rulesets are passed
+        through. The counter is flushed when its estimated size exceeds
+        the memory budget."""
+        budget = self.args.combine_memory_budget * 1024 * 1024
+        key_overhead = RobotstxtStatsJob.combine_key_overhead
+        counts = dict()
+        size = 0
+        for key, cnt in iterator:
+            if key[0] == '(ruleset)':
+                yield key, cnt
+                continue
+            if key in counts:
+                counts[key] += cnt
+                continue
+            counts[key] = cnt
+            size += key_overhead
+            if key[1]:
+                size += len(key[1])
+            if size > budget:
+                if self.count_details:
+                    self.counts['combine_flushes'] += 1
+                for res in counts.items():
+                    yield res
+                counts = dict()
+                size = 0
+        for res in counts.items():
+            yield res
+
+    def log_unknown_line(self, line):
+        self.get_logger().info("Unknown line: %s", line)
+
+    def accept_record(self, record):
+        """Whether the record is a successfully fetched robots.txt,
+        count skipped records"""
+        reason = robotstxt_parser.check_record(record)
+        if reason is None:
+            return True
+        if self.count_details:
+            self.counts[reason] += 1
+        return False
+
+    def get_cached_parse_result(self, record):
+        """Look up the parse result of the record payload in the cache,
+        return a tuple (cache, digest, result). The cache is None if
+        caching is disabled or the record has no payload digest, the
+        result is None if not found."""
+        if self.args.parse_cache_size <= 0:
+            return None, None, None
+        digest = record.rec_headers.get_header('WARC-Payload-Digest')
+        if not digest:
+            return None, None, None
+        cache = self.get_parse_result_cache()
+        result, source = cache.get(digest)
+        if self.count_details:
+            if result is not None:
+                self.counts['parse_cache_hits'] += 1
+                if source == 'disk':
+                    self.counts['parse_cache_disk_hits'] += 1
             else:
-                self.get_logger().debug("Skipped HTTP Content-Type: %s", mime_type)
-                self.records_not_plain_text.add(1)
-                return
-
-        url = record.rec_headers.get_header('WARC-Target-URI')
-        host_name = urlparse(url).hostname
+                self.counts['parse_cache_misses'] += 1
+        return cache, digest, result
 
+    def read_payload(self, record, url):
         try:
             stream = record.content_stream()
         except Exception as e:
             self.get_logger().error(
                 'Failed to read WARC payload: {} - {}'.format(url, e))
+            return None
+        return robotstxt_parser.read_payload(stream, self.args.max_payload_bytes)
+
+    def process_record(self, record):
+        if not self.accept_record(record):
             return
 
-        line = stream.readline()
-        # TODO: should consider also '\r' as line break
-
-        if line:
-            if line.startswith(b'\xef\xbb\xbf'):
-                yield ('(bom stripped)', None), 1
-                line = line[3:]
-            if RobotstxtStatsJob.content_html_pattern.match(line):
-                # skip over HTML content not recognized as such by HTTP header
-                self.get_logger().debug("Skipped HTML (first content line): %s", line)
-                self.records_not_plain_text.add(1)
-                return
+        url = record.rec_headers.get_header('WARC-Target-URI')
+        host_name = urlparse(url).hostname
 
-        rules_by_agent = None
-        active_agents = None
-        inblock = False
-        if self.args.extract_rulesets:
-            rules_by_agent = defaultdict(list)
-            active_agents = set()
+        cache, digest, result = self.get_cached_parse_result(record)
+        if result is None:
+            payload = self.read_payload(record, url)
+            if payload is None:
+                return
+            result = robotstxt_parser.parse(payload, self.args.extract_rulesets,
+                                            self.log_unknown_line, None,
+                                            self.args.max_payload_bytes,
+                                            self.args.max_line_length)
+            if cache is not None:
+                cache.put(digest, result)
+
+        for res in self.emit_parse_result(url, result):
+            yield res
+
+    def process_record_profiled(self, record):
+        """Same as `process_record`, but add the time spent per stage to
+        the profile. Returns a list of results, so that the time to
+        consume the results is not included."""
+        profile = self.profile
+        clock = time.perf_counter
+        start = clock()
+        accepted = self.accept_record(record)
+        now = clock()
+        profile.add('header_checks', now - start)
+        if not accepted:
+            return []
 
-        while line:
+        url = record.rec_headers.get_header('WARC-Target-URI')
 
-            self.robots_lines.add(1)
+        start = now
+        cache, digest, result = self.get_cached_parse_result(record)
+        if cache is not None:
+            now = clock()
+            profile.add('parse_cache', now - start)
+            start = now
+        if result is None:
+            payload = self.read_payload(record, url)
+            now = clock()
+            if payload is None:
+                return []
+            profile.add('payload_read', now - start, len(payload))
+            start = now
+            result = robotstxt_parser.parse(payload, self.args.extract_rulesets,
+                                            self.log_unknown_line, profile,
+                                            self.args.max_payload_bytes,
+                                            self.args.max_line_length)
+            now = clock()
+            profile.add_record(url, len(payload), now - start)
+            start = now
+            if cache is not None:
+                cache.put(digest, result)
+                now = clock()
+                profile.add('parse_cache', now - start)
+                start = now
+
+        results = list(self.emit_parse_result(url, result))
+        profile.add('emit', clock() - start)
+        return results
+
+    def emit_parse_result(self, url, result):
+        for res in result.counts:
+            yield res
+        if self.user_agent_topk is not None:
+            robotstxt_topk.add_user_agents(self.user_agent_topk, result.counts)
+
+        if result.is_html:
+            # skip over HTML content not recognized as such by HTTP header
+            self.get_logger().debug("Skipped HTML: %s", url)
+            if self.count_details:
+                self.counts['records_not_plain_text'] += 1
+            return
 
-            m = RobotstxtStatsJob.robotstxt_commentline_pattern.match(line)
-            if m:
-                yield ('(comment line)', None), 1
-                line = stream.readline()
-                continue
+        if result.truncated:
+            self.get_logger().debug("Truncated payload: %s", url)
+        if self.count_details:
+            counts = self.counts
+            counts['robots_lines'] += result.lines
+            counts['robots_directives'] += result.directives
+            counts['records_truncated'] += result.truncated
+            counts['lines_truncated'] += result.truncated_lines
+
+        if self.args.ruleset_output:
+            yield ('(ruleset)', url), result.ruleset
+        elif self.args.extract_rulesets:
+            ruleset = robotstxt_parser.ruleset_json(url, result.ruleset)
+            yield ('(ruleset)', ruleset), 1
 
-            m = RobotstxtStatsJob.robotstxt_emptyline_pattern.match(line)
-            if m:
-                yield ('(empty line)', None), 1
-                line = stream.readline()
-                continue
+    def write_counts_table(self, session, counts):
+        crawl = self.args.crawl
+        rows = counts.map(lambda r: robotstxt_parser.count_table_row(crawl, r[0], r[1]))
+        # sort rows by directive and value, so that Parquet row group
+        # statistics allow to skip data when filtering on directives
+        session.createDataFrame(rows, schema=self.counts_table_schema) \
+            .coalesce(self.args.num_output_partitions) \
+            .sortWithinPartitions("directive", "value_lc", "value") \
+            .write \
+            .mode("overwrite") \
+            .partitionBy("crawl") \
+            .format("parquet") \
+            .option("compression", self.args.counts_output_compression) \
+            .option("parquet.enable.dictionary", "true") \
+            .save(self.args.counts_output)
+
+    def run_job(self, session):
+        if not (self.args.ruleset_output or self.args.counts_output):
+            super(RobotstxtStatsJob, self).run_job(session)
+            return
 
-            m = RobotstxtStatsJob.robotstxt_known_directive_pattern.match(line)
-            if m:
-                self.robots_directives.add(1)
-                directive = m.group(1).lower().decode('utf-8', errors='replace')
-                value = m.group(2).strip().decode('utf-8', errors='replace')
-                value = RobotstxtStatsJob.white_space_pattern.sub(' ', value)
-                # note: comments are excluded from matched value
-                yield (directive, value), 1
-                line = stream.readline()
-                if self.args.extract_rulesets:
-                    if directive == 'user-agent':
-                        if inblock:
-                            active_agents = set()
-                        active_agents.add(value)
-                    elif directive in {'allow', 'disallow'}:
-                        inblock = True
-                        for agent in active_agents:
-                            rules_by_agent[agent].append((directive, value))
-                continue
+        input_data = session.sparkContext.textFile(self.args.input,
+                                                   minPartitions=self.args.num_input_partitions)
 
-            m = RobotstxtStatsJob.robotstxt_unknown_directive_pattern.match(line)
-            if m:
-                directive = m.group(1).lower().decode('utf-8', errors='replace')
-                yield ('(unknown directive)', directive), 1
-                line = stream.readline()
-                continue
+        output = input_data.mapPartitionsWithIndex(self.process_warcs)
+        if self.args.ruleset_output:
+            # records are processed once, counts and rulesets are split afterwards
+            output = output.persist(StorageLevel.MEMORY_AND_DISK)
+            counts = output.filter(lambda r: r[0][0] != '(ruleset)')
+        else:
+            counts = output
+        counts = counts.reduceByKey(self.reduce_by_key_func)
 
-            self.get_logger().info("Unknown line: %s", line)
-            yield ('(unknown line)', None), 1
+        # overwrite only the partition of the given crawl
+        session.conf.set("spark.sql.sources.partitionOverwriteMode", "dynamic")
 
-            line = stream.readline()
+        if self.args.counts_output:
+            self.write_counts_table(session, counts)
+        else:
+            session.createDataFrame(counts, schema=self.output_schema) \
+                .coalesce(self.args.num_output_partitions) \
+                .write \
+                .format(self.args.output_format) \
+                .option("compression", self.args.output_compression) \
+                .options(**self.get_output_options()) \
+                .saveAsTable(self.args.output)
+
+        if not self.args.ruleset_output:
+            self.log_accumulators(session)
+            return
 
-        if self.args.extract_rulesets:
-            d = OrderedDict()
-            for agent in sorted(rules_by_agent):
-                d[agent] = defaultdict(list)
-                for (directive, value) in sorted(rules_by_agent[agent]):
-                    d[agent][directive].append(value)
-            ruleset = json.dumps({url: d})
-            yield ('(ruleset)', ruleset), 1
+        crawl = self.args.crawl
+        rulesets = output.filter(lambda r: r[0][0] == '(ruleset)') \
+            .flatMap(lambda r: robotstxt_parser.ruleset_table_rows(crawl, r[0][1], r[1]))
+
+        # sort rows by user-agent, so that Parquet row group statistics
+        # allow to skip data when filtering on user-agents
+        session.createDataFrame(rulesets, schema=self.ruleset_schema) \
+            .coalesce(self.args.num_output_partitions) \
+            .sortWithinPartitions("user_agent_lc", "url") \
+            .write \
+            .mode("overwrite") \
+            .partitionBy("crawl") \
+            .format("parquet") \
+            .option("compression", self.args.ruleset_output_compression) \
+            .option("parquet.enable.dictionary", "true") \
+            .save(self.args.ruleset_output)
+
+        output.unpersist()
+
+        self.log_accumulators(session)
 
 
 if __name__ == "__main__":
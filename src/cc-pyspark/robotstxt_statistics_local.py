@@ -0,0 +1,327 @@
+"""Collect robots.txt statistics from local WARC files without Spark.
+
+Same parsing logic and outputs as the Spark job `robotstxt_statistics.py`,
+for samples and small top-k strata where starting a Spark session takes
+longer than the work. Every WARC file is processed by a worker of a
+process pool (one WARC file corresponds to one partition of the Spark
+job), counts are merged in memory. Outputs:
+ - directive counts, one line `directive<TAB>value<TAB>cnt` per key, as
+   extracted from the output of the Spark job in the data preparation
+   notebook (`counts/crawl=.../{crawl}.txt.zst`)
+ - and/or directive counts as Parquet table partitioned by crawl, same
+   schema as written by the Spark job with `--counts_output`
+ - and/or the user-agent top-k sketch as JSON, same format as written
+   by the Spark job with `--user_agent_topk_output`
+ - rulesets as JSON lines (`rulesets/{crawl}-rulesets.jsonl.zst`)
+ - and/or rulesets as Parquet table partitioned by crawl, same schema as
+   written by the Spark job with `--ruleset_output`
+Output files are zstd-compressed if the file name ends with `.zst`.
+"""
+
+import argparse
+import io
+import logging
+import os
+
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import zstandard
+
+from warcio.archiveiterator import ArchiveIterator
+
+import robotstxt_parser
+import robotstxt_topk
+
+
+logging.basicConfig(level='INFO',
+                    format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+
+# same schema as RobotstxtStatsJob.ruleset_schema
+ruleset_schema = pa.schema([
+    pa.field('url',             pa.string()),
+    pa.field('host',            pa.string()),
+    pa.field('user_agent',      pa.string()),
+    pa.field('user_agent_lc',   pa.string()),
+    pa.field('directive',       pa.string()),
+    pa.field('value',           pa.string()),
+])
+
+# same schema as RobotstxtStatsJob.counts_table_schema
+counts_table_schema = pa.schema([
+    pa.field('directive',       pa.string()),
+    pa.field('value',           pa.string()),
+    pa.field('value_lc',        pa.string()),
+    pa.field('cnt',             pa.int64()),
+])
+
+# counters logged at the end, in this order
+counters = [('records_processed', 'records processed = {}'),
+            ('records_not_response', 'records not WARC response = {}'),
+            ('records_not_http_200', 'records not HTTP 200 ok = {}'),
+            ('records_not_plain_text', 'records not plain text = {}'),
+            ('records_no_mime_type', 'records without MIME type = {}'),
+            ('robots_lines', 'robots.txt lines processed = {}'),
+            ('robots_directives', 'robots.txt directives found = {}'),
+            ('records_truncated', 'robots.txt payloads truncated (max. payload bytes) = {}'),
+            ('lines_truncated', 'robots.txt lines truncated (max. line length) = {}'),
+            ('parse_cache_hits', 'parse cache hits = {}'),
+            ('parse_cache_misses', 'parse cache misses = {}')]
+
+
+def log_unknown_line(line):
+    logging.debug('Unknown line: %s', line)
+
+
+def process_warc(path, extract_rulesets=False, parse_cache_size=0,
+                 max_bytes=robotstxt_parser.max_payload_bytes,
+                 max_line_length=robotstxt_parser.max_line_length):
+    """Process one WARC file, return the directive counts, the counters
+    (records, lines, etc.) and the list of extracted rulesets (tuples
+    `(url, ruleset)`)"""
+    counts = Counter()
+    stats = Counter()
+    rulesets = []
+    cache = None
+    if parse_cache_size > 0:
+        cache = robotstxt_parser.get_parse_result_cache(
+            parse_cache_size,
+            robotstxt_parser.cache_signature(extract_rulesets, max_bytes, max_line_length))
+    with open(path, 'rb') as stream:
+        for record in ArchiveIterator(stream):
+            stats['records_processed'] += 1
+            reason = robotstxt_parser.check_record(record)
+            if reason is not None:
+                stats[reason] += 1
+                continue
+
+            url = record.rec_headers.get_header('WARC-Target-URI')
+            digest = None
+            result = None
+            if cache is not None:
+                digest = record.rec_headers.get_header('WARC-Payload-Digest')
+            if digest:
+                result, _source = cache.get(digest)
+                if result is not None:
+                    stats['parse_cache_hits'] += 1
+                else:
+                    stats['parse_cache_misses'] += 1
+            if result is None:
+                try:
+                    payload = robotstxt_parser.read_payload(record.content_stream(), max_bytes)
+                except Exception as e:
+                    logging.error('Failed to read WARC payload: %s - %s', url, e)
+                    continue
+                result = robotstxt_parser.parse(payload, extract_rulesets, log_unknown_line, None,
+                                                max_bytes, max_line_length)
+                if digest:
+                    cache.put(digest, result)
+
+            # same as RobotstxtStatsJob.emit_parse_result
+            for key, cnt in result.counts:
+                counts[key] += cnt
+            if result.is_html:
+                stats['records_not_plain_text'] += 1
+                continue
+            stats['robots_lines'] += result.lines
+            stats['robots_directives'] += result.directives
+            stats['records_truncated'] += result.truncated
+            stats['lines_truncated'] += result.truncated_lines
+            if extract_rulesets:
+                rulesets.append((url, result.ruleset))
+    return counts, stats, rulesets
+
+
+def open_output(path):
+    """Open a text file for writing, zstd-compressed if the name ends with `.zst`"""
+    dir_name = os.path.dirname(path)
+    if dir_name:
+        os.makedirs(dir_name, exist_ok=True)
+    if path.endswith('.zst'):
+        stream = zstandard.ZstdCompressor(level=19).stream_writer(open(path, 'wb'))
+        return io.TextIOWrapper(stream, encoding='utf-8')
+    return open(path, 'w', encoding='utf-8')
+
+
+def write_counts(counts, path):
+    """Write directive counts, sorted by directive and value"""
+    with open_output(path) as fh:
+        for (directive, value), cnt in sorted(counts.items(),
+                                              key=lambda kv: (kv[0][0], kv[0][1] or '')):
+            fh.write('{}\t{}\t{}\n'.format(directive, value or '', cnt))
+    logging.info('Counts of %d keys written to %s', len(counts), path)
+
+
+def write_counts_table(counts, location, crawl, compression='zstd'):
+    """Write directive counts as Parquet file into the crawl partition,
+    rows sorted by directive and value (as done by the Spark job)"""
+    columns = [[] for _ in counts_table_schema]
+    for key, cnt in counts.items():
+        row = robotstxt_parser.count_table_row(crawl, key, cnt)
+        for column, value in zip(columns, row):
+            column.append(value)
+    table = pa.table([pa.array(column, type=field.type)
+                      for column, field in zip(columns, counts_table_schema)],
+                     schema=counts_table_schema)
+    table = table.sort_by([('directive', 'ascending'), ('value_lc', 'ascending'),
+                           ('value', 'ascending')])
+    output_dir = os.path.join(location, 'crawl=' + crawl)
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, 'part-00000.' + compression + '.parquet')
+    pq.write_table(table, output_path, compression=compression, use_dictionary=True)
+    logging.info('Counts table (%d rows) written to %s', table.num_rows, output_path)
+    return output_path
+
+
+def write_ruleset_table(rulesets, location, crawl, compression='zstd'):
+    """Write the rulesets as Parquet file into the crawl partition,
+    rows sorted by user-agent and URL (as done by the Spark job)"""
+    columns = [[] for _ in ruleset_schema]
+    for url, ruleset in rulesets:
+        for row in robotstxt_parser.ruleset_table_rows(crawl, url, ruleset):
+            for column, value in zip(columns, row):
+                column.append(value)
+    table = pa.table([pa.array(column, type=field.type)
+                      for column, field in zip(columns, ruleset_schema)],
+                     schema=ruleset_schema)
+    table = table.sort_by([('user_agent_lc', 'ascending'), ('url', 'ascending')])
+    output_dir = os.path.join(location, 'crawl=' + crawl)
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, 'part-00000.' + compression + '.parquet')
+    pq.write_table(table, output_path, compression=compression, use_dictionary=True)
+    logging.info('Ruleset table (%d rows) written to %s', table.num_rows, output_path)
+    return output_path
+
+
+def write_user_agent_topk(counts, path, capacity, crawl=None, records_processed=0):
+    """Write the user-agent top-k sketch. The merged counts are exact,
+    so are the counts of the sketch as long as the number of distinct
+    user-agents does not exceed the capacity."""
+    sketch = robotstxt_topk.SpaceSaving(capacity)
+    robotstxt_topk.add_user_agents(sketch, counts.items())
+    dir_name = os.path.dirname(path)
+    if dir_name:
+        os.makedirs(dir_name, exist_ok=True)
+    robotstxt_topk.write_sketch(sketch, path, crawl, records_processed=records_processed)
+    logging.info('User-agent top-k sketch (%d items) written to %s', len(sketch), path)
+
+
+def read_input(paths):
+    """List of WARC files: paths of WARC files, or text files listing
+    WARC files (one per line, optionally prefixed by `file:`, same as the
+    input of the Spark job)"""
+    warc_files = []
+    for path in paths:
+        if path.endswith('.txt'):
+            with open(path) as fh:
+                for line in fh:
+                    line = line.strip()
+                    if line.startswith('file:'):
+                        line = line[5:]
+                    if line:
+                        warc_files.append(line)
+        else:
+            warc_files.append(path)
+    return warc_files
+
+
+def run(args):
+    warc_files = read_input(args.input)
+    logging.info('Processing %d WARC files using %d processes', len(warc_files), args.processes)
+    extract_rulesets = bool(args.rulesets_output or args.ruleset_table)
+    counts = Counter()
+    stats = Counter()
+    table_rulesets = []
+    rulesets_out = None
+    if args.rulesets_output:
+        rulesets_out = open_output(args.rulesets_output)
+    try:
+        with ProcessPoolExecutor(max_workers=args.processes) as executor:
+            futures = {executor.submit(process_warc, path, extract_rulesets,
+                                       args.parse_cache_size, args.max_payload_bytes,
+                                       args.max_line_length): path
+                       for path in warc_files}
+            for future in as_completed(futures):
+                c, s, rulesets = future.result()
+                counts.update(c)
+                stats.update(s)
+                if rulesets_out is not None:
+                    for url, ruleset in rulesets:
+                        rulesets_out.write(robotstxt_parser.ruleset_json(url, ruleset))
+                        rulesets_out.write('\n')
+                if args.ruleset_table:
+                    table_rulesets.extend(rulesets)
+                logging.info('Processed %s (%d records)', futures[future],
+                             s['records_processed'])
+    finally:
+        if rulesets_out is not None:
+            rulesets_out.close()
+    if args.rulesets_output:
+        logging.info('Rulesets written to %s', args.rulesets_output)
+
+    for name, template in counters:
+        if name.startswith('parse_cache') and args.parse_cache_size <= 0:
+            continue
+        logging.info(template.format(stats[name]))
+
+    write_counts(counts, args.output)
+    if args.counts_table:
+        write_counts_table(counts, args.counts_table, args.crawl)
+    if args.user_agent_topk_output:
+        write_user_agent_topk(counts, args.user_agent_topk_output, args.user_agent_topk_size,
+                              args.crawl, stats['records_processed'])
+    if args.ruleset_table:
+        write_ruleset_table(table_rulesets, args.ruleset_table, args.crawl)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('input', nargs='+',
+                        help='WARC files, or text files (.txt) listing WARC files,'
+                        ' one per line')
+    parser.add_argument('output',
+                        help='Output file of directive counts'
+                        ' (`directive<TAB>value<TAB>cnt` per line)')
+    parser.add_argument('--counts_table', default=None,
+                        help='Write the directive counts also into a Parquet table'
+                        ' at this location, partitioned by crawl. Requires --crawl')
+    parser.add_argument('--rulesets_output', default=None,
+                        help='Extract rulesets and write them as JSON lines to this file')
+    parser.add_argument('--ruleset_table', default=None,
+                        help='Extract rulesets and write them into a Parquet table'
+                        ' at this location, partitioned by crawl. Requires --crawl')
+    parser.add_argument('--user_agent_topk_output', default=None,
+                        help='Write the top-k lowercased user-agent names and their'
+                        ' counts (JSON, same format as the sketch written by the Spark job)')
+    parser.add_argument('--user_agent_topk_size', type=int, default=20000,
+                        help='Max. number of user-agent names written by'
+                        ' --user_agent_topk_output')
+    parser.add_argument('--crawl', default=None,
+                        help='Crawl identifier (e.g. CC-MAIN-2025-05), value'
+                        ' of the partition column of the ruleset and counts table')
+    parser.add_argument('--processes', type=int, default=os.cpu_count(),
+                        help='Number of worker processes')
+    parser.add_argument('--parse_cache_size', type=int, default=0,
+                        help='Cache parse results of identical robots.txt payloads,'
+                        ' identified by the WARC-Payload-Digest. Max. number of'
+                        ' cached results per worker process, 0 disables the cache')
+    parser.add_argument('--max_payload_bytes', type=int,
+                        default=robotstxt_parser.max_payload_bytes,
+                        help='Max. number of bytes read and parsed per robots.txt'
+                        ' payload, longer payloads are truncated (at the last line'
+                        ' break). 0 means no limit')
+    parser.add_argument('--max_line_length', type=int,
+                        default=robotstxt_parser.max_line_length,
+                        help='Max. length (bytes) of a robots.txt line, longer lines'
+                        ' are truncated. 0 means no limit')
+    args = parser.parse_args()
+
+    if args.ruleset_table and not args.crawl:
+        parser.error('Option --ruleset_table requires --crawl')
+    if args.counts_table and not args.crawl:
+        parser.error('Option --counts_table requires --crawl')
+
+    run(args)
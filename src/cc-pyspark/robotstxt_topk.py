@@ -0,0 +1,144 @@
+"""Approximate top-k counts of user-agent names by the Space-Saving
+algorithm (Metwally et al. 2005), mergeable as described by Agarwal et al.
+2012, "Mergeable Summaries". A sketch is built per partition and the
+sketches of all partitions are merged (by a Spark accumulator in the Spark
+job), so that the frequent user-agents of a crawl are known without
+aggregating and scanning the full directive counts.
+
+A sketch of capacity m over a stream of total count N overestimates any
+count by at most N/m (the `error` of an item). Every item with a true
+count above N/m is contained in the sketch.
+
+The module does not depend on Spark, see also `robotstxt_parser.py`.
+"""
+
+import heapq
+import json
+
+
+class SpaceSaving(object):
+    """Space-Saving sketch holding at most `capacity` items, each with an
+    (over)estimated count and the max. overestimation (error)"""
+
+    def __init__(self, capacity=20000):
+        self.capacity = capacity
+        # total count of all added items
+        self.total = 0
+        # item -> [count, error]
+        self.items = dict()
+        # min-heap of (count, item), one entry per item. Counts only
+        # increase, entries are updated lazily when an item is evicted.
+        self._heap = []
+
+    def __len__(self):
+        return len(self.items)
+
+    def min_count(self):
+        """Min. count of the sketch, the count assigned to items not
+        contained in a full sketch"""
+        if len(self.items) < self.capacity:
+            return 0
+        heap = self._heap
+        items = self.items
+        while True:
+            count, item = heap[0]
+            current = items[item][0]
+            if count == current:
+                return count
+            heapq.heapreplace(heap, (current, item))
+
+    def add(self, item, count=1):
+        self.total += count
+        entry = self.items.get(item)
+        if entry is not None:
+            entry[0] += count
+            return
+        if len(self.items) < self.capacity:
+            self.items[item] = [count, 0]
+            heapq.heappush(self._heap, (count, item))
+            return
+        # evict the item with the min. count
+        min_count = self.min_count()
+        _, evicted = self._heap[0]
+        del self.items[evicted]
+        self.items[item] = [min_count + count, min_count]
+        heapq.heapreplace(self._heap, (min_count + count, item))
+
+    def merge(self, other):
+        """Add the sketch of another partition: counts of items contained
+        in one sketch only are increased by the min. count of the other
+        sketch, then the `capacity` items with the highest counts are
+        kept"""
+        min1 = self.min_count()
+        min2 = other.min_count()
+        merged = dict()
+        for item, (count, error) in self.items.items():
+            entry = other.items.get(item)
+            if entry is None:
+                merged[item] = [count + min2, error + min2]
+            else:
+                merged[item] = [count + entry[0], error + entry[1]]
+        for item, (count, error) in other.items.items():
+            if item not in merged:
+                merged[item] = [count + min1, error + min1]
+        if len(merged) > self.capacity:
+            top = heapq.nlargest(self.capacity, merged.items(), key=lambda kv: kv[1][0])
+            merged = dict(top)
+        self.items = merged
+        self._heap = [(count, item) for item, (count, _error) in merged.items()]
+        heapq.heapify(self._heap)
+        self.total += other.total
+        return self
+
+    def top(self, n=None):
+        """List of (item, count, error) sorted by decreasing count"""
+        rows = sorted(((item, count, error) for item, (count, error) in self.items.items()),
+                      key=lambda r: (-r[1], r[0]))
+        if n is not None:
+            return rows[:n]
+        return rows
+
+    def to_dict(self, n=None):
+        """Sketch as dictionary, to be serialized as JSON. `count` is
+        the estimated count, `count - error` a lower bound of the true
+        count"""
+        return {
+            'capacity': self.capacity,
+            'total': self.total,
+            'min_count': self.min_count(),
+            'items': [{'item': item, 'count': count, 'error': error}
+                      for item, count, error in self.top(n)],
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        sketch = cls(d['capacity'])
+        sketch.total = d['total']
+        for row in d['items']:
+            sketch.items[row['item']] = [row['count'], row['error']]
+        sketch._heap = [(count, item) for item, (count, _error) in sketch.items.items()]
+        heapq.heapify(sketch._heap)
+        return sketch
+
+
+def add_user_agents(sketch, counts):
+    """Add the user-agent counts of a parse result (pairs of
+    ((directive, value), count)) to the sketch, user-agent names are
+    lowercased, empty names are skipped"""
+    for (directive, value), cnt in counts:
+        if directive == 'user-agent' and value:
+            sketch.add(value.lower(), cnt)
+
+
+def write_sketch(sketch, path, crawl=None, **meta):
+    """Write the sketch as JSON"""
+    d = {'crawl': crawl}
+    d.update(meta)
+    d.update(sketch.to_dict())
+    with open(path, 'w', encoding='utf-8') as fh:
+        json.dump(d, fh, indent=1, ensure_ascii=False)
+
+
+def read_sketch(path):
+    with open(path, encoding='utf-8') as fh:
+        return SpaceSaving.from_dict(json.load(fh))
@@ -0,0 +1,325 @@
+"""Classify the robots.txt rulesets extracted by `robotstxt_statistics.py`
+per user-agent into disallow-all, allow-all and allow-part.
+
+The rulesets of every crawl (`{crawl}-rulesets.jsonl.zst`) are classified
+by a separate worker process. Results are streamed to a Parquet table
+partitioned by crawl, with one row per robots.txt URL and user-agent.
+
+If a manifest is given, crawls are skipped if the ruleset file, the
+user-agents to keep and this script are unchanged since the last run.
+
+Most robots.txt files do not change from one crawl to the next. With
+`--reuse_unchanged`, the crawls are processed in chronological order
+in chains of consecutive crawls, one chain per worker process. The
+classification of a ruleset is looked up by the ruleset fingerprint
+(see `robotstxt_fingerprints.py`) among the rulesets of the current and
+the previous crawl, and only new or changed rulesets are parsed and
+classified.
+"""
+
+import argparse
+import hashlib
+import io
+import logging
+import os
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import zstandard
+
+from pipeline_manifest import input_fingerprint, open_manifest, script_version
+from robotstxt_fingerprints import fingerprint, read_serialized_rulesets, rulesets_path
+
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+
+logging.basicConfig(level='INFO',
+                    format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+
+robotstxt_ruleset_classes = ['disallow-all', 'allow-all', 'allow-part']
+
+ruleset_class_index = {c: i for i, c in enumerate(robotstxt_ruleset_classes)}
+_ruleset_class_categories = pa.array(robotstxt_ruleset_classes)
+
+ruleset_classes_schema = pa.schema([
+    pa.field('url',             pa.string()),
+    pa.field('user_agent',      pa.string()),
+    pa.field('ruleset_class',   pa.dictionary(pa.int8(), pa.string()))
+])
+
+
+def classify_robotstxt_rules(rules: dict) -> str:
+    # allow-all, disallow-all, allow-part
+    if rules == {'disallow': ['/']}:
+        return 'disallow-all'
+    if (rules == {'allow': ['/']} or rules == {'allow': ['*']}
+        or rules == {'allow': ['/*']} or rules == {'allow': ['']}
+        or rules == {'disallow': ['']}):
+        return 'allow-all'
+    return 'allow-part'
+
+
+def read_rulesets(path: str):
+    """Stream robots.txt rulesets from a (zstd-compressed) JSONL file,
+    yield tuples (url, rulesets per user-agent)"""
+    with open(path, 'rb') as fh:
+        stream = fh
+        if path.endswith('.zst'):
+            stream = zstandard.ZstdDecompressor().stream_reader(fh)
+        for line in io.TextIOWrapper(stream, encoding='utf-8'):
+            obj = json.loads(line)
+            for url, rulesets in obj.items():
+                yield url, rulesets
+
+
+def _write_classes_batch(writer: pq.ParquetWriter, urls: list, agents: list, classes: list):
+    """Write one batch of ruleset classes (class indices) and clear the
+    lists"""
+    indices = pa.array(classes, type=pa.int8())
+    batch = pa.record_batch([pa.array(urls, type=pa.string()),
+                             pa.array(agents, type=pa.string()),
+                             pa.DictionaryArray.from_arrays(indices, _ruleset_class_categories)],
+                            schema=ruleset_classes_schema)
+    writer.write_batch(batch)
+    urls.clear()
+    agents.clear()
+    classes.clear()
+
+
+def classify_rulesets(input_path: str, output_path: str, useragents=None,
+                      batch_size: int = 250_000, reuse: dict = None) -> int:
+    """Classify all rulesets in one input file and write the results to
+    a Parquet file in batches. If a set of (lowercase) user-agents is
+    given, other user-agents are skipped. Returns the number of rows
+    written.
+
+    If a dictionary `reuse` is given, it maps ruleset fingerprints to
+    the classification results (user-agents and class indices) of the
+    previous crawl. Results are reused for identical rulesets, and
+    `reuse` is replaced by the results of this crawl."""
+    if reuse is not None:
+        return _classify_rulesets_reuse(input_path, output_path, useragents,
+                                        batch_size, reuse)
+    n_rows = 0
+    urls, agents, classes = [], [], []
+
+    with pq.ParquetWriter(output_path, ruleset_classes_schema,
+                          compression='zstd') as writer:
+        for url, rulesets in read_rulesets(input_path):
+            for ua, rules in rulesets.items():
+                if useragents is not None and ua.lower() not in useragents:
+                    # skip less frequent user-agents
+                    continue
+                urls.append(url)
+                agents.append(ua)
+                classes.append(ruleset_class_index[classify_robotstxt_rules(rules)])
+            if len(urls) >= batch_size:
+                n_rows += len(urls)
+                _write_classes_batch(writer, urls, agents, classes)
+        if urls:
+            n_rows += len(urls)
+            _write_classes_batch(writer, urls, agents, classes)
+
+    return n_rows
+
+
+def _classify_rulesets_reuse(input_path: str, output_path: str, useragents,
+                             batch_size: int, reuse: dict) -> int:
+    """Same as `classify_rulesets`, but reuse the results of identical
+    rulesets, see the argument `reuse`"""
+    current = dict()
+    n_rows = 0
+    n_rulesets = 0
+    n_reused = 0
+    urls, agents, classes = [], [], []
+
+    with pq.ParquetWriter(output_path, ruleset_classes_schema,
+                          compression='zstd') as writer:
+        for url, ruleset in read_serialized_rulesets(input_path):
+            n_rulesets += 1
+            fp = fingerprint(ruleset)
+            result = current.get(fp)
+            if result is None:
+                result = reuse.get(fp)
+                if result is None:
+                    uas, cls = [], []
+                    for ua, rules in json.loads(ruleset).items():
+                        if useragents is not None and ua.lower() not in useragents:
+                            # skip less frequent user-agents
+                            continue
+                        uas.append(ua)
+                        cls.append(ruleset_class_index[classify_robotstxt_rules(rules)])
+                    result = (uas, cls)
+                else:
+                    n_reused += 1
+                current[fp] = result
+            else:
+                n_reused += 1
+            uas, cls = result
+            if uas:
+                urls.extend([url] * len(uas))
+                agents.extend(uas)
+                classes.extend(cls)
+            if len(urls) >= batch_size:
+                n_rows += len(urls)
+                _write_classes_batch(writer, urls, agents, classes)
+        if urls:
+            n_rows += len(urls)
+            _write_classes_batch(writer, urls, agents, classes)
+
+    logging.info('Classification of %d of %d rulesets reused from identical rulesets',
+                 n_reused, n_rulesets)
+    reuse.clear()
+    reuse.update(current)
+    return n_rows
+
+
+def ruleset_classes_fingerprint(crawl: str, input_location: str, useragents=None) -> dict:
+    """Fingerprint of the inputs of the ruleset classification of one crawl"""
+    useragents_hash = None
+    if useragents is not None:
+        useragents_hash = hashlib.sha1('\n'.join(sorted(useragents)).encode('utf-8')).hexdigest()
+    return input_fingerprint([rulesets_path(crawl, input_location)],
+                             script_version(__file__), user_agents=useragents_hash)
+
+
+def classify_crawl(crawl: str, input_location: str, output_location: str,
+                   useragents=None, reuse: dict = None) -> tuple:
+    """Classify the rulesets of one crawl, return the number of rows
+    and the output path"""
+    input_path = rulesets_path(crawl, input_location)
+    output_dir = os.path.join(output_location, 'crawl=' + crawl)
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, 'ruleset-classes-' + crawl + '.zstd.parquet')
+    n_rows = classify_rulesets(input_path, output_path, useragents, reuse=reuse)
+    logging.info('Ruleset classes of crawl %s (%d rows) saved to %s',
+                 crawl, n_rows, output_path)
+    return n_rows, output_path
+
+
+def classify_crawl_chain(crawls: list, input_location: str, output_location: str,
+                         useragents=None) -> list:
+    """Classify the rulesets of consecutive crawls one after the other,
+    reusing the results of identical rulesets of the previous crawl.
+    Returns a list of tuples (crawl, number of rows, output path)."""
+    reuse = dict()
+    results = list()
+    for crawl in crawls:
+        n_rows, output_path = classify_crawl(crawl, input_location, output_location,
+                                             useragents, reuse)
+        results.append((crawl, n_rows, output_path))
+    return results
+
+
+def crawl_chains(crawls: list, n_chains: int) -> list:
+    """Split the crawls, sorted chronologically, into at most `n_chains`
+    chains of consecutive crawls of similar length"""
+    crawls = sorted(crawls)
+    n_chains = max(1, min(n_chains, len(crawls)))
+    size, rest = divmod(len(crawls), n_chains)
+    chains = list()
+    start = 0
+    for i in range(n_chains):
+        end = start + size + (1 if i < rest else 0)
+        chains.append(crawls[start:end])
+        start = end
+    return [chain for chain in chains if chain]
+
+
+def classify_crawls(crawls: list, input_location: str, output_location: str,
+                    useragents=None, num_workers: int = None, manifest_path: str = None,
+                    reuse_unchanged: bool = False):
+    """Classify the rulesets of multiple crawls in parallel,
+    one worker process per crawl. If a manifest is given, crawls
+    with unchanged inputs are skipped. If `reuse_unchanged` is true,
+    one worker process classifies a chain of consecutive crawls,
+    reusing the results of identical rulesets of the previous crawl."""
+    manifest = open_manifest(manifest_path)
+    fingerprints = dict()
+    if manifest:
+        for crawl in crawls:
+            fingerprints[crawl] = ruleset_classes_fingerprint(crawl, input_location, useragents)
+        crawls = [crawl for crawl in crawls
+                  if not manifest.is_up_to_date('ruleset_classes', crawl, fingerprints[crawl])]
+        logging.info('Ruleset classes to be updated for %d crawls', len(crawls))
+    if reuse_unchanged:
+        chains = crawl_chains(crawls, num_workers or os.cpu_count())
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            futures = [executor.submit(classify_crawl_chain, chain, input_location,
+                                       output_location, useragents)
+                       for chain in chains]
+            for future in as_completed(futures):
+                for crawl, _, output_path in future.result():
+                    if manifest:
+                        manifest.update('ruleset_classes', crawl, fingerprints[crawl],
+                                        [output_path])
+        return
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        futures = {executor.submit(classify_crawl, crawl, input_location,
+                                   output_location, useragents): crawl
+                   for crawl in crawls}
+        for future in as_completed(futures):
+            _, output_path = future.result()
+            if manifest:
+                crawl = futures[future]
+                manifest.update('ruleset_classes', crawl, fingerprints[crawl], [output_path])
+
+
+def read_useragents(path: str) -> set:
+    """Read the lowercase user-agent names from the first column
+    of a CSV file, e.g. `user-agents-frequent.csv`"""
+    df = pd.read_csv(path, index_col=0, keep_default_na=False)
+    return set(df.index.astype(str))
+
+
+def ruleset_classes_to_dict(df: pd.DataFrame) -> pd.DataFrame:
+    """Convert the table of ruleset classes (one row per URL and user-agent)
+    into one row per crawl and URL with a dictionary user-agent ->
+    ruleset class in the column `ruleset_classes`"""
+    ruleset_classes = dict()
+    for crawl, url, ua, ruleset_class in zip(df['crawl'], df['url'], df['user_agent'],
+                                             df['ruleset_class'].astype(str)):
+        ruleset_classes.setdefault((crawl, url), dict())[ua] = ruleset_class
+    index = pd.MultiIndex.from_tuples(ruleset_classes.keys(), names=['crawl', 'url'])
+    return pd.DataFrame({'ruleset_classes': list(ruleset_classes.values())},
+                        index=index).reset_index()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('input_location',
+                        help='Directory containing the ruleset files'
+                        ' `{crawl}-rulesets.jsonl.zst`')
+    parser.add_argument('output_location',
+                        help='Output location (local directory)')
+    parser.add_argument('crawl_data_set', nargs='+',
+                        help='Common Crawl crawl dataset(s) to process, eg. CC-MAIN-2022-33')
+    parser.add_argument('--user_agents', default=None,
+                        help='CSV file with user-agents (lowercase, first column)'
+                        ' to keep, e.g. data/top-k-sample/user-agents-frequent.csv.'
+                        ' If not given, all user-agents are kept')
+    parser.add_argument('--num_workers', type=int, default=os.cpu_count(),
+                        help='Number of parallel worker processes')
+    parser.add_argument('--manifest', default=None,
+                        help='Manifest file (JSON, local) recording inputs and outputs'
+                        ' per crawl. If given, crawls with unchanged inputs are skipped')
+    parser.add_argument('--reuse_unchanged', action='store_true',
+                        help='Process the crawls in chronological order, in chains of'
+                        ' consecutive crawls per worker process, and reuse the'
+                        ' classification of rulesets identical to one of the previous'
+                        ' crawl (identified by the ruleset fingerprint)')
+    args = parser.parse_args()
+
+    useragents = None
+    if args.user_agents:
+        useragents = read_useragents(args.user_agents)
+
+    classify_crawls(args.crawl_data_set, args.input_location, args.output_location,
+                    useragents, args.num_workers, args.manifest, args.reuse_unchanged)
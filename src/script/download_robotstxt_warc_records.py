@@ -0,0 +1,396 @@
+"""Download the WARC records listed by `get_robotstxt_download_list.py`
+and write them into a local WARC file per crawl.
+
+Records are grouped by WARC file and sorted by offset. Records close to
+each other are fetched by a single HTTP range request, the bytes between
+the records are dropped. WARC files are processed concurrently over a
+pool of reused HTTP connections.
+
+Every record is a separate gzip member, so the records are simply
+concatenated into the output file `robotstxt-captures-{crawl}.warc.gz`.
+A checkpoint file next to it lists the WARC files already processed
+together with the size of the output file and the digest of the
+download list. An interrupted download is resumed from the last
+checkpoint, unless the download list has changed: then the WARC file
+of the crawl is downloaded again from scratch. WARC files which failed
+to download (e.g. HTTP 404 or retries exhausted) are skipped and not
+checkpointed, running the script again retries them.
+
+If the server does not support range requests, the records of a WARC
+file are read in a single pass over the file.
+
+With `--manifest`, crawls are skipped if the download list is unchanged
+since the last complete download.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+
+from collections import Counter
+
+import aiohttp
+import pandas as pd
+
+from pipeline_manifest import input_fingerprint, open_manifest, script_version
+
+
+logging.basicConfig(level='INFO',
+                    format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+
+# HTTP status codes of failed requests which are retried
+retry_http_status = {429, 500, 502, 503, 504}
+
+gzip_magic = b'\x1f\x8b'
+
+
+def merge_ranges(offsets, lengths, max_gap: int, max_range_size: int) -> list:
+    """Merge the byte ranges of records (sorted by offset) into fewer
+    ranges. Records are merged if the gap to the preceding record is not
+    larger than `max_gap` bytes and the merged range does not exceed
+    `max_range_size` bytes. Returns a list of tuples (start, end, records)
+    with records a list of (offset, length)."""
+    ranges = list()
+    start = end = None
+    records = list()
+    for offset, length in zip(offsets, lengths):
+        if records and (offset - end) <= max_gap \
+                and (offset + length - start) <= max_range_size:
+            records.append((offset, length))
+            end = max(end, offset + length)
+            continue
+        if records:
+            ranges.append((start, end, records))
+        start, end = offset, offset + length
+        records = [(offset, length)]
+    if records:
+        ranges.append((start, end, records))
+    return ranges
+
+
+def download_list_digest(path: str) -> str:
+    """Digest of the content of the download list"""
+    with open(path, 'rb') as fh:
+        return hashlib.sha1(fh.read()).hexdigest()
+
+
+def read_download_list(path: str) -> list:
+    """Read the download list (CSV) and group the records by WARC file.
+    Returns a list of tuples (warc_filename, offsets, lengths), records
+    sorted by offset, duplicated records removed."""
+    df = pd.read_csv(path, usecols=['warc_filename', 'warc_record_offset', 'warc_record_length'])
+    df = df.drop_duplicates().sort_values(['warc_filename', 'warc_record_offset'])
+    return [(warc_filename,
+             d['warc_record_offset'].to_numpy(dtype='int64').tolist(),
+             d['warc_record_length'].to_numpy(dtype='int64').tolist())
+            for warc_filename, d in df.groupby('warc_filename', sort=True)]
+
+
+class WarcSubsetWriter:
+    """Write WARC records into the output file and keep track of the WARC
+    files already processed in a checkpoint file (one JSON object per line).
+    The output file is truncated to the size recorded by the last
+    checkpoint, so that records of incomplete WARC files are not written
+    twice. Checkpoints written for a different download list (digest)
+    are discarded."""
+
+    def __init__(self, output_path: str, checkpoint_path: str, download_list: str = None):
+        self.download_list = download_list
+        self.done = set()
+        size = 0
+        resume = os.path.exists(checkpoint_path) and os.path.exists(output_path)
+        if resume:
+            with open(checkpoint_path) as fh:
+                for line in fh:
+                    try:
+                        obj = json.loads(line)
+                    except ValueError:
+                        # incomplete line written when interrupted
+                        break
+                    if obj.get('download_list') != download_list:
+                        logging.info('Download list changed, discarding previous download'
+                                     ' (%s)', output_path)
+                        resume = False
+                        self.done = set()
+                        size = 0
+                        break
+                    self.done.add(obj['warc_filename'])
+                    size = obj['size']
+        if resume:
+            self.output = open(output_path, 'r+b')
+            self.output.truncate(size)
+            self.output.seek(size)
+            self.checkpoint = open(checkpoint_path, 'a')
+        else:
+            self.output = open(output_path, 'wb')
+            self.checkpoint = open(checkpoint_path, 'w')
+        if self.done:
+            logging.info('Resuming download: %d WARC files already processed'
+                         ' (%d bytes written to %s)',
+                         len(self.done), size, output_path)
+
+    def write(self, warc_filename: str, records: list):
+        for record in records:
+            self.output.write(record)
+        self.output.flush()
+        self.checkpoint.write(json.dumps({'warc_filename': warc_filename,
+                                          'records': len(records),
+                                          'size': self.output.tell(),
+                                          'download_list': self.download_list}) + '\n')
+        self.checkpoint.flush()
+
+    def close(self):
+        self.output.close()
+        self.checkpoint.close()
+
+
+class RetryableError(IOError):
+    """Failed request which is retried"""
+    pass
+
+
+class RangeNotSupported(Exception):
+    """Raised if the server ignores the Range header and sends the full
+    content"""
+    pass
+
+
+async def with_retries(request, description: str, max_retries: int):
+    """Run the request, retrying failed requests with exponential backoff"""
+    for attempt in range(max_retries + 1):
+        try:
+            return await request()
+        except RetryableError as e:
+            error = str(e)
+        except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError,
+                asyncio.TimeoutError) as e:
+            error = repr(e)
+        if attempt == max_retries:
+            raise IOError('Failed to fetch %s: %s' % (description, error))
+        delay = 2 ** attempt
+        logging.warning('Failed to fetch %s: %s - retrying in %d sec.',
+                        description, error, delay)
+        await asyncio.sleep(delay)
+
+
+def check_status(response: aiohttp.ClientResponse, description: str):
+    if response.status in retry_http_status:
+        raise RetryableError('HTTP status %d' % response.status)
+    # not retried
+    raise IOError('Failed to fetch %s: HTTP status %d' % (description, response.status))
+
+
+async def fetch_range(session: aiohttp.ClientSession, url: str, start: int, end: int,
+                      max_retries: int) -> bytes:
+    """Fetch the bytes [start, end) of a remote file, retrying failed
+    requests with exponential backoff. Raises `RangeNotSupported` if
+    the server sends the full content."""
+    headers = {'Range': 'bytes=%d-%d' % (start, end - 1)}
+    description = '%s (bytes %d-%d)' % (url, start, end - 1)
+
+    async def request():
+        async with session.get(url, headers=headers) as response:
+            if response.status == 200:
+                # the connection is closed without reading the content
+                raise RangeNotSupported()
+            if response.status != 206:
+                check_status(response, description)
+            data = await response.read()
+        if len(data) != (end - start):
+            raise RetryableError('got %d bytes, expected %d' % (len(data), (end - start)))
+        return data
+
+    return await with_retries(request, description, max_retries)
+
+
+async def fetch_ranges_sequentially(session: aiohttp.ClientSession, url: str, ranges: list,
+                                    max_retries: int, timeout: int) -> list:
+    """Fetch the byte ranges [start, end) (sorted, not overlapping) of a
+    remote file in a single pass over the file, for servers not
+    supporting range requests. Returns a list with the bytes of every
+    range. Reading stops after the last range, `timeout` applies to
+    every read, not to the whole request."""
+    description = '%s (%d ranges, sequentially)' % (url, len(ranges))
+
+    async def request():
+        async with session.get(url, timeout=aiohttp.ClientTimeout(sock_read=timeout)) \
+                as response:
+            if response.status not in (200, 206):
+                check_status(response, description)
+            stream = response.content
+            data = list()
+            pos = 0
+            try:
+                for start, end in ranges:
+                    if start < pos:
+                        raise IOError('Failed to fetch %s: overlapping ranges' % description)
+                    while pos < start:
+                        # skip over the bytes between the ranges
+                        pos += len(await stream.readexactly(min(start - pos, 1 << 20)))
+                    data.append(await stream.readexactly(end - start))
+                    pos = end
+            except asyncio.IncompleteReadError as e:
+                raise RetryableError('got %d bytes, expected %d'
+                                     % (pos + len(e.partial), ranges[-1][1]))
+        return data
+
+    return await with_retries(request, description, max_retries)
+
+
+def extract_records(url: str, start: int, data: bytes, records: list, stats: Counter) -> list:
+    """Cut the records [(offset, length)] from the data of a range
+    starting at `start`"""
+    result = list()
+    for offset, length in records:
+        record = data[(offset - start):(offset - start + length)]
+        if not record.startswith(gzip_magic):
+            logging.warning('Skipping invalid WARC record (not gzipped): %s offset %d',
+                            url, offset)
+            stats['records_invalid'] += 1
+            continue
+        result.append(record)
+    return result
+
+
+async def fetch_warc_records(session: aiohttp.ClientSession, url: str, offsets: list,
+                             lengths: list, args, stats: Counter) -> list:
+    """Fetch the records of one WARC file, return a list of records (bytes)"""
+    records = list()
+    ranges = merge_ranges(offsets, lengths, args.max_range_gap, args.max_range_size)
+    for i, (start, end, range_records) in enumerate(ranges):
+        try:
+            data = await fetch_range(session, url, start, end, args.max_retries)
+        except RangeNotSupported:
+            # read the remaining ranges in a single pass over the file
+            logging.warning('Range requests not supported, reading %s sequentially', url)
+            stats['sequential_reads'] += 1
+            remaining = ranges[i:]
+            data = await fetch_ranges_sequentially(session, url,
+                                                   [(s, e) for s, e, _ in remaining],
+                                                   args.max_retries, args.timeout)
+            for (start, end, range_records), range_data in zip(remaining, data):
+                stats['bytes_fetched'] += len(range_data)
+                records.extend(extract_records(url, start, range_data, range_records, stats))
+            break
+        stats['range_requests'] += 1
+        stats['bytes_fetched'] += len(data)
+        records.extend(extract_records(url, start, data, range_records, stats))
+    return records
+
+
+async def download(warc_files: list, writer: WarcSubsetWriter, args) -> Counter:
+    stats = Counter()
+    queue = asyncio.Queue()
+    for warc_file in warc_files:
+        if warc_file[0] in writer.done:
+            stats['warc_files_skipped'] += 1
+            continue
+        queue.put_nowait(warc_file)
+
+    async def worker(session):
+        while True:
+            try:
+                warc_filename, offsets, lengths = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                records = await fetch_warc_records(session, args.base_url + warc_filename,
+                                                   offsets, lengths, args, stats)
+            except (IOError, aiohttp.ClientError) as e:
+                # not checkpointed: retried when the download is resumed
+                logging.error('Skipping WARC file %s: %s', warc_filename, e)
+                stats['warc_files_failed'] += 1
+                continue
+            writer.write(warc_filename, records)
+            stats['warc_files'] += 1
+            stats['records'] += len(records)
+            if (stats['warc_files'] % 1000) == 0:
+                logging.info('Processed %d WARC files (%d records)',
+                             stats['warc_files'], stats['records'])
+
+    connector = aiohttp.TCPConnector(limit=args.num_connections)
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        await asyncio.gather(*[worker(session) for _ in range(args.num_connections)])
+    return stats
+
+
+def download_list_path(crawl, args):
+    return os.path.join(args.input_location,
+                        'crawl=' + crawl,
+                        'robotstxt-captures-' + crawl + '.csv')
+
+
+def download_warc_records(crawl, args):
+    """Download the WARC records of one crawl, return the output path,
+    or None if the download is incomplete (WARC files failed). An
+    interrupted download of the same download list is resumed."""
+    input_path = download_list_path(crawl, args)
+    warc_files = read_download_list(input_path)
+    logging.info('Download list for crawl %s: %d records in %d WARC files',
+                 crawl, sum(len(f[1]) for f in warc_files), len(warc_files))
+
+    output_dir = os.path.join(args.output_location, 'crawl=' + crawl)
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, 'robotstxt-captures-' + crawl + '.warc.gz')
+    writer = WarcSubsetWriter(output_path, output_path + '.checkpoint',
+                              download_list_digest(input_path))
+    try:
+        stats = asyncio.run(download(warc_files, writer, args))
+    finally:
+        writer.close()
+    logging.info('WARC records of crawl %s saved to %s: %s',
+                 crawl, output_path, ', '.join('%s = %d' % s for s in sorted(stats.items())))
+    if stats['warc_files_failed']:
+        logging.warning('Download of crawl %s incomplete: %d WARC files failed,'
+                        ' run again to retry them', crawl, stats['warc_files_failed'])
+        return None
+    return output_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('input_location',
+                        help='Location of the download lists written by'
+                        ' get_robotstxt_download_list.py (local directory)')
+    parser.add_argument('output_location',
+                        help='Output location (local directory)')
+    parser.add_argument('crawl_data_set', nargs='+',
+                        help='Common Crawl crawl dataset(s) to process, eg. CC-MAIN-2022-33')
+    parser.add_argument('--base_url', default='https://data.commoncrawl.org/',
+                        help='Base URL the WARC file names are relative to')
+    parser.add_argument('--num_connections', type=int, default=16,
+                        help='Max. number of concurrent HTTP connections')
+    parser.add_argument('--max_range_gap', type=int, default=16384,
+                        help='Merge records into a single range request if the'
+                        ' gap between them is not larger than this number of bytes')
+    parser.add_argument('--max_range_size', type=int, default=4194304,
+                        help='Max. size of a merged range request in bytes')
+    parser.add_argument('--max_retries', type=int, default=5,
+                        help='Max. number of retries of failed requests')
+    parser.add_argument('--timeout', type=int, default=300,
+                        help='Timeout of a single request in seconds')
+    parser.add_argument('--manifest', default=None,
+                        help='Manifest file (JSON, local) recording inputs and outputs'
+                        ' per crawl. If given, crawls with unchanged inputs are skipped')
+    args = parser.parse_args()
+
+    manifest = open_manifest(args.manifest)
+
+    for crawl in args.crawl_data_set:
+        if not manifest:
+            download_warc_records(crawl, args)
+            continue
+        fingerprint = input_fingerprint([download_list_path(crawl, args)],
+                                        script_version(__file__), base_url=args.base_url)
+        if manifest.is_up_to_date('warc_records', crawl, fingerprint):
+            logging.info('WARC records of crawl %s are up to date', crawl)
+            continue
+        output_path = download_warc_records(crawl, args)
+        if output_path is None:
+            continue
+        manifest.update('warc_records', crawl, fingerprint, [output_path])
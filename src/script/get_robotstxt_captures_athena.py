@@ -1,18 +1,21 @@
 """Find robots.txt captures for a list of host names in Common Crawl's
-robots.txt dataset."""
+robots.txt dataset.
+
+The lookups are run on Amazon Athena, or locally using DuckDB on a local
+copy of the columnar URL index (`--backend local`). The local backend
+does not require pyathena or access to AWS.
+"""
 
 import argparse
 import logging
 import os
 
-from collections import Counter, defaultdict
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, wait
 from urllib.parse import urljoin, urlparse
 
 import pandas as pd
 
-from pyathena import connect
-from pyathena.util import RetryConfig
-
 
 logging.basicConfig(level='INFO',
                     format='%(asctime)s %(levelname)s %(name)s: %(message)s')
@@ -104,6 +107,7 @@ WITH allrobots AS (
     ON redir.to_url = cc.url
   WHERE cc.crawl = '{crawl}'
     AND cc.subset = 'robotstxt'
+    AND redir.crawl = '{crawl}'
     AND redir.redirects = {redir_depth})
 SELECT *
  FROM allrobots
@@ -111,31 +115,300 @@ SELECT *
 WHERE allrobots.n = 1;
 """
 
+# register partitions of the redirect target table (instead of MSCK REPAIR)
+add_partitions_template = """
+ALTER TABLE `{database}`.`redirects_to_follow` ADD IF NOT EXISTS
+{partitions};
+"""
 
-def initial_lookup(crawl, cursor, args):
-    query = temp_view_template.format(crawl=crawl,
-                                      database=args.database)
-    logging.info("Athena create view query: %s", query)
-    cursor.execute(query)
-    logging.info("Create view: %s", cursor.result_set.state)
+add_partition_template = """PARTITION (crawl = '{crawl}', redirects = {redir_depth})
+  LOCATION '{s3_redirect_target_location}/crawl={crawl}/redirects={redir_depth}/'"""
 
-    query = query_template_save_parquet.format(crawl=crawl,
-                                               database=args.database,
-                                               s3_location=args.s3_output_location,
-                                               redir_depth=0)
-    logging.info("Athena export query: %s", query)
-    cursor.execute(query)
+# templates for the local backend (DuckDB)
+local_view_template = """
+CREATE OR REPLACE VIEW {view} AS
+SELECT * FROM read_parquet('{path}', hive_partitioning = true)
+"""
 
-    logging.info("Athena query ID %s: %s",
-                 cursor.query_id,
-                 cursor.result_set.state)
-    logging.info("       data_scanned_in_bytes: %d",
-                 cursor.result_set.data_scanned_in_bytes)
-    logging.info("       total_execution_time_in_millis: %d",
-                 cursor.result_set.total_execution_time_in_millis)
+local_query_save_parquet = """
+COPY (SELECT * FROM {database}._tmp_view)
+TO '{path}' (FORMAT PARQUET, COMPRESSION ZSTD)
+"""
 
-    cursor.execute(drop_tmp_table.format(database=args.database))
-    logging.info("Drop temporary table: %s", cursor.result_set.state)
+
+# Templates for batched lookups of multiple crawls in a single query.
+# On Athena, the results are inserted into the result table (partitioned by
+# crawl and redirect depth) which is expected to be created ahead on the
+# output location. The local backend writes the result partitions directly.
+result_table_columns = ['host', 'domain', 'rank', 'orig_url',
+                        'url_host_tld', 'url_host_registered_domain', 'url_host_name',
+                        'url', 'url_protocol', 'url_path', 'url_query',
+                        'fetch_time', 'fetch_status',
+                        'warc_filename', 'warc_record_offset', 'warc_record_length',
+                        'fetch_redirect', 'content_mime_type', 'content_mime_detected',
+                        'from_url', 'from_fetch_status', 'from_to_is_same_host']
+
+batch_select_template = """
+WITH allrobots AS (
+  SELECT topdomains.host as host,
+         topdomains.domain as domain,
+         topdomains.rank as rank,
+         cc.url as orig_url,
+         cc.url_host_tld,
+         cc.url_host_registered_domain,
+         cc.url_host_name,
+         cc.url,
+         cc.url_protocol,
+         cc.url_path,
+         cc.url_query,
+         cc.fetch_time,
+         cc.fetch_status,
+         cc.warc_filename,
+         cc.warc_record_offset,
+         cc.warc_record_length,
+         cc.fetch_redirect,
+         cc.content_mime_type,
+         cc.content_mime_detected,
+         CAST(NULL AS varchar) AS from_url,
+         CAST(NULL AS integer) AS from_fetch_status,
+         CAST(NULL AS boolean) AS from_to_is_same_host,
+         cc.crawl,
+         -- enumerate records of same URL, most recent first
+         ROW_NUMBER() OVER(PARTITION BY cc.crawl, cc.url ORDER BY cc.fetch_time DESC) AS n
+  FROM "ccindex"."ccindex" AS cc
+    RIGHT OUTER JOIN "robotsexperiments"."topdomains" AS topdomains
+    ON topdomains.host = cc.url_host_name
+  WHERE cc.crawl IN ({crawls})
+    AND cc.subset = 'robotstxt'
+    AND cc.url_path = '/robots.txt'
+    AND cc.url_query IS NULL)
+SELECT {columns}
+ FROM allrobots
+-- select only the first (most recent) record of the same URL
+WHERE allrobots.n = 1
+"""
+
+batch_select_template_redirects = """
+WITH allrobots AS (
+  SELECT redir.host as host,
+         redir.domain as domain,
+         redir.rank as rank,
+         redir.orig_url,
+         cc.url_host_tld,
+         cc.url_host_registered_domain,
+         cc.url_host_name,
+         cc.url,
+         cc.url_protocol,
+         cc.url_path,
+         cc.url_query,
+         cc.fetch_time,
+         cc.fetch_status,
+         cc.warc_filename,
+         cc.warc_record_offset,
+         cc.warc_record_length,
+         cc.fetch_redirect,
+         cc.content_mime_type,
+         cc.content_mime_detected,
+         redir.from_url,
+         redir.from_fetch_status,
+         redir.from_to_is_same_host,
+         cc.crawl,
+         -- enumerate records of same <orig. host, URL>, most recent first
+         ROW_NUMBER() OVER(PARTITION BY cc.crawl, redir.host, cc.url ORDER BY cc.fetch_time DESC) AS n
+  FROM "ccindex"."ccindex" AS cc
+    RIGHT OUTER JOIN "robotsexperiments"."redirects_to_follow" AS redir
+    ON redir.to_url = cc.url AND redir.crawl = cc.crawl
+  WHERE cc.crawl IN ({crawls})
+    AND cc.subset = 'robotstxt'
+    AND redir.crawl IN ({crawls})
+    AND redir.redirects = {redir_depth})
+SELECT {columns}
+ FROM allrobots
+-- select only the first (most recent) record of the same URL
+WHERE allrobots.n = 1
+"""
+
+batch_insert_template = """
+INSERT INTO {database}.{result_table}
+{query}"""
+
+local_batch_save_parquet = """
+COPY ({query})
+TO '{path}' (FORMAT PARQUET, COMPRESSION ZSTD, PARTITION_BY (crawl, redirects),
+             OVERWRITE_OR_IGNORE true, FILENAME_PATTERN 'robotstxt-captures-{{i}}')
+"""
+
+
+class AthenaBackend:
+    """Run the lookups on Amazon Athena, results are written to S3"""
+
+    def __init__(self, args):
+        self.args = args
+        self.cursor = self.connect().cursor()
+        self.async_cursor = None
+
+    def connect(self, **kwargs):
+        # imported here: pyathena is not required by the local backend
+        from pyathena import connect
+        from pyathena.util import RetryConfig
+        return connect(s3_staging_dir="{}".format(self.args.s3_staging_dir),
+                       retry_config=RetryConfig(attempt=3),
+                       region_name="us-east-1", **kwargs)
+
+    def create_view(self, query):
+        logging.info("Athena create view query: %s", query)
+        self.cursor.execute(query)
+        logging.info("Create view: %s", self.cursor.result_set.state)
+
+    def save_view(self, crawl, redir_depth):
+        cursor = self.cursor
+        query = query_template_save_parquet.format(crawl=crawl,
+                                                   database=self.args.database,
+                                                   s3_location=self.args.s3_output_location,
+                                                   redir_depth=redir_depth)
+        logging.info("Athena export query: %s", query)
+        cursor.execute(query)
+
+        logging.info("Athena query ID %s: %s",
+                     cursor.query_id,
+                     cursor.result_set.state)
+        logging.info("       data_scanned_in_bytes: %d",
+                     cursor.result_set.data_scanned_in_bytes)
+        logging.info("       total_execution_time_in_millis: %d",
+                     cursor.result_set.total_execution_time_in_millis)
+
+        cursor.execute(drop_tmp_table.format(database=self.args.database))
+        logging.info("Drop temporary table: %s", cursor.result_set.state)
+
+    def load_redirect_targets(self, crawls, redir_depth):
+        partitions = [add_partition_template.format(
+                          crawl=crawl, redir_depth=redir_depth,
+                          s3_redirect_target_location=self.args.s3_redirect_target_location)
+                      for crawl in crawls]
+        query = add_partitions_template.format(database=self.args.database,
+                                               partitions='\n'.join(partitions))
+        logging.info("Athena load partitions query: %s", query)
+        self.cursor.execute(query)
+        logging.info("Load partitions: %s", self.cursor.result_set.state)
+
+    def run_batch(self, queries):
+        """Run batched lookups (see `batch_select_template`) concurrently,
+        inserting the results into the result table"""
+        if self.async_cursor is None:
+            from pyathena.async_cursor import AsyncCursor
+            self.async_cursor = self.connect(cursor_class=AsyncCursor).cursor(
+                max_workers=self.args.max_concurrent_queries)
+        queries = [batch_insert_template.format(database=self.args.database,
+                                                result_table=self.args.result_table,
+                                                query=query)
+                   for query in queries]
+        run_queries(queries, self.async_cursor, self.args.max_concurrent_queries)
+
+
+class LocalBackend:
+    """Run the lookups using DuckDB on a local copy of the columnar URL index
+    (Parquet files, partitioned by crawl and subset) and the Parquet file(s)
+    of the table `topdomains`. The same queries as on Athena are run,
+    results and redirect targets are written to local directories."""
+
+    def __init__(self, args):
+        import duckdb
+        self.args = args
+        self.db = duckdb.connect()
+        self.db.execute("SET temp_directory = '{}'".format(args.s3_staging_dir))
+        for schema in ('ccindex', 'robotsexperiments', args.database):
+            self.db.execute('CREATE SCHEMA IF NOT EXISTS {}'.format(schema))
+        self.db.execute(local_view_template.format(
+            view='"ccindex"."ccindex"',
+            path=os.path.join(args.local_cc_index, '**', '*.parquet')))
+        self.db.execute(local_view_template.format(
+            view='"robotsexperiments"."topdomains"',
+            path=args.local_topdomains))
+
+    def create_view(self, query):
+        logging.info("DuckDB create view query: %s", query)
+        self.db.execute(query)
+
+    def save_view(self, crawl, redir_depth):
+        output_dir = '{}/crawl={}/redirects={}'.format(self.args.s3_output_location,
+                                                       crawl, redir_depth)
+        os.makedirs(output_dir, exist_ok=True)
+        query = local_query_save_parquet.format(
+            database=self.args.database,
+            path=os.path.join(output_dir, 'robotstxt-captures.zstd.parquet'))
+        logging.info("DuckDB export query: %s", query)
+        self.db.execute(query)
+
+    def load_redirect_targets(self, crawls, redir_depth):
+        # (re)create the view to include the newly written redirect targets
+        self.db.execute(local_view_template.format(
+            view='"robotsexperiments"."redirects_to_follow"',
+            path=os.path.join(self.args.s3_redirect_target_location, '*', '*', '*.parquet')))
+
+    def run_batch(self, queries):
+        """Run batched lookups (see `batch_select_template`) one after the
+        other, the results are written partitioned by crawl and redirect
+        depth to the output location"""
+        os.makedirs(self.args.s3_output_location, exist_ok=True)
+        for query in queries:
+            query = local_batch_save_parquet.format(query=query.strip(),
+                                                    path=self.args.s3_output_location)
+            logging.info("DuckDB batch query: %s", query)
+            self.db.execute(query)
+
+
+def initial_lookup(crawl, backend, args):
+    query = temp_view_template.format(crawl=crawl,
+                                      database=args.database)
+    backend.create_view(query)
+    backend.save_view(crawl, 0)
+
+
+# URL origin (scheme and authority), for simple relative redirect targets
+# the target URL is the concatenation of origin and target path
+url_origin_pattern = r'^(https?://[^/?#\s]*)'
+
+# relative redirect targets which are an absolute path without query,
+# fragment, parameters or dot segments: no need to call urljoin
+simple_path_pattern = r'^/(?!/)[^\s\x00-\x1f\x7f;?#]*$'
+dot_segment_pattern = r'(?:^|/)\.\.?(?:/|$)'
+
+# host name of ASCII http(s) URLs with optional user info and port,
+# other URLs are parsed by urlparse
+url_host_pattern = r'^https?://(?:[^@/?#\s]*@)?([-a-zA-Z0-9._~%!$&\'()*+,;=]*)(?::\d*)?(?:[/?#]|$)'
+
+
+def urls_join(base_urls: pd.Series, targets: pd.Series) -> pd.Series:
+    """Resolve relative redirect targets, equivalent to `urljoin`
+    applied to every pair of base URL and target"""
+    origins = base_urls.str.extract(url_origin_pattern, expand=False)
+    simple = targets.str.match(simple_path_pattern) \
+        & ~targets.str.contains(dot_segment_pattern) \
+        & origins.notna()
+    joined = origins.where(simple, '') + targets.where(simple, '')
+    other = ~simple
+    if other.any():
+        joined.loc[other] = pd.Series([urljoin(base, target)
+                                       for base, target in zip(base_urls[other], targets[other])],
+                                      index=joined.index[other], dtype=joined.dtype)
+    return joined
+
+
+def url_host_names(urls: pd.Series) -> pd.Series:
+    """Extract the host names of URLs, equivalent to `urlparse(url).hostname`.
+    The result is None if the URL has no host name or cannot be parsed."""
+    hosts = urls.str.extract(url_host_pattern, expand=False).str.lower()
+    other = hosts.isna()
+    if other.any():
+        def hostname(url):
+            try:
+                return urlparse(url).hostname
+            except ValueError as e:
+                logging.error('Failed to parse redirect target `%s`: %s', url, e)
+                return None
+        hosts.loc[other] = pd.Series([hostname(url) for url in urls[other]],
+                                     index=hosts.index[other], dtype=hosts.dtype)
+    return hosts.where(hosts != '', None)
 
 
 def redirect_targets_write(crawl, redir_depth, args, urls_seen):
@@ -153,147 +426,217 @@ def redirect_targets_write(crawl, redir_depth, args, urls_seen):
 
     counts['rows'] = df.shape[0]
 
-    redirects = defaultdict(list)
     urls_seen.update(df['url'].tolist())
     logging.info('%6d\tunique URLs known', len(urls_seen))
 
-    for _idx, row in df[~df['fetch_redirect'].isnull()].iterrows():
-
-        redirect_target = row['fetch_redirect']
-        counts['redirects'] += 1
-
-        if redirect_target == '':
-            counts['redirects_empty'] += 1
-            continue # empty URL
-
-        if (redirect_target.startswith('http://')
-            or redirect_target.startswith('https://')):
-            counts['redirects_absolute'] += 1
-        else:
-            counts['redirects_relative'] += 1
-            redirect_target = urljoin(row['url'], redirect_target)
-
-        if redirect_target == row['url']:
-            # nothing to do for redirect targets pointing to the URL itself
-            counts['redirects_self'] += 1
-            continue
-
-        if redirect_target in urls_seen:
-            counts['redirects_target_known'] += 1
-        elif redirect_target in redirects:
-            counts['redirects_duplicates'] += 1
-        else:
-            counts['redirects_to_follow'] += 1
-        # Append also known redirect targets because we need to track
-        # the chain from the initial /robots.txt to the final location.
-        # WARC records are deduplicated before download.
-        redirects[redirect_target].append(row)
-
+    # all rows with redirects, processed column-wise
+    df = df[~df['fetch_redirect'].isnull()].reset_index(drop=True)
+    counts['redirects'] = df.shape[0]
+
+    empty = (df['fetch_redirect'] == '')
+    counts['redirects_empty'] = int(empty.sum())
+    df = df[~empty].reset_index(drop=True)
+
+    redirect_target = df['fetch_redirect']
+    relative = ~redirect_target.str.startswith(('http://', 'https://'))
+    counts['redirects_absolute'] = int((~relative).sum())
+    counts['redirects_relative'] = int(relative.sum())
+    if relative.any():
+        redirect_target = redirect_target.copy()
+        redirect_target[relative] = urls_join(df['url'][relative], redirect_target[relative])
+
+    # nothing to do for redirect targets pointing to the URL itself
+    self_redirect = (redirect_target == df['url'])
+    counts['redirects_self'] = int(self_redirect.sum())
+    df = df[~self_redirect].reset_index(drop=True)
+    redirect_target = redirect_target[~self_redirect].reset_index(drop=True)
+
+    # Keep also known redirect targets because we need to track
+    # the chain from the initial /robots.txt to the final location.
+    # WARC records are deduplicated before download.
+    known = redirect_target.isin(urls_seen)
+    duplicate = redirect_target.duplicated(keep='first')
+    counts['redirects_target_known'] = int(known.sum())
+    counts['redirects_duplicates'] = int((~known & duplicate).sum())
+    counts['redirects_to_follow'] = int((~known & ~duplicate).sum())
 
     logging.info('Redirects processed:')
     for cnt in counts:
         logging.info('%6d\t%s', counts[cnt], cnt)
 
-    if len(redirects) == 0:
+    n_redirect_targets = int((~duplicate).sum())
+    if n_redirect_targets == 0:
         return 0
 
-    redirects_to_follow = list()
-    for redirect_target in redirects:
-        for row in redirects[redirect_target]:
-            rrow = row[['host', 'domain', 'rank', 'orig_url',
-                        'url', 'fetch_status']].tolist()
-            target_host = None
-            try:
-                urlparse(redirect_target).hostname
-            except ValueError as e:
-                logging.error('Failed to parse redirect target `%s`: %s',
-                              redirect_target, e)
-            rrow.append(row['url_host_name'] == target_host)
-            rrow.append(redirect_target)
-            redirects_to_follow.append(rrow)
-
-    df_redirects_to_follow = pd.DataFrame(redirects_to_follow,
-                                          columns=['host', 'domain', 'rank', 'orig_url',
-                                                   'from_url', 'from_fetch_status',
-                                                   'from_to_is_same_host', 'to_url'])
+    target_host = url_host_names(redirect_target)
+    df_redirects_to_follow = pd.DataFrame({
+        'host': df['host'],
+        'domain': df['domain'],
+        'rank': df['rank'].astype('int32'),
+        'orig_url': df['orig_url'],
+        'from_url': df['url'],
+        'from_fetch_status': df['fetch_status'].astype('int32'),
+        'from_to_is_same_host': (df['url_host_name'] == target_host).fillna(False).astype(bool),
+        'to_url': redirect_target})
+    # group rows by redirect target (in order of first occurrence)
+    order = pd.factorize(redirect_target)[0].argsort(kind='stable')
+    df_redirects_to_follow = df_redirects_to_follow.iloc[order].reset_index(drop=True)
+    if '://' not in target_path:
+        # local backend
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
     df_redirects_to_follow.to_parquet(target_path, compression='zstd')
 
-    return len(redirects)
+    return n_redirect_targets
+
+def redirect_targets_load_partitions(crawls, redir_depth, backend, args):
+    backend.load_redirect_targets(crawls, redir_depth)
 
-def redirect_targets_load_partitions(args):
-    query = 'MSCK REPAIR TABLE `{database}`.`redirects_to_follow`;'.format(
-        database=args.database)
-    logging.info("Athena load partitions query: %s", query)
-    cursor.execute(query)
-    logging.info("Load partitions: %s", cursor.result_set.state)
 
-def redirect_lookup(crawl, redir_depth, redir_depth_next, cursor, args):
+def redirect_lookup(crawl, redir_depth, redir_depth_next, backend, args):
     query = temp_view_template_redirects.format(crawl=crawl,
                                                 database=args.database,
                                                 redir_depth=redir_depth)
-    logging.info("Athena create view query: %s", query)
-    cursor.execute(query)
-    logging.info("Create view: %s", cursor.result_set.state)
-
-    query = query_template_save_parquet.format(crawl=crawl,
-                                               database=args.database,
-                                               s3_location=args.s3_output_location,
-                                               redir_depth=redir_depth_next)
-    logging.info("Athena export query: %s", query)
-    cursor.execute(query)
-
-    logging.info("Athena query ID %s: %s",
-                 cursor.query_id,
-                 cursor.result_set.state)
-    logging.info("       data_scanned_in_bytes: %d",
-                 cursor.result_set.data_scanned_in_bytes)
-    logging.info("       total_execution_time_in_millis: %d",
-                 cursor.result_set.total_execution_time_in_millis)
-
-    cursor.execute(drop_tmp_table.format(database=args.database))
-    logging.info("Drop temporary table: %s", cursor.result_set.state)
+    backend.create_view(query)
+    backend.save_view(crawl, redir_depth_next)
+
+
+def run_queries(queries, cursor, max_in_flight):
+    """Run queries concurrently using an asynchronous cursor, at maximum
+    `max_in_flight` queries are running at the same time"""
+    queries = list(queries)
+    running = dict()
+    while queries or running:
+        while queries and len(running) < max_in_flight:
+            query = queries.pop(0)
+            logging.info("Athena query: %s", query)
+            query_id, future = cursor.execute(query)
+            running[future] = query_id
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            query_id = running.pop(future)
+            result_set = future.result()
+            logging.info("Athena query ID %s: %s", query_id, result_set.state)
+            if result_set.state != 'SUCCEEDED':
+                raise RuntimeError('Athena query {} failed: {}'.format(
+                    query_id, result_set.state_change_reason))
+            logging.info("       data_scanned_in_bytes: %d",
+                         result_set.data_scanned_in_bytes)
+            logging.info("       total_execution_time_in_millis: %d",
+                         result_set.total_execution_time_in_millis)
+
+
+def crawl_batches(crawls, batch_size):
+    for i in range(0, len(crawls), batch_size):
+        yield crawls[i:(i+batch_size)]
+
+
+def batch_query(template, crawls, redir_depth, redir_depth_next, args):
+    columns = ',\n       '.join(result_table_columns
+                                 + ['crawl', '{} AS redirects'.format(redir_depth_next)])
+    return template.format(crawls=', '.join("'{}'".format(crawl) for crawl in crawls),
+                           redir_depth=redir_depth,
+                           columns=columns)
+
+
+def batch_initial_lookup(crawls, backend, args):
+    queries = [batch_query(batch_select_template, batch, None, 0, args)
+               for batch in crawl_batches(crawls, args.batch_size)]
+    backend.run_batch(queries)
+
+
+def batch_redirect_lookup(crawls, redir_depth, redir_depth_next, backend, args):
+    queries = [batch_query(batch_select_template_redirects, batch,
+                           redir_depth, redir_depth_next, args)
+               for batch in crawl_batches(crawls, args.batch_size)]
+    backend.run_batch(queries)
 
 
 ################################################################################
-parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
-parser.add_argument('s3_output_location',
-                    help='Output location on S3')
-parser.add_argument('s3_redirect_target_location',
-                    help='Prefix on S3 used to hold redirect target locations required'
-                    ' for table joins when following redirects')
-parser.add_argument('s3_staging_dir',
-                    help='Staging directory on S3 used for temporary and query metadata')
-parser.add_argument('--database',
-                    help='Name of the database', default='robotsexperiments')
-parser.add_argument('--follow_redirects', type=int,
-                    help='Follow up to n redirects', default=5)
-parser.add_argument('crawl_data_set', nargs='+',
-                    help='Common Crawl crawl dataset(s) to process, eg. CC-MAIN-2022-33')
-args = parser.parse_args()
-
-# no trailing slash on S3 prefixes!
-args.s3_output_location = args.s3_output_location.rstrip('/')
-args.s3_redirect_target_location = args.s3_redirect_target_location.rstrip('/')
-
-
-retry_config = RetryConfig(attempt=3)
-cursor = connect(s3_staging_dir="{}".format(args.s3_staging_dir),
-                 retry_config=retry_config,
-                 region_name="us-east-1").cursor()
-
-
-for crawl in args.crawl_data_set:
-
-    initial_lookup(crawl, cursor, args)
-
-    # following redirects
-    urls_seen = set() # for deduplication
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('s3_output_location',
+                        help='Output location on S3 (local directory if --backend local)')
+    parser.add_argument('s3_redirect_target_location',
+                        help='Prefix on S3 used to hold redirect target locations required'
+                        ' for table joins when following redirects'
+                        ' (local directory if --backend local)')
+    parser.add_argument('s3_staging_dir',
+                        help='Staging directory on S3 used for temporary and query metadata'
+                        ' (local directory used for temporary files if --backend local)')
+    parser.add_argument('--database',
+                        help='Name of the database', default='robotsexperiments')
     # RFC 9390 says "to follow at least five consecutive redirects"
-    for i in range(0, 5):
-        logging.info('Following redirects (from depth = %i)', i)
-        target_count = redirect_targets_write(crawl, i, args, urls_seen)
-        if target_count == 0:
-            logging.info("No redirects found at level %i, stopping.", i)
-            break
-        redirect_targets_load_partitions(args)
-        redirect_lookup(crawl, i, (i+1), cursor, args)
+    parser.add_argument('--follow_redirects', type=int,
+                        help='Follow up to n redirects', default=5)
+    parser.add_argument('--backend', choices=['athena', 'local'], default='athena',
+                        help='Run the lookups on Amazon Athena, or locally (DuckDB)'
+                        ' on a local copy of the columnar index, see --local_cc_index'
+                        ' and --local_topdomains')
+    parser.add_argument('--local_cc_index',
+                        help='Local copy of the columnar index (Parquet, Hive-partitioned'
+                        ' by crawl and subset), required by the local backend')
+    parser.add_argument('--local_topdomains',
+                        help='Parquet file(s) of the table topdomains (columns rank,'
+                        ' host and domain), required by the local backend')
+    parser.add_argument('--batch', action='store_true',
+                        help='Batched mode: look up multiple crawls in a single query per'
+                        ' redirect depth and insert the results into the result table'
+                        ' (see --result_table). The partitions of the crawls must not exist yet')
+    parser.add_argument('--result_table', default='domain_top_k_sample',
+                        help='Name of the result table, partitioned by crawl and redirects'
+                        ' and located at the output location (batched mode, Athena backend only)')
+    parser.add_argument('--batch_size', type=int, default=25,
+                        help='Max. number of crawls per query (batched mode only).'
+                        ' Note: Athena limits the number of partitions written by a query to 100')
+    parser.add_argument('--max_concurrent_queries', type=int, default=5,
+                        help='Max. number of concurrently running queries (batched mode only)')
+    parser.add_argument('crawl_data_set', nargs='+',
+                        help='Common Crawl crawl dataset(s) to process, eg. CC-MAIN-2022-33')
+    args = parser.parse_args()
+
+    if args.backend == 'local':
+        if not (args.local_cc_index and args.local_topdomains):
+            parser.error('The local backend requires --local_cc_index and --local_topdomains')
+
+    # no trailing slash on S3 prefixes!
+    args.s3_output_location = args.s3_output_location.rstrip('/')
+    args.s3_redirect_target_location = args.s3_redirect_target_location.rstrip('/')
+
+
+    if args.backend == 'local':
+        backend = LocalBackend(args)
+    else:
+        backend = AthenaBackend(args)
+
+
+    if args.batch:
+        crawls = args.crawl_data_set
+        batch_initial_lookup(crawls, backend, args)
+
+        # following redirects, for all crawls at once
+        urls_seen = {crawl: set() for crawl in crawls} # for deduplication
+        for i in range(0, args.follow_redirects):
+            logging.info('Following redirects (from depth = %i)', i)
+            crawls = [crawl for crawl in crawls
+                      if redirect_targets_write(crawl, i, args, urls_seen[crawl]) > 0]
+            if not crawls:
+                logging.info("No redirects found at level %i, stopping.", i)
+                break
+            redirect_targets_load_partitions(crawls, i, backend, args)
+            batch_redirect_lookup(crawls, i, (i+1), backend, args)
+
+    else:
+        for crawl in args.crawl_data_set:
+
+            initial_lookup(crawl, backend, args)
+
+            # following redirects
+            urls_seen = set() # for deduplication
+            for i in range(0, args.follow_redirects):
+                logging.info('Following redirects (from depth = %i)', i)
+                target_count = redirect_targets_write(crawl, i, args, urls_seen)
+                if target_count == 0:
+                    logging.info("No redirects found at level %i, stopping.", i)
+                    break
+                redirect_targets_load_partitions([crawl], i, backend, args)
+                redirect_lookup(crawl, i, (i+1), backend, args)
@@ -8,6 +8,8 @@ import logging
 
 import pandas as pd
 
+from pipeline_manifest import crawl_partition, input_fingerprint, open_manifest, script_version
+
 
 logging.basicConfig(level='INFO',
                     format='%(asctime)s %(levelname)s %(name)s: %(message)s')
@@ -38,22 +40,10 @@ def is_robotstxt_mime_type(df:pd.DataFrame) -> pd.Series:
           | df['content_mime_type'].str.contains('(?i)text(?!/html)', case=False, regex=True))
     return s1 & s2
 
-def write_robotstxt_download_list(crawl, args):
-    # read robots.txt capture locations from S3
-    # - put there by the script get_robotstxt_captures_athena.py
-    # - only required columns
-    # - filter on crawl
-    # - filter only successful fetches
-    # - and text/plain MIME types (and equivalent), excluding HTML
-    df = pd.read_parquet(args.s3_robotstxt_table_location,
-                         columns=['url', 'warc_filename', 'warc_record_offset', 'warc_record_length',
-                                  'content_mime_type', 'content_mime_detected'],
-                         filters=[('crawl', '==', crawl),
-                                  ('fetch_status', '==', 200)])
-    count_fetch_success = df.shape[0]
-    logging.info('Extracted %i successfully fetched robots.txt captures for crawl %s',
-                 count_fetch_success, crawl)
-
+def robotstxt_download_list(df: pd.DataFrame, crawl: str) -> pd.DataFrame:
+    """Download list from successfully fetched robots.txt captures:
+    filter by MIME type, keep only URL and WARC record location and
+    remove duplicates"""
     # filter MIME types
     df = df[is_robotstxt_mime_type(df)]
     logging.info('After filtering by MIME type, got %i robots.txt captures for crawl %s',
@@ -70,13 +60,43 @@ def write_robotstxt_download_list(crawl, args):
     if df.shape[0] < n_rows:
         logging.info('Removed %d duplicates in download list', (n_rows - df.shape[0]))
 
-    # save file
-    os.makedirs(os.path.join(args.output_location, 'crawl=' + crawl), exist_ok=True)
-    output_path = os.path.join(args.output_location,
+    return df
+
+def save_robotstxt_download_list(df: pd.DataFrame, crawl: str, output_location: str):
+    os.makedirs(os.path.join(output_location, 'crawl=' + crawl), exist_ok=True)
+    output_path = os.path.join(output_location,
                                'crawl=' + crawl,
                                'robotstxt-captures-' + crawl + '.csv')
     df.to_csv(output_path, header=True, index=False)
     logging.info('Download list saved to %s', output_path)
+    return output_path
+
+def download_list_fingerprint(crawl: str, table_location: str) -> dict:
+    """Fingerprint of the inputs of the download list of one crawl
+    (files of the crawl partition and version of this script)"""
+    return input_fingerprint([crawl_partition(table_location, crawl)],
+                             script_version(__file__))
+
+def write_robotstxt_download_list(crawl, args):
+    # read robots.txt capture locations from S3
+    # - put there by the script get_robotstxt_captures_athena.py
+    # - only required columns
+    # - filter on crawl
+    # - filter only successful fetches
+    # - and text/plain MIME types (and equivalent), excluding HTML
+    df = pd.read_parquet(args.s3_robotstxt_table_location,
+                         columns=['url', 'warc_filename', 'warc_record_offset', 'warc_record_length',
+                                  'content_mime_type', 'content_mime_detected'],
+                         filters=[('crawl', '==', crawl),
+                                  ('fetch_status', '==', 200)])
+    count_fetch_success = df.shape[0]
+    logging.info('Extracted %i successfully fetched robots.txt captures for crawl %s',
+                 count_fetch_success, crawl)
+
+    df = robotstxt_download_list(df, crawl)
+
+    # save file
+    return save_robotstxt_download_list(df, crawl, args.output_location)
 
 
 
@@ -89,8 +109,19 @@ if __name__ == "__main__":
                         help='Output location (local directory)')
     parser.add_argument('crawl_data_set', nargs='+',
                         help='Common Crawl crawl dataset(s) to process, eg. CC-MAIN-2022-33')
+    parser.add_argument('--manifest', default=None,
+                        help='Manifest file (JSON, local) recording inputs and outputs'
+                        ' per crawl. If given, crawls with unchanged inputs are skipped')
     args = parser.parse_args()
 
+    manifest = open_manifest(args.manifest)
 
     for crawl in args.crawl_data_set:
-        write_robotstxt_download_list(crawl, args)
+        if manifest:
+            fingerprint = download_list_fingerprint(crawl, args.s3_robotstxt_table_location)
+            if manifest.is_up_to_date('download_list', crawl, fingerprint):
+                logging.info('Download list for crawl %s is up to date', crawl)
+                continue
+        output_path = write_robotstxt_download_list(crawl, args)
+        if manifest:
+            manifest.update('download_list', crawl, fingerprint, [output_path])
@@ -0,0 +1,117 @@
+"""Write both the download list of WARC records (see
+`get_robotstxt_download_list.py`) and the ranked list of hosts and their
+robots.txt capture status (see `get_robotstxt_ranked_list.py`) from the
+result of `get_robotstxt_captures_athena.py`.
+
+The capture table is scanned once: every crawl partition is read by a
+worker process, which writes both lists for the crawl. Memory usage
+is bounded by one crawl partition per worker.
+
+With `--manifest`, crawls are skipped if both lists are up to date. The
+manifest entries are shared with the two single-list scripts.
+"""
+
+import argparse
+import logging
+import os
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pyarrow.dataset as ds
+
+from get_robotstxt_download_list import download_list_fingerprint, \
+    robotstxt_download_list, save_robotstxt_download_list
+from get_robotstxt_ranked_list import ranked_list_fingerprint, \
+    robotstxt_ranked_list, save_robotstxt_ranked_list
+from pipeline_manifest import open_manifest
+
+
+logging.basicConfig(level='INFO',
+                    format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+
+download_list_columns = ['url', 'warc_filename', 'warc_record_offset', 'warc_record_length',
+                         'content_mime_type', 'content_mime_detected']
+
+ranked_list_columns = ['host', 'domain', 'rank', 'url',
+                       'fetch_status', 'fetch_redirect',
+                       'content_mime_type', 'content_mime_detected']
+
+columns = ranked_list_columns + [c for c in download_list_columns
+                                 if c not in ranked_list_columns]
+
+
+def write_robotstxt_lists(crawl, files, schema, filesystem, args):
+    """Read the files of one crawl partition and write the download list
+    and the ranked list, return the crawl and the paths of both lists"""
+    dataset = ds.dataset(files, schema=schema, format='parquet', filesystem=filesystem)
+    df = dataset.to_table(columns=columns).to_pandas()
+    logging.info('%i robots.txt captures for crawl %s', df.shape[0], crawl)
+
+    df_ranked = robotstxt_ranked_list(df[ranked_list_columns], crawl)
+    ranked_list_path = save_robotstxt_ranked_list(df_ranked, crawl, args.ranked_list_location)
+    del df_ranked
+
+    df = df.loc[df['fetch_status'] == 200, download_list_columns]
+    logging.info('Extracted %i successfully fetched robots.txt captures for crawl %s',
+                 df.shape[0], crawl)
+    df = robotstxt_download_list(df, crawl)
+    download_list_path = save_robotstxt_download_list(df, crawl, args.download_list_location)
+    return crawl, download_list_path, ranked_list_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('s3_robotstxt_table_location',
+                        help='Location of the robots.txt capture table on S3'
+                        ' (or a local copy of it)')
+    parser.add_argument('download_list_location',
+                        help='Output location of the download lists (local directory)')
+    parser.add_argument('ranked_list_location',
+                        help='Output location of the ranked lists (local directory)')
+    parser.add_argument('crawl_data_set', nargs='+',
+                        help='Common Crawl crawl dataset(s) to process, eg. CC-MAIN-2022-33')
+    parser.add_argument('--num_workers', type=int, default=os.cpu_count(),
+                        help='Number of parallel worker processes')
+    parser.add_argument('--manifest', default=None,
+                        help='Manifest file (JSON, local) recording inputs and outputs'
+                        ' per crawl. If given, crawls with unchanged inputs are skipped')
+    args = parser.parse_args()
+
+    manifest = open_manifest(args.manifest)
+    fingerprints = dict()
+    crawls = list()
+    for crawl in args.crawl_data_set:
+        if manifest:
+            fingerprints[crawl] = (
+                download_list_fingerprint(crawl, args.s3_robotstxt_table_location),
+                ranked_list_fingerprint(crawl, args.s3_robotstxt_table_location))
+            if (manifest.is_up_to_date('download_list', crawl, fingerprints[crawl][0])
+                    and manifest.is_up_to_date('ranked_list', crawl, fingerprints[crawl][1])):
+                logging.info('Lists of robots.txt captures for crawl %s are up to date', crawl)
+                continue
+        crawls.append(crawl)
+
+    dataset = ds.dataset(args.s3_robotstxt_table_location,
+                         format='parquet', partitioning='hive')
+
+    # list the files of every crawl partition (partition pruning)
+    crawl_files = dict()
+    for crawl in crawls:
+        crawl_files[crawl] = [fragment.path for fragment
+                              in dataset.get_fragments(filter=(ds.field('crawl') == crawl))]
+        if not crawl_files[crawl]:
+            logging.warning('No robots.txt captures found for crawl %s', crawl)
+
+    with ProcessPoolExecutor(max_workers=args.num_workers) as executor:
+        futures = [executor.submit(write_robotstxt_lists, crawl, files,
+                                   dataset.schema, dataset.filesystem, args)
+                   for crawl, files in crawl_files.items() if files]
+        for future in as_completed(futures):
+            crawl, download_list_path, ranked_list_path = future.result()
+            logging.info('Lists of robots.txt captures written for crawl %s', crawl)
+            if manifest:
+                manifest.update('download_list', crawl,
+                                fingerprints[crawl][0], [download_list_path])
+                manifest.update('ranked_list', crawl,
+                                fingerprints[crawl][1], [ranked_list_path])
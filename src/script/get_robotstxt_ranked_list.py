@@ -12,7 +12,10 @@ import pandas as pd
 import pyarrow as pa
 import pyarrow.parquet as pq
 
+import get_robotstxt_download_list
+
 from get_robotstxt_download_list import is_robotstxt_mime_type
+from pipeline_manifest import crawl_partition, input_fingerprint, open_manifest, script_version
 
 
 logging.basicConfig(level='INFO',
@@ -39,20 +42,22 @@ def fetch_status_classify(status_code:int) -> str:
         return "unauthorized"
     return "other"
 
-def write_robotstxt_ranked_list(crawl, args):
-    # read robots.txt capture locations from S3
-    # - put there by the script get-robotstxt-captures-athena.py
-    # - only required columns
-    # - filter on crawl
-    df = pd.read_parquet(args.s3_robotstxt_table_location,
-                         columns=['host', 'domain', 'rank', 'url',
-                                  'fetch_status', 'fetch_redirect',
-                                  'content_mime_type', 'content_mime_detected'],
-                         filters=[('crawl', '==', crawl)])
-    count_fetch_success = df.shape[0]
-    logging.info('%i robots.txt captures for crawl %s',
-                 count_fetch_success, crawl)
-
+ranked_list_schema = pa.schema([
+    pa.field('host',                    pa.string()),
+    pa.field('domain',                  pa.string()),
+    pa.field('rank',                    pa.int32()),
+    pa.field('url',                     pa.string()),
+    pa.field('fetch_status',            pa.int32()),
+    pa.field('fetch_redirect',          pa.string()),
+    pa.field('content_mime_type',       pa.string()),
+    pa.field('content_mime_detected',   pa.string()),
+    pa.field('robotstxt_fetch_status',  pa.string()),
+    pa.field('is_robotstxt_mime_type',  pa.bool_())
+])
+
+def robotstxt_ranked_list(df: pd.DataFrame, crawl: str) -> pd.DataFrame:
+    """Classify fetch status and MIME type of robots.txt captures
+    and remove duplicates"""
     # classify fetch status
     df['robotstxt_fetch_status'] = df['fetch_status'].apply(fetch_status_classify)
     logging.info('Fetch status classification of robots.txt captures:\n%s',
@@ -73,26 +78,42 @@ def write_robotstxt_ranked_list(crawl, args):
     if df.shape[0] < n_rows:
         logging.info('Removed %d duplicates in ranked list', (n_rows - df.shape[0]))
 
-    # save file
-    os.makedirs(os.path.join(args.output_location, 'crawl=' + crawl), exist_ok=True)
-    output_path = os.path.join(args.output_location,
+    return df
+
+def save_robotstxt_ranked_list(df: pd.DataFrame, crawl: str, output_location: str):
+    os.makedirs(os.path.join(output_location, 'crawl=' + crawl), exist_ok=True)
+    output_path = os.path.join(output_location,
                                'crawl=' + crawl,
                                'robotstxt-captures-' + crawl + '.zstd.parquet')
-    tschema = pa.schema([
-        pa.field('host',                    pa.string()),
-        pa.field('domain',                  pa.string()),
-        pa.field('rank',                    pa.int32()),
-        pa.field('url',                     pa.string()),
-        pa.field('fetch_status',            pa.int32()),
-        pa.field('fetch_redirect',          pa.string()),
-        pa.field('content_mime_type',       pa.string()),
-        pa.field('content_mime_detected',   pa.string()),
-        pa.field('robotstxt_fetch_status',  pa.string()),
-        pa.field('is_robotstxt_mime_type',  pa.bool_())
-    ])
-    table = pa.Table.from_pandas(df, preserve_index=False, schema=tschema)
+    table = pa.Table.from_pandas(df, preserve_index=False, schema=ranked_list_schema)
     pq.write_table(table, output_path, compression='zstd', compression_level=19)
     logging.info('Ranked list of robots.txt captures saved to %s', output_path)
+    return output_path
+
+def ranked_list_fingerprint(crawl: str, table_location: str) -> dict:
+    """Fingerprint of the inputs of the ranked list of one crawl (files of
+    the crawl partition and version of this script and the MIME type filter)"""
+    return input_fingerprint([crawl_partition(table_location, crawl)],
+                             script_version(__file__, get_robotstxt_download_list.__file__))
+
+def write_robotstxt_ranked_list(crawl, args):
+    # read robots.txt capture locations from S3
+    # - put there by the script get-robotstxt-captures-athena.py
+    # - only required columns
+    # - filter on crawl
+    df = pd.read_parquet(args.s3_robotstxt_table_location,
+                         columns=['host', 'domain', 'rank', 'url',
+                                  'fetch_status', 'fetch_redirect',
+                                  'content_mime_type', 'content_mime_detected'],
+                         filters=[('crawl', '==', crawl)])
+    count_fetch_success = df.shape[0]
+    logging.info('%i robots.txt captures for crawl %s',
+                 count_fetch_success, crawl)
+
+    df = robotstxt_ranked_list(df, crawl)
+
+    # save file
+    return save_robotstxt_ranked_list(df, crawl, args.output_location)
 
 
 
@@ -105,8 +126,19 @@ if __name__ == "__main__":
                         help='Output location (local directory)')
     parser.add_argument('crawl_data_set', nargs='+',
                         help='Common Crawl crawl dataset(s) to process, eg. CC-MAIN-2022-33')
+    parser.add_argument('--manifest', default=None,
+                        help='Manifest file (JSON, local) recording inputs and outputs'
+                        ' per crawl. If given, crawls with unchanged inputs are skipped')
     args = parser.parse_args()
 
+    manifest = open_manifest(args.manifest)
 
     for crawl in args.crawl_data_set:
-        write_robotstxt_ranked_list(crawl, args)
+        if manifest:
+            fingerprint = ranked_list_fingerprint(crawl, args.s3_robotstxt_table_location)
+            if manifest.is_up_to_date('ranked_list', crawl, fingerprint):
+                logging.info('Ranked list for crawl %s is up to date', crawl)
+                continue
+        output_path = write_robotstxt_ranked_list(crawl, args)
+        if manifest:
+            manifest.update('ranked_list', crawl, fingerprint, [output_path])
@@ -0,0 +1,122 @@
+"""Manifest of the inputs and outputs of the processing stages, so that
+the scripts only (re)process crawls which are new or whose inputs have
+changed since the last run.
+
+For every stage and crawl the manifest records
+ - the input fingerprint: path, size and ETag (S3) or modification time
+   (local file system) of all input files, and a hash over the source
+   code of the script(s) run by the stage
+ - the output paths
+ - the time the stage finished
+
+A crawl is skipped if the input fingerprint is unchanged and all outputs
+still exist. The manifest is a JSON file on local disk, updated after
+every completed crawl, so that an interrupted run keeps the results of
+all crawls processed so far.
+"""
+
+import hashlib
+import json
+import logging
+import os
+
+from datetime import datetime, timezone
+
+import fsspec
+
+
+def script_version(*paths) -> str:
+    """Hash over the source files of a script and the modules it uses"""
+    h = hashlib.sha1()
+    for path in paths:
+        with open(path, 'rb') as fh:
+            h.update(fh.read())
+    return h.hexdigest()
+
+
+def input_fingerprint(locations: list, version: str, **options) -> dict:
+    """Fingerprint of the input files (S3 or local, file or directory),
+    the script version and further options affecting the output.
+    Directories are listed recursively."""
+    files = dict()
+    for location in locations:
+        fs, path = fsspec.core.url_to_fs(location)
+        if fs.isdir(path):
+            infos = fs.find(path, detail=True)
+        elif fs.exists(path):
+            infos = {path: fs.info(path)}
+        else:
+            infos = dict()
+        for file_path, info in infos.items():
+            tag = info.get('ETag') or info.get('mtime') or info.get('LastModified')
+            if isinstance(tag, datetime):
+                tag = tag.isoformat()
+            files[fs.unstrip_protocol(file_path)] = [info.get('size'), str(tag)]
+    return {'files': dict(sorted(files.items())),
+            'version': version,
+            'options': options}
+
+
+class Manifest:
+    """Inputs and outputs per stage and crawl, stored in a JSON file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.stages = dict()
+        if os.path.exists(path):
+            with open(path) as fh:
+                self.stages = json.load(fh)
+
+    def get(self, stage: str, crawl: str) -> dict:
+        return self.stages.get(stage, dict()).get(crawl)
+
+    def is_up_to_date(self, stage: str, crawl: str, fingerprint: dict) -> bool:
+        """Whether the stage has been run on the same inputs (same
+        fingerprint) and all outputs still exist"""
+        entry = self.get(stage, crawl)
+        if entry is None:
+            return False
+        if entry['inputs'] != fingerprint:
+            logging.info('Inputs of stage %s for crawl %s changed', stage, crawl)
+            return False
+        for output in entry['outputs']:
+            fs, path = fsspec.core.url_to_fs(output)
+            if not fs.exists(path):
+                logging.info('Output %s of stage %s for crawl %s is missing',
+                             output, stage, crawl)
+                return False
+        return True
+
+    def update(self, stage: str, crawl: str, fingerprint: dict, outputs: list):
+        """Record the inputs and outputs of a completed stage and save
+        the manifest"""
+        self.stages.setdefault(stage, dict())[crawl] = {
+            'inputs': fingerprint,
+            'outputs': list(outputs),
+            'time': datetime.now(timezone.utc).isoformat(timespec='seconds')
+        }
+        self.save()
+
+    def save(self):
+        # write to a temporary file first, so that an interrupted write
+        # does not corrupt the manifest
+        dir_name = os.path.dirname(self.path)
+        if dir_name:
+            os.makedirs(dir_name, exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as fh:
+            json.dump(self.stages, fh, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+def crawl_partition(location: str, crawl: str) -> str:
+    """Location of the crawl partition of a table partitioned by crawl"""
+    return location.rstrip('/') + '/crawl=' + crawl
+
+
+def open_manifest(path: str):
+    """Open the manifest, or return None if no path is given
+    (incremental processing disabled)"""
+    if not path:
+        return None
+    return Manifest(path)
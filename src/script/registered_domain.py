@@ -0,0 +1,220 @@
+"""Extract the registered domain (aka. pay-level domain) from host names
+in bulk, e.g. for the 2 million hosts of the combined top-k list or for
+the hosts of redirect targets.
+
+Results are identical to `tldextract.extract(host).registered_domain`,
+the same public suffix list is used. The list is loaded once into a trie
+of reversed labels, flattened into sets of the suffixes leading to a trie
+node. Host names are processed in chunks of Arrow string arrays and are
+matched level by level (one label per level) by vectorized set lookups.
+Punycode labels are decoded before the lookup, same as by tldextract.
+
+Host names which are not plain lowercase ASCII names (upper case letters,
+IDNs in Unicode, ports, trailing dots, IPv6 addresses, etc.) are passed
+to tldextract. The results and the decoded Punycode labels are memoized.
+"""
+
+import idna
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import tldextract
+
+
+# host names matched level by level, all others are passed to tldextract
+simple_host_pattern = r'^(?:[a-z0-9_-]+\.)*[a-z0-9_-]+$'
+
+
+def decode_punycode(label: str) -> str:
+    """Decode a lowercase Punycode label (`xn--...`) as done by tldextract"""
+    try:
+        return idna.decode(label)
+    except (UnicodeError, IndexError):
+        return label
+
+
+class RegisteredDomainExtractor:
+    """Registered domain extraction using the public suffix list of a
+    `tldextract.TLDExtract` instance, by default the one used by
+    `tldextract.extract`. Pass `tldextract.TLDExtract(suffix_list_urls=())`
+    to use only the public suffix list bundled with tldextract."""
+
+    def __init__(self, tld_extractor: tldextract.TLDExtract = None):
+        if tld_extractor is None:
+            tld_extractor = tldextract.tldextract.TLD_EXTRACTOR
+        self.tld_extractor = tld_extractor
+        self.memo = dict()
+        self.punycode_memo = dict()
+        # the trie of reversed labels, flattened into sets of suffixes:
+        #  - nodes: the path to every trie node, e.g. `uk`, `co.uk`
+        #  - suffixes: nodes which are public suffixes (end of a rule)
+        #  - wildcards: nodes with a wildcard child, e.g. `ck` for `*.ck`
+        #  - exceptions: exceptions of wildcard rules, e.g. `www.ck` for `!www.ck`
+        nodes, suffixes, wildcards, exceptions = set(), set(), set(), set()
+        for suffix in tld_extractor.tlds:
+            labels = suffix.split('.')
+            for i in range(len(labels) - 1, -1, -1):
+                path = '.'.join(labels[i:])
+                if labels[i] == '*':
+                    wildcards.add('.'.join(labels[(i + 1):]))
+                    break
+                if labels[i].startswith('!'):
+                    exceptions.add(path[1:])
+                    break
+                nodes.add(path)
+            else:
+                suffixes.add(suffix)
+        self.nodes = pa.array(sorted(nodes), type=pa.string())
+        self.suffixes = pa.array(sorted(suffixes), type=pa.string())
+        self.wildcards = pa.array(sorted(wildcards), type=pa.string())
+        self.exceptions = pa.array(sorted(exceptions), type=pa.string())
+
+    def registered_domain_tldextract(self, host: str) -> str:
+        domain = self.memo.get(host)
+        if domain is None:
+            result = self.tld_extractor(host)
+            domain = ''
+            if result.domain and result.suffix:
+                domain = result.domain + '.' + result.suffix
+            self.memo[host] = domain
+        return domain
+
+    def decode_punycode_labels(self, labels: pa.Array) -> pa.Array:
+        """Decode Punycode labels, return the input if there are none"""
+        is_punycode = pc.starts_with(labels, 'xn--')
+        if not pc.any(is_punycode).as_py():
+            return labels
+        decoded = list()
+        for label in labels.filter(is_punycode).to_pylist():
+            if label not in self.punycode_memo:
+                self.punycode_memo[label] = decode_punycode(label)
+            decoded.append(self.punycode_memo[label])
+        return pc.replace_with_mask(labels, is_punycode, pa.array(decoded, type=pa.string()))
+
+    def suffix_lengths(self, hosts: pa.Array) -> tuple:
+        """Match plain host names (no nulls) against the suffix trie, level
+        by level. Same algorithm as the method `suffix_index` in tldextract.
+        Returns the number of labels of the host names and of their public
+        suffixes (-1 if none is found), and per level (number of labels)
+        the indices of the host names still matched and their trailing
+        labels."""
+        parts = pc.split_pattern(hosts, '.')
+        values = parts.values
+        offsets = parts.offsets.to_numpy()
+        n_labels = offsets[1:] - offsets[:-1]
+        ends = offsets[1:]
+        suffix_length = np.full(len(hosts), -1, dtype=np.int32)
+        levels = list()
+        active = np.arange(len(hosts))
+        # trailing labels (`tail`) and the same with Punycode labels decoded (`key`)
+        tail = key = None
+        is_wildcard = np.zeros(len(hosts), dtype=bool)
+        level = 0
+        while len(active) > 0:
+            level += 1
+            label = values.take(ends[active] - level)
+            key_label = self.decode_punycode_labels(label)
+            if tail is None:
+                tail, key = label, key_label
+            else:
+                joined = pc.binary_join_element_wise(label, tail, '.')
+                if key_label is label and key is tail:
+                    key = joined
+                else:
+                    key = pc.binary_join_element_wise(key_label, key, '.')
+                tail = joined
+            levels.append((active, tail))
+            matched = pc.is_in(key, value_set=self.nodes).to_numpy(zero_copy_only=False)
+            is_suffix = pc.is_in(key, value_set=self.suffixes).to_numpy(zero_copy_only=False)
+            suffix_length[active[matched & is_suffix]] = level
+            # label not matched: wildcard rule applies if the parent has a wildcard child
+            wildcard = ~matched & is_wildcard
+            if wildcard.any():
+                is_exception = pc.is_in(key.filter(pa.array(wildcard)),
+                                        value_set=self.exceptions).to_numpy(zero_copy_only=False)
+                suffix_length[active[wildcard]] = np.where(is_exception, level - 1, level)
+            # continue with hosts matched so far which have more labels
+            more = matched & (n_labels[active] > level)
+            active = active[more]
+            selection = pa.array(more)
+            if key is tail:
+                tail = key = tail.filter(selection)
+            else:
+                tail, key = tail.filter(selection), key.filter(selection)
+            is_wildcard = pc.is_in(key, value_set=self.wildcards).to_numpy(zero_copy_only=False)
+        return n_labels, suffix_length, levels
+
+    def registered_domains_array(self, hosts: pa.Array) -> pa.Array:
+        """Registered domains of an Arrow string array"""
+        n = len(hosts)
+        is_simple = pc.match_substring_regex(hosts, simple_host_pattern)
+        is_simple = is_simple.fill_null(False).to_numpy(zero_copy_only=False)
+        simple = np.flatnonzero(is_simple)
+        simple_hosts = hosts if len(simple) == n else hosts.take(simple)
+        n_labels, suffix_length, levels = self.suffix_lengths(simple_hosts)
+
+        # the registered domain are the trailing (suffix length + 1) labels
+        has_domain = (suffix_length >= 0) & (suffix_length < n_labels)
+        domain_labels = np.where(has_domain, suffix_length + 1, 0)
+        rows = [simple[~has_domain]]
+        domains = [pa.array([''] * len(rows[0]), type=pa.string())]
+        for level, (active, tail) in enumerate(levels, start=1):
+            selected = np.flatnonzero(domain_labels[active] == level)
+            rows.append(simple[active[selected]])
+            domains.append(tail.take(selected))
+            domain_labels[active[selected]] = 0
+        # wildcard matches on the last level, not reached by all hosts
+        rest = np.flatnonzero(domain_labels > 0)
+        if len(rest) > 0:
+            rows.append(simple[rest])
+            domains.append(pa.array([host.split('.', (labels - length - 1))[-1]
+                                     for host, labels, length
+                                     in zip(simple_hosts.take(rest).to_pylist(),
+                                            n_labels[rest], suffix_length[rest])],
+                                    type=pa.string()))
+        # all other host names
+        other = np.flatnonzero(~is_simple)
+        rows.append(other)
+        domains.append(pa.array([None if host is None else self.registered_domain_tldextract(host)
+                                 for host in hosts.take(other).to_pylist()], type=pa.string()))
+
+        rows = np.concatenate(rows)
+        order = np.empty(n, dtype=np.int64)
+        order[rows] = np.arange(n)
+        return pa.concat_arrays(domains).take(order)
+
+    def registered_domains(self, hosts, chunk_size: int = 1_000_000):
+        """Registered domains of host names given as Arrow (chunked)
+        array, pandas Series or list. Returns an Arrow chunked array,
+        or a Series (with the same index) if the input is a Series.
+        Null values are kept."""
+        index = None
+        if isinstance(hosts, pd.Series):
+            index = hosts.index
+        if not isinstance(hosts, pa.ChunkedArray):
+            if not isinstance(hosts, pa.Array):
+                hosts = pa.array(hosts, type=pa.string())
+            hosts = pa.chunked_array([hosts])
+        hosts = hosts.cast(pa.string())
+        chunks = list()
+        for chunk in hosts.chunks:
+            for offset in range(0, len(chunk), chunk_size):
+                chunks.append(self.registered_domains_array(chunk.slice(offset, chunk_size)))
+        domains = pa.chunked_array(chunks, type=pa.string())
+        if index is not None:
+            return domains.to_pandas().set_axis(index)
+        return domains
+
+
+_extractor = None
+
+
+def registered_domains(hosts, chunk_size: int = 1_000_000):
+    """Registered domains of host names, see
+    `RegisteredDomainExtractor.registered_domains`. The extractor
+    (suffix trie and memoized lookups) is shared by all calls."""
+    global _extractor
+    if _extractor is None:
+        _extractor = RegisteredDomainExtractor()
+    return _extractor.registered_domains(hosts, chunk_size)
@@ -0,0 +1,292 @@
+"""Fingerprints of the robots.txt rulesets per host and crawl, and the
+changes between crawls.
+
+Most robots.txt files do not change from one crawl to the next. The
+rulesets extracted by `robotstxt_statistics.py` are serialized in a
+normalized form (user-agents and rules sorted, see `format_ruleset` in
+`robotstxt_parser.py`), so that the 64-bit BLAKE2b digest of the
+serialized ruleset identifies identical rulesets without parsing the
+JSON.
+
+The fingerprint table is a Parquet table partitioned by crawl, with one
+row per host. If there are multiple robots.txt captures of a host (e.g.
+http:// and https://), the fingerprint of the host is computed over the
+fingerprints of all its captures and `url` is the first URL. Rows are
+sorted by host, so that looking up single hosts reads only a few row
+groups.
+
+    # build the fingerprint table from the ruleset files
+    python robotstxt_fingerprints.py build data/top-k-sample/rulesets/ \\
+        data/top-k-sample/ruleset-fingerprints/ CC-MAIN-2025-05 CC-MAIN-2025-08
+    # hosts added, removed, changed and unchanged between two crawls
+    python robotstxt_fingerprints.py changes data/top-k-sample/ruleset-fingerprints/ \\
+        CC-MAIN-2025-05 CC-MAIN-2025-08
+    # crawls in which the robots.txt of a host changed
+    python robotstxt_fingerprints.py history data/top-k-sample/ruleset-fingerprints/ \\
+        www.example.com
+"""
+
+import argparse
+import hashlib
+import io
+import logging
+import os
+import re
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from json.decoder import scanstring
+from urllib.parse import urlparse
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import zstandard
+
+from pipeline_manifest import input_fingerprint, open_manifest, script_version
+
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+
+logging.basicConfig(level='INFO',
+                    format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+
+fingerprints_schema = pa.schema([
+    pa.field('host',            pa.string()),
+    pa.field('url',             pa.string()),
+    pa.field('n_urls',          pa.int32()),
+    pa.field('fingerprint',     pa.int64())
+])
+
+# changes of a host between two crawls
+ruleset_changes = ['added', 'removed', 'changed', 'unchanged']
+
+_non_ascii_pattern = re.compile('[^\x00-\x7f]')
+
+
+def _escape_non_ascii(m) -> str:
+    c = ord(m.group(0))
+    if c > 0xffff:
+        # surrogate pair
+        c -= 0x10000
+        return '\\u%04x\\u%04x' % (0xd800 + (c >> 10), 0xdc00 + (c & 0x3ff))
+    return '\\u%04x' % c
+
+
+def serialize_ruleset(ruleset: dict) -> bytes:
+    """Serialize a ruleset to the same bytes as written by the Spark job
+    (`ujson.dumps` in `robotstxt_parser.format_ruleset`), so that the
+    fingerprints do not depend on whether ujson is installed"""
+    if json.__name__ == 'ujson':
+        return json.dumps(ruleset).encode('utf-8')
+    # same as ujson: compact, non-ASCII characters escaped, `/` escaped,
+    # but DEL (0x7f) not escaped
+    s = json.dumps(ruleset, ensure_ascii=False, separators=(',', ':'))
+    return _non_ascii_pattern.sub(_escape_non_ascii, s).replace('/', '\\/').encode('utf-8')
+
+
+def fingerprint(data: bytes) -> int:
+    """64-bit digest (e.g. of a serialized ruleset) as signed integer,
+    stored as Parquet int64"""
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(),
+                          'little', signed=True)
+
+
+def read_serialized_rulesets(path: str):
+    """Stream robots.txt rulesets from a (zstd-compressed) JSONL file,
+    yield tuples (url, serialized ruleset as UTF-8 bytes). Lines written
+    by `robotstxt_parser.ruleset_json` (`{"<url>":<ruleset>}`) are split
+    without decoding and parsing the ruleset."""
+    with open(path, 'rb') as fh:
+        stream = fh
+        if path.endswith('.zst'):
+            stream = io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(fh))
+        for line in stream:
+            line = line.rstrip(b'\r\n')
+            if line.startswith(b'{"') and line.endswith(b'}'):
+                # end of the URL: the first unescaped `":{`
+                end = line.find(b'":{')
+                if end > 0 and line[end - 1] != 0x5c:
+                    url, _ = scanstring(line[2:(end + 1)].decode('utf-8'), 0)
+                    yield url, line[(end + 2):-1]
+                    continue
+            # not written by ruleset_json, parse and serialize again
+            for url, ruleset in json.loads(line).items():
+                yield url, serialize_ruleset(ruleset)
+
+
+def host_fingerprints(path: str) -> pd.DataFrame:
+    """Fingerprints of the rulesets in one ruleset file, one row per
+    host, sorted by host"""
+    hosts, urls, fingerprints = [], [], []
+    for url, ruleset in read_serialized_rulesets(path):
+        hosts.append(urlparse(url).hostname)
+        urls.append(url)
+        fingerprints.append(fingerprint(ruleset))
+    df = pd.DataFrame({'host': hosts, 'url': urls,
+                       'fingerprint': np.array(fingerprints, dtype=np.int64)})
+    df = df[df['host'].notna()].sort_values(['host', 'url'], kind='stable')
+    n_urls = df.groupby('host', sort=False)['url'].transform('size')
+    # hosts with multiple captures: fingerprint over the sorted fingerprints
+    multi = df[n_urls > 1]
+    combined = multi.groupby('host', sort=False)['fingerprint'] \
+                    .agg(lambda f: fingerprint(np.sort(f.to_numpy()).tobytes()))
+    df['n_urls'] = n_urls.astype(np.int32)
+    df = df.drop_duplicates('host', keep='first')
+    df.loc[df['n_urls'] > 1, 'fingerprint'] = df.loc[df['n_urls'] > 1, 'host'].map(combined)
+    return df[['host', 'url', 'n_urls', 'fingerprint']].reset_index(drop=True)
+
+
+def rulesets_path(crawl: str, input_location: str) -> str:
+    return os.path.join(input_location, crawl + '-rulesets.jsonl.zst')
+
+
+def fingerprints_path(crawl: str, location: str) -> str:
+    return os.path.join(location, 'crawl=' + crawl, 'fingerprints-' + crawl + '.zstd.parquet')
+
+
+def write_fingerprints(crawl: str, input_location: str, output_location: str) -> tuple:
+    """Compute and write the fingerprints of one crawl, return the number
+    of hosts and the output path"""
+    df = host_fingerprints(rulesets_path(crawl, input_location))
+    output_path = fingerprints_path(crawl, output_location)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    table = pa.Table.from_pandas(df, schema=fingerprints_schema, preserve_index=False)
+    pq.write_table(table, output_path, compression='zstd', row_group_size=100_000)
+    logging.info('Ruleset fingerprints of crawl %s (%d hosts) saved to %s',
+                 crawl, df.shape[0], output_path)
+    return df.shape[0], output_path
+
+
+def build_fingerprints(crawls: list, input_location: str, output_location: str,
+                       num_workers: int = None, manifest_path: str = None):
+    """Write the fingerprints of multiple crawls in parallel, one worker
+    process per crawl. If a manifest is given, crawls with unchanged
+    inputs are skipped."""
+    manifest = open_manifest(manifest_path)
+    fingerprints = dict()
+    if manifest:
+        for crawl in crawls:
+            fingerprints[crawl] = input_fingerprint([rulesets_path(crawl, input_location)],
+                                                    script_version(__file__))
+        crawls = [crawl for crawl in crawls
+                  if not manifest.is_up_to_date('ruleset_fingerprints', crawl,
+                                                fingerprints[crawl])]
+        logging.info('Ruleset fingerprints to be updated for %d crawls', len(crawls))
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        futures = {executor.submit(write_fingerprints, crawl, input_location,
+                                   output_location): crawl
+                   for crawl in crawls}
+        for future in as_completed(futures):
+            _, output_path = future.result()
+            if manifest:
+                crawl = futures[future]
+                manifest.update('ruleset_fingerprints', crawl, fingerprints[crawl],
+                                [output_path])
+
+
+def read_fingerprints(location: str, crawl: str, hosts=None) -> pd.DataFrame:
+    """Read the fingerprints of one crawl, optionally only of the given hosts"""
+    filters = None
+    if hosts is not None:
+        filters = [('host', 'in', list(hosts))]
+    return pd.read_parquet(fingerprints_path(crawl, location), filters=filters)
+
+
+def change_set(df_previous: pd.DataFrame, df_current: pd.DataFrame) -> pd.DataFrame:
+    """Changes of the rulesets between two crawls: one row per host
+    with the columns `host`, `url` (of the current crawl, or of the
+    previous crawl if removed) and `change` (one of `ruleset_changes`)"""
+    # nullable integers, 64-bit fingerprints are not exact as float
+    columns = {'fingerprint': 'Int64'}
+    d = df_previous[['host', 'url', 'fingerprint']].astype(columns).merge(
+        df_current[['host', 'url', 'fingerprint']].astype(columns), how='outer', on='host',
+        suffixes=('_previous', ''), indicator=True, sort=True)
+    differs = (d['fingerprint'] != d['fingerprint_previous']).fillna(False).to_numpy(bool)
+    change = np.select([(d['_merge'] == 'right_only').to_numpy(),
+                        (d['_merge'] == 'left_only').to_numpy(),
+                        differs],
+                       ['added', 'removed', 'changed'], 'unchanged')
+    return pd.DataFrame({'host': d['host'],
+                         'url': d['url'].fillna(d['url_previous']),
+                         'change': pd.Categorical(change, categories=ruleset_changes)})
+
+
+def change_counts(df_changes: pd.DataFrame) -> pd.Series:
+    """Number of hosts per change"""
+    return df_changes['change'].value_counts(sort=False)
+
+
+def fingerprint_history(location: str, host: str) -> pd.DataFrame:
+    """Fingerprints of one host in all crawls of the fingerprint table,
+    sorted by crawl. The column `changed` is true if the ruleset differs
+    from the one of the previous crawl in which the host was captured."""
+    df = pd.read_parquet(location, filters=[('host', '==', host)])
+    df['crawl'] = df['crawl'].astype(str)
+    df = df.sort_values('crawl').reset_index(drop=True)
+    fingerprints = df['fingerprint'].to_numpy()
+    df['changed'] = np.append(False, fingerprints[1:] != fingerprints[:-1])
+    return df[['crawl', 'url', 'n_urls', 'fingerprint', 'changed']]
+
+
+def changes(args):
+    df_changes = change_set(read_fingerprints(args.location, args.previous_crawl),
+                            read_fingerprints(args.location, args.crawl))
+    for change, cnt in change_counts(df_changes).items():
+        print('%-10s %10d' % (change, cnt))
+    if args.output:
+        df_changes.to_csv(args.output, index=False)
+        logging.info('Changes of %d hosts saved to %s', df_changes.shape[0], args.output)
+
+
+def history(args):
+    df = fingerprint_history(args.location, args.host)
+    print(df.to_string(index=False))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    p = subparsers.add_parser('build', help='Build the fingerprint table',
+                              formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    p.add_argument('input_location',
+                   help='Directory containing the ruleset files'
+                   ' `{crawl}-rulesets.jsonl.zst`')
+    p.add_argument('output_location',
+                   help='Location of the fingerprint table (local directory)')
+    p.add_argument('crawl_data_set', nargs='+',
+                   help='Common Crawl crawl dataset(s) to process, eg. CC-MAIN-2022-33')
+    p.add_argument('--num_workers', type=int, default=os.cpu_count(),
+                   help='Number of parallel worker processes')
+    p.add_argument('--manifest', default=None,
+                   help='Manifest file (JSON, local) recording inputs and outputs'
+                   ' per crawl. If given, crawls with unchanged inputs are skipped')
+    p.set_defaults(func=lambda args: build_fingerprints(
+        args.crawl_data_set, args.input_location, args.output_location,
+        args.num_workers, args.manifest))
+
+    p = subparsers.add_parser('changes', help='Count the hosts added, removed, changed'
+                              ' and unchanged between two crawls',
+                              formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    p.add_argument('location', help='Location of the fingerprint table')
+    p.add_argument('previous_crawl', help='Crawl to compare with, eg. CC-MAIN-2025-05')
+    p.add_argument('crawl', help='Crawl, eg. CC-MAIN-2025-08')
+    p.add_argument('--output', default=None,
+                   help='Save the change of every host to this CSV file')
+    p.set_defaults(func=changes)
+
+    p = subparsers.add_parser('history', help='Show the fingerprints of a host'
+                              ' over all crawls and mark changes',
+                              formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    p.add_argument('location', help='Location of the fingerprint table')
+    p.add_argument('host', help='Host name, eg. www.example.com')
+    p.set_defaults(func=history)
+
+    args = parser.parse_args()
+    args.func(args)
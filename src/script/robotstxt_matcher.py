@@ -0,0 +1,266 @@
+"""Evaluate URL paths against robots.txt rulesets following RFC 9309.
+
+Rulesets are read from the output of `robotstxt_statistics.py` run with
+`--extract_rulesets`, that is lines of JSON objects
+
+    {"<robots.txt URL>": {"<user-agent>": {"allow": [...], "disallow": [...]}}}
+
+Every per-agent ruleset is compiled once into a matching structure:
+- literal rules (no wildcards) are looked up by path prefix, bucketed
+  by the length of the rule path, from the longest to the shortest
+- rules ending in `$` without wildcards require an exact path match
+- rules with a `*` wildcard are compiled into regular expressions and
+  are only tried if they are longer than the best literal match
+
+The most specific (longest) matching rule wins. If an allow and a
+disallow rule are equally specific, the allow rule is used.
+"""
+
+import argparse
+import io
+import logging
+import re
+
+from urllib.parse import quote, urlparse
+
+import pandas as pd
+import zstandard
+
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+
+logging.basicConfig(level='INFO',
+                    format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+
+# RFC 9309: crawlers should use the product token to find the group,
+# the token consists of the characters [a-zA-Z_-]
+product_token_pattern = re.compile(r'[a-zA-Z_-]+')
+
+# characters not percent-encoded when normalizing rule paths or URL paths
+_path_safe_chars = "!#$%&'()*+,-./:;=?@[\\]^_`{|}~"
+
+# percent-encoded octet
+_percent_escape_pattern = re.compile(r'%[0-9a-fA-F]{2}')
+
+
+def normalize_user_agent(user_agent: str) -> str:
+    """Normalize the value of a user-agent line or the name of a crawler
+    to the lowercased product token (e.g. `Googlebot/2.1` to `googlebot`)"""
+    user_agent = user_agent.strip()
+    if user_agent.startswith('*'):
+        return '*'
+    m = product_token_pattern.match(user_agent)
+    if m:
+        return m.group(0).lower()
+    return user_agent.lower()
+
+
+def _upper(m) -> str:
+    return m.group(0).upper()
+
+
+def normalize_path(path: str) -> str:
+    """Percent-encode characters which are not US-ASCII or not printable,
+    already percent-encoded characters are kept. The hex digits of
+    percent-encoded octets are uppercased (`%3c` to `%3C`), so that rules
+    and paths are compared by the encoded octets."""
+    if not (path.isascii() and path.isprintable() and ' ' not in path):
+        path = quote(path, safe=_path_safe_chars)
+    if '%' in path:
+        path = _percent_escape_pattern.sub(_upper, path)
+    return path
+
+
+class Ruleset:
+    """Allow and disallow rules for a single user-agent, compiled once
+    for fast evaluation of many URL paths."""
+
+    def __init__(self, rules: dict):
+        # prefix rules: length -> {rule path: allowed}
+        prefix_rules = dict()
+        # rules anchored by `$`, no wildcard: rule path -> (length, allowed)
+        exact_rules = dict()
+        # wildcard rules: (length, allowed, compiled pattern)
+        wildcard_rules = list()
+
+        for directive, allowed in (('disallow', False), ('allow', True)):
+            for rule in rules.get(directive, []):
+                if not rule:
+                    # an empty rule does not match anything
+                    continue
+                rule = normalize_path(rule)
+                length = len(rule)
+                anchored = rule.endswith('$')
+                if anchored:
+                    rule = rule[:-1]
+                if '*' in rule:
+                    pattern = '.*'.join(map(re.escape, rule.split('*')))
+                    if anchored:
+                        pattern += '\\Z'
+                    wildcard_rules.append((length, allowed, re.compile(pattern, re.DOTALL)))
+                elif anchored:
+                    if allowed or rule not in exact_rules:
+                        exact_rules[rule] = (length, allowed)
+                else:
+                    bucket = prefix_rules.setdefault(length, dict())
+                    if allowed or rule not in bucket:
+                        bucket[rule] = allowed
+
+        self.prefix_rules = sorted(prefix_rules.items(), reverse=True)
+        self.exact_rules = exact_rules
+        # longest first, at equal length allow rules first
+        self.wildcard_rules = sorted(wildcard_rules, key=lambda r: (-r[0], not r[1]))
+
+    def match(self, path: str):
+        """Return the tuple (length, allowed) of the most specific rule
+        matching the path, or None if no rule matches"""
+        best = None
+        for length, bucket in self.prefix_rules:
+            allowed = bucket.get(path[:length])
+            if allowed is not None:
+                best = (length, allowed)
+                break
+        exact = self.exact_rules.get(path)
+        if exact is not None and (best is None or exact[0] > best[0]
+                                  or (exact[0] == best[0] and exact[1])):
+            best = exact
+        for length, allowed, pattern in self.wildcard_rules:
+            if best is not None and (length < best[0]
+                                     or (length == best[0] and (best[1] or not allowed))):
+                break
+            if pattern.match(path):
+                best = (length, allowed)
+                break
+        return best
+
+    def is_allowed(self, path: str) -> bool:
+        """Whether the URL path (including the query) may be fetched"""
+        if not path:
+            path = '/'
+        else:
+            path = normalize_path(path)
+        if path == '/robots.txt':
+            # implicitly allowed, see RFC 9309, section 2.2.2
+            return True
+        best = self.match(path)
+        return best is None or best[1]
+
+    def are_allowed(self, paths) -> list:
+        """Evaluate a list of URL paths, return a list of booleans"""
+        is_allowed = self.is_allowed
+        return [is_allowed(path) for path in paths]
+
+
+# ruleset which allows everything
+ALLOW_ALL = Ruleset({})
+
+
+class RobotsTxt:
+    """Rulesets of a single robots.txt file"""
+
+    # compiled rulesets shared among all robots.txt files:
+    # identical rulesets (e.g. `Disallow: /`) are compiled only once
+    _compiled = dict()
+
+    def __init__(self, rulesets: dict, shared: bool = True):
+        """If `shared` is false, the rulesets are compiled for this
+        robots.txt file only and are not added to the shared rulesets"""
+        compile = RobotsTxt.compile if shared else Ruleset
+        groups = dict()
+        for agent, rules in rulesets.items():
+            agent = normalize_user_agent(agent)
+            # merge groups addressing the same user-agent
+            group = groups.setdefault(agent, {'allow': [], 'disallow': []})
+            for directive in ('allow', 'disallow'):
+                group[directive].extend(rules.get(directive, []))
+        self.groups = {agent: compile(rules) for agent, rules in groups.items()}
+
+    @staticmethod
+    def compile(rules: dict) -> Ruleset:
+        key = (tuple(sorted(rules['allow'])), tuple(sorted(rules['disallow'])))
+        ruleset = RobotsTxt._compiled.get(key)
+        if ruleset is None:
+            ruleset = Ruleset(rules)
+            RobotsTxt._compiled[key] = ruleset
+        return ruleset
+
+    def ruleset_for(self, user_agent: str) -> Ruleset:
+        """Select the ruleset for a crawler: the group matching the
+        product token, or the wildcard group `*`, or allow all"""
+        groups = self.groups
+        ruleset = groups.get(normalize_user_agent(user_agent))
+        if ruleset is None:
+            ruleset = groups.get('*', ALLOW_ALL)
+        return ruleset
+
+    def is_allowed(self, user_agent: str, path: str) -> bool:
+        return self.ruleset_for(user_agent).is_allowed(path)
+
+
+def read_rulesets(path: str, key: str = 'host') -> dict:
+    """Read rulesets from a JSONL file (optionally zstd-compressed) and
+    compile them. With `key='host'` the rulesets are indexed by host name,
+    if there are multiple robots.txt captures for the same host, the first
+    one is used. With `key='url'` the rulesets are indexed by robots.txt
+    URL."""
+    robotstxts = dict()
+    with open(path, 'rb') as fh:
+        if path.endswith('.zst'):
+            fh = zstandard.ZstdDecompressor().stream_reader(fh)
+        for line in io.TextIOWrapper(fh, encoding='utf-8'):
+            obj = json.loads(line)
+            for url, rulesets in obj.items():
+                if key == 'host':
+                    url = urlparse(url).hostname
+                if url not in robotstxts:
+                    robotstxts[url] = RobotsTxt(rulesets)
+    return robotstxts
+
+
+def evaluate(robotstxts: dict, queries) -> list:
+    """Evaluate many (host, user_agent, path) queries at once. Returns
+    for every query whether the path is allowed, or None if there is no
+    robots.txt for the host. Queries are grouped by host and user-agent,
+    so that the ruleset is selected only once per group."""
+    results = [None] * len(queries)
+    groups = dict()
+    for i, (host, user_agent, path) in enumerate(queries):
+        groups.setdefault((host, user_agent), []).append(i)
+    for (host, user_agent), indexes in groups.items():
+        robotstxt = robotstxts.get(host)
+        if robotstxt is None:
+            continue
+        is_allowed = robotstxt.ruleset_for(user_agent).is_allowed
+        for i in indexes:
+            results[i] = is_allowed(queries[i][2])
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('rulesets',
+                        help='Rulesets extracted by robotstxt_statistics.py'
+                        ' (JSONL, optionally zstd-compressed)')
+    parser.add_argument('queries',
+                        help='CSV file with columns host, user_agent and path')
+    parser.add_argument('output',
+                        help='Output CSV file, the queries with the added'
+                        ' column `allowed` (empty if there is no robots.txt'
+                        ' for the host)')
+    args = parser.parse_args()
+
+    robotstxts = read_rulesets(args.rulesets)
+    logging.info('Read %d robots.txt rulesets (%d distinct per-agent rulesets)',
+                 len(robotstxts), len(RobotsTxt._compiled))
+
+    df = pd.read_csv(args.queries, dtype=str, keep_default_na=False)
+    logging.info('Evaluating %d queries', df.shape[0])
+    df['allowed'] = pd.Series(evaluate(robotstxts,
+                                       list(zip(df['host'], df['user_agent'], df['path']))),
+                              dtype='boolean')
+    logging.info('Evaluation results:\n%s', df['allowed'].value_counts(dropna=False))
+    df.to_csv(args.output, header=True, index=False)
@@ -0,0 +1,285 @@
+"""Aggregations over the table of robots.txt captures of top-k sites,
+see `get_robotstxt_ranked_list.py` and the metrics notebook
+`src/jupyter/metrics-top-k-sample.ipynb`.
+"""
+
+import numpy as np
+import pandas as pd
+
+from classify_robotstxt_rulesets import robotstxt_ruleset_classes
+
+
+# Metrics of robots.txt status counts, in output order
+robotstxt_status_metrics = ['No robots.txt capture',
+                            'HTTP forbidden',
+                            'HTTP defer visits',
+                            'HTTP allow all',
+                            'HTTP redirect not resolved',
+                            'MIME not a robots.txt',
+                            'Robots.txt no rules',
+                            'Robots.txt with rules']
+
+# If there are multiple robots.txt captures per host (e.g. http:// and
+# https://), the most reliable one is selected. Lower values take precedence.
+robotstxt_fetch_status_priority = {
+    'success': 0,
+    'notfound': 1,
+    'other': 1,
+    'unauthorized': 1,
+    'forbidden': 2,
+    'defer_visits': 3,
+    'redirect': 4,
+}
+
+_status_metric_by_priority = ['(success)',
+                              'HTTP allow all',
+                              'HTTP forbidden',
+                              'HTTP defer visits',
+                              'HTTP redirect not resolved']
+
+
+def robotstxt_status_counts_topk(df: pd.DataFrame, crawls: list,
+                                 top_k_list: list) -> pd.DataFrame:
+    """Count the robots.txt status of hosts per crawl and top-k stratum.
+
+    The DataFrame is expected to hold the columns `crawl`, `host`, `rank`,
+    `robotstxt_fetch_status`, `is_robotstxt_mime_type` and `robotstxt_parsed`.
+    `top_k_list` is a list of tuples (name, k). Returns a DataFrame with the
+    columns `crawl`, `top-k` and the metrics in `robotstxt_status_metrics`,
+    one row per top-k stratum and crawl (in this order).
+
+    The status of every (crawl, host) is resolved in a single pass by
+    priority (success > allow all > forbidden > defer visits > redirect).
+    All strata are then computed at once from cumulative counts over the
+    hosts sorted by rank. Every host is expected to have a unique rank."""
+    d = df[df['crawl'].isin(crawls)]
+    priority = d['robotstxt_fetch_status'].map(robotstxt_fetch_status_priority) \
+                                          .astype('float64').to_numpy()
+    has_robotstxt = (d['robotstxt_fetch_status'] == 'success').to_numpy() \
+        & d['is_robotstxt_mime_type'].fillna(False).astype(bool).to_numpy()
+    robotstxt_parsed = has_robotstxt & d['robotstxt_parsed'].fillna(False).astype(bool).to_numpy()
+    hosts = pd.DataFrame({'crawl': d['crawl'].astype(str).to_numpy(),
+                          'host': d['host'].to_numpy(),
+                          'rank': d['rank'].to_numpy(),
+                          'priority': priority,
+                          'has_robotstxt': has_robotstxt,
+                          'robotstxt_parsed': robotstxt_parsed}) \
+        .groupby(['crawl', 'host'], sort=False) \
+        .agg(rank=('rank', 'min'),
+             priority=('priority', 'min'),
+             has_robotstxt=('has_robotstxt', 'max'),
+             robotstxt_parsed=('robotstxt_parsed', 'max')) \
+        .reset_index() \
+        .sort_values(['crawl', 'rank'], kind='stable')
+
+    # distinct ranks with at least one capture
+    ranks = d[['crawl', 'rank']].astype({'crawl': str}).drop_duplicates() \
+                                .sort_values(['crawl', 'rank'])
+
+    ks = np.array([k for _, k in top_k_list])
+    counts = dict()
+    for crawl, h in hosts.groupby('crawl', sort=False):
+        # number of hosts with rank <= k for every stratum
+        n = np.searchsorted(h['rank'].to_numpy(), ks, side='right')
+        cumulative = dict()
+        for p, metric in enumerate(_status_metric_by_priority):
+            cumulative[metric] = np.cumsum(h['priority'].to_numpy() == p)
+        cumulative['has_robotstxt'] = np.cumsum(h['has_robotstxt'].to_numpy())
+        cumulative['robotstxt_parsed'] = np.cumsum(h['robotstxt_parsed'].to_numpy())
+        for metric in cumulative:
+            c = cumulative[metric]
+            c = np.concatenate([[0], c])
+            counts[crawl, metric] = c[n]
+    for crawl, r in ranks.groupby('crawl', sort=False):
+        counts[crawl, 'ranks'] = np.searchsorted(r['rank'].to_numpy(), ks, side='right')
+
+    rows = list()
+    zero = np.zeros(len(ks), dtype=np.int64)
+    for i, (top, k) in enumerate(top_k_list):
+        for crawl in crawls:
+            def get(metric):
+                return int(counts.get((crawl, metric), zero)[i])
+            res = {'crawl': crawl, 'top-k': top}
+            res['No robots.txt capture'] = k - get('ranks')
+            res['HTTP forbidden'] = get('HTTP forbidden')
+            res['HTTP defer visits'] = get('HTTP defer visits')
+            res['HTTP allow all'] = get('HTTP allow all')
+            res['HTTP redirect not resolved'] = get('HTTP redirect not resolved')
+            res['MIME not a robots.txt'] = get('(success)') - get('has_robotstxt')
+            res['Robots.txt no rules'] = get('has_robotstxt') - get('robotstxt_parsed')
+            res['Robots.txt with rules'] = get('robotstxt_parsed')
+            assert k == sum(res[m] for m in robotstxt_status_metrics)
+            rows.append(res)
+
+    return pd.DataFrame(rows, columns=['crawl', 'top-k', *robotstxt_status_metrics])
+
+
+def explode_ruleset_classes(df_captures: pd.DataFrame, df_ruleset_classes: pd.DataFrame,
+                            useragents=None) -> pd.DataFrame:
+    """Join the robots.txt captures (columns `crawl`, `url`, `host`, `rank`)
+    with the ruleset classes written by `classify_robotstxt_rulesets.py`
+    (columns `crawl`, `url`, `user_agent`, `ruleset_class`, one row per URL
+    and user-agent in the order of the ruleset). If a set of (lowercase)
+    user-agents is given, other user-agents are skipped (after determining
+    the last user-agent of every ruleset).
+
+    Returns a table with one row per capture and user-agent, and the columns
+    `crawl`, `rank`, `host`, `useragent` (lowercase), `ruleset_class`,
+    `is_last` (last user-agent of the capture's ruleset) and `has_wildcard`
+    (ruleset of the capture addresses the wildcard user-agent `*`)."""
+    captures = df_captures[['crawl', 'url', 'host', 'rank']].astype({'crawl': str})
+    captures['capture'] = np.arange(captures.shape[0])
+    classes = df_ruleset_classes[['crawl', 'url', 'user_agent', 'ruleset_class']] \
+        .astype({'crawl': str, 'ruleset_class': str})
+    classes['useragent'] = classes['user_agent'].str.lower()
+    classes['position'] = np.arange(classes.shape[0])
+    d = captures.merge(classes, how='inner', on=['crawl', 'url'], sort=False) \
+                .sort_values(['capture', 'position'], kind='stable')
+    capture = d['capture'].to_numpy()
+    d['is_last'] = np.append(capture[1:] != capture[:-1], True)
+    d['has_wildcard'] = (d['useragent'] == '*').groupby(d['capture']).transform('any')
+    if useragents is not None:
+        d = d[d['useragent'].isin(useragents)]
+    return d[['crawl', 'rank', 'host', 'useragent', 'ruleset_class',
+              'is_last', 'has_wildcard']].reset_index(drop=True)
+
+
+def _bin_counts(group: np.ndarray, bins: np.ndarray, n_groups: int, n_bins: int) -> np.ndarray:
+    """Count (group, bin) pairs, returns array of shape (n_groups, n_bins)"""
+    return np.bincount(group * n_bins + bins,
+                       minlength=n_groups * n_bins).reshape(n_groups, n_bins)
+
+
+def user_agent_counts_topk(df: pd.DataFrame, crawls: list, top_k_list: list):
+    """Count the hosts addressing user-agents in their robots.txt rulesets,
+    per crawl, top-k stratum and ruleset class, and per year and top-k stratum.
+
+    Input is the table returned by `explode_ruleset_classes`, `top_k_list`
+    is a list of tuples (name, k) in ascending order. Host sets are
+    represented by sorted arrays of integer keys (user-agent and rank),
+    every host is expected to have a unique rank. Returns two DataFrames
+    with the same columns as the CSV files `robotstxt-user-agents-topk.csv`
+    and `robotstxt-user-agents-topk-year.csv`. Rows are sorted by crawl
+    resp. year, top-k and user-agent.
+
+    The counts of the pseudo user-agent `(any)` include hosts addressing
+    any user-agent. The columns `*-<ruleset class>` include the rules of the
+    wildcard user-agent `*` for hosts not addressing the user-agent directly.
+
+    Note: the following details are kept from the original implementation
+    in the metrics notebook, so that the results are identical:
+    - if the ruleset of a capture has no rules for the wildcard user-agent,
+      the host is counted as "allow-all" for the last user-agent of the ruleset
+    - the host counts per year include the hosts of all preceding years"""
+    ks = np.array([k for _, k in top_k_list], dtype=np.int64)
+    n_bins = len(ks)
+    n_classes = len(robotstxt_ruleset_classes)
+    allow_all = robotstxt_ruleset_classes.index('allow-all')
+
+    d = df[df['crawl'].isin(crawls) & (df['rank'] <= ks[-1])]
+    codes, names = pd.factorize(d['useragent'], sort=True)
+    ua_names = np.array(list(names) + ['(any)'], dtype=object)
+    n_ua = len(ua_names)
+    any_ua = n_ua - 1
+    wildcard = names.get_loc('*') if '*' in names else -1
+    ua_order = np.argsort(ua_names, kind='stable')
+    # encode (user-agent, host) as integer keys
+    m = int(ks[-1]) + 1
+
+    ranks = d['rank'].to_numpy().astype(np.int64)
+    codes = codes.astype(np.int64)
+    classes = pd.Categorical(d['ruleset_class'], categories=robotstxt_ruleset_classes) \
+                .codes.astype(np.int64)
+    quirk = (d['is_last'].to_numpy() & ~d['has_wildcard'].to_numpy().astype(bool))
+    crawl_indices = d.groupby('crawl', sort=False).indices
+
+    def rank_bin(r):
+        # stratum of rank: the smallest k with rank <= k
+        return np.searchsorted(ks, r, side='left')
+
+    counts = list()
+    counts_year = list()
+
+    def emit(rows, key, cnt, extra=None):
+        for b, (top, k) in enumerate(top_k_list):
+            sel = ua_order[cnt[ua_order, b] > 0]
+            res = {key[0]: key[1], 'top-k': top, 'useragent': ua_names[sel],
+                   'cnt': cnt[sel, b], '%': 100.0 * cnt[sel, b] / k}
+            if extra is not None:
+                for name, values in extra:
+                    for c, cl in enumerate(robotstxt_ruleset_classes):
+                        res[name + cl] = values[sel, c, b]
+            rows.append(pd.DataFrame(res))
+
+    year_pairs = np.empty(0, dtype=np.int64)
+    current_year = None
+    for crawl in crawls:
+        year = int(crawl[8:12])
+        if year != current_year:
+            if current_year:
+                pu, pr = np.divmod(year_pairs, m)
+                cnt = np.cumsum(_bin_counts(pu, rank_bin(pr), n_ua, n_bins), axis=1)
+                emit(counts_year, ('year', current_year), cnt)
+            current_year = year
+
+        idx = crawl_indices.get(crawl, np.empty(0, dtype=np.int64))
+        r, u, c, q = ranks[idx], codes[idx], classes[idx], quirk[idx]
+
+        # distinct (user-agent, host), including the pseudo user-agent `(any)`
+        pairs = np.unique(np.concatenate([u, np.full_like(u, any_ua)]) * m
+                          + np.concatenate([r, r]))
+        year_pairs = np.union1d(year_pairs, pairs)
+        pu, pr = np.divmod(pairs, m)
+        hosts_bin = _bin_counts(pu, rank_bin(pr), n_ua, n_bins)
+
+        # distinct (user-agent, ruleset class, host)
+        tu = np.concatenate([u, np.full_like(u, any_ua), u[q]])
+        tc = np.concatenate([c, c, np.full(np.count_nonzero(q), allow_all, dtype=np.int64)])
+        tr = np.concatenate([r, r, r[q]])
+        triples = np.unique((tu * n_classes + tc) * m + tr)
+        tuc, tr = np.divmod(triples, m)
+        classes_bin = _bin_counts(tuc, rank_bin(tr), n_ua * n_classes, n_bins) \
+            .reshape(n_ua, n_classes, n_bins)
+
+        # hosts per ruleset class of the wildcard user-agent, and the
+        # intersection with the hosts addressing a user-agent directly
+        wildcard_bin = np.zeros((n_classes, n_bins), dtype=np.int64)
+        inter_bin = np.zeros((n_ua, n_classes, n_bins), dtype=np.int64)
+        if wildcard >= 0:
+            w = u == wildcard
+            wpairs = np.unique(c[w] * m + r[w])
+            wc, wr = np.divmod(wpairs, m)
+            wildcard_bin = _bin_counts(wc, rank_bin(wr), n_classes, n_bins)
+            inter = pd.DataFrame({'u': pu, 'r': pr}).merge(pd.DataFrame({'c': wc, 'r': wr}),
+                                                           on='r')
+            inter_bin = _bin_counts(inter['u'].to_numpy() * n_classes + inter['c'].to_numpy(),
+                                    rank_bin(inter['r'].to_numpy()),
+                                    n_ua * n_classes, n_bins).reshape(n_ua, n_classes, n_bins)
+
+        cnt = np.cumsum(hosts_bin, axis=1)
+        seen = cnt > 0
+        present = hosts_bin > 0
+        class_cnt = np.cumsum(classes_bin, axis=2)
+        add = np.where(present[:, None, :],
+                       classes_bin + wildcard_bin[None, :, :] - inter_bin,
+                       wildcard_bin[None, :, :])
+        add = np.where(seen[:, None, :], add, 0)
+        wildcard_cnt = np.cumsum(add, axis=2)
+        if wildcard >= 0:
+            wildcard_cnt[wildcard] = class_cnt[wildcard]
+
+        emit(counts, ('crawl', crawl), cnt, [('', class_cnt), ('*-', wildcard_cnt)])
+
+    if current_year:
+        pu, pr = np.divmod(year_pairs, m)
+        cnt = np.cumsum(_bin_counts(pu, rank_bin(pr), n_ua, n_bins), axis=1)
+        emit(counts_year, ('year', current_year), cnt)
+
+    columns = ['crawl', 'top-k', 'useragent', 'cnt', '%',
+               *robotstxt_ruleset_classes,
+               *map(lambda c: '*-' + c, robotstxt_ruleset_classes)]
+    df_counts = pd.concat(counts, ignore_index=True) if counts else pd.DataFrame(columns=columns)
+    columns_year = ['year', 'top-k', 'useragent', 'cnt', '%']
+    df_counts_year = pd.concat(counts_year, ignore_index=True) if counts_year \
+        else pd.DataFrame(columns=columns_year)
+    return df_counts[columns], df_counts_year[columns_year]
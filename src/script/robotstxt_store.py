@@ -0,0 +1,490 @@
+"""On-disk indexed store of the robots.txt captures and rulesets of top-k
+sites, to look up "what did the robots.txt of host X say for user-agent Y
+in crawl Z" without loading the capture table and the rulesets of all
+crawls into memory.
+
+The store is a directory of flat binary files, which are memory-mapped
+(`numpy.memmap`) by the reader:
+ - `meta.json`: format version, crawls (sorted, index = crawl id), sizes
+ - `hosts.offsets`, `hosts.data`: host names, sorted, as UTF-8 strings
+   concatenated and their offsets (uint64)
+ - `hosts.captures`: index of the first capture of every host (uint64)
+ - `captures`: one fixed-size record per capture (see `capture_dtype`),
+   sorted by host, crawl and URL
+ - `strings.offsets`, `strings.data`: interned strings (URLs, MIME
+   types, user-agents, rule paths), referenced by id
+ - `rulesets.offsets`: index of the first rule of every ruleset (uint64)
+ - `rules`: one fixed-size record per rule (see `rule_dtype`)
+
+Identical rulesets (same fingerprint, see `robotstxt_fingerprints.py`)
+are stored once, most robots.txt files do not change between crawls.
+Hosts are found by binary search over the sorted host names, the
+captures of a host are a contiguous range. A lookup touches only a few
+pages of the memory-mapped files.
+
+    # build the store (note: the captures of all crawls are sorted in memory)
+    python robotstxt_store.py build data/top-k-sample/captures/ \\
+        data/top-k-sample/rulesets/ data/top-k-sample/robotstxt-store/ \\
+        CC-MAIN-2025-05 CC-MAIN-2025-08
+    # rules for a user-agent, in one crawl or a range of crawls
+    python robotstxt_store.py lookup data/top-k-sample/robotstxt-store/ \\
+        www.example.com --user_agent GPTBot --crawl CC-MAIN-2025-08
+    # is a path allowed for the user-agent?
+    python robotstxt_store.py lookup data/top-k-sample/robotstxt-store/ \\
+        www.example.com --user_agent GPTBot --path /news/
+    # captures of a range of hosts (sorted by name)
+    python robotstxt_store.py range data/top-k-sample/robotstxt-store/ \\
+        www.example.a www.example.z
+"""
+
+import argparse
+import logging
+import os
+
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+import pandas as pd
+
+from classify_robotstxt_rulesets import read_useragents
+from robotstxt_fingerprints import fingerprint, read_serialized_rulesets, rulesets_path
+from robotstxt_matcher import RobotsTxt, normalize_user_agent
+
+try:
+    import ujson as json
+except ImportError:
+    import json
+
+
+logging.basicConfig(level='INFO',
+                    format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+
+store_format = 'robotstxt-store'
+store_version = 1
+
+# id of missing strings and rulesets
+NONE = 0xFFFFFFFF
+
+capture_dtype = np.dtype([
+    ('crawl',                   '<u2'),
+    ('rank',                    '<i4'),
+    ('fetch_status',            '<i4'),
+    ('url',                     '<u4'),
+    ('fetch_redirect',          '<u4'),
+    ('content_mime_type',       '<u4'),
+    ('content_mime_detected',   '<u4'),
+    ('ruleset',                 '<u4'),
+])
+
+rule_dtype = np.dtype([
+    ('user_agent',  '<u4'),
+    ('path',        '<u4'),
+    ('directive',   'u1'),
+])
+
+directives = ['allow', 'disallow']
+
+capture_columns = ['host', 'rank', 'url', 'fetch_status', 'fetch_redirect',
+                   'content_mime_type', 'content_mime_detected']
+
+Capture = namedtuple('Capture', ['host', 'crawl', 'url', 'rank', 'fetch_status',
+                                 'fetch_redirect', 'content_mime_type',
+                                 'content_mime_detected', 'ruleset'])
+
+
+class StringTable:
+    """Interned strings, written as concatenated UTF-8 and offsets"""
+
+    def __init__(self):
+        self.ids = dict()
+
+    def intern(self, s) -> int:
+        if s is None or (isinstance(s, float) and np.isnan(s)):
+            return NONE
+        i = self.ids.get(s)
+        if i is None:
+            i = len(self.ids)
+            self.ids[s] = i
+        return i
+
+    def intern_all(self, values) -> np.ndarray:
+        intern = self.intern
+        return np.fromiter((intern(s) for s in values), dtype=np.uint32, count=len(values))
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def write_strings(strings: list, path: str, name: str):
+    """Write strings (in this order) as `<name>.data` and `<name>.offsets`"""
+    encoded = [s.encode('utf-8') for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype='<u8')
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    with open(os.path.join(path, name + '.data'), 'wb') as fh:
+        for b in encoded:
+            fh.write(b)
+    offsets.tofile(os.path.join(path, name + '.offsets'))
+
+
+def build_store(crawls: list, captures_location: str, rulesets_location: str,
+                output_path: str, useragents=None):
+    """Pack the capture table and the rulesets of the given crawls into
+    a store at `output_path`. If a set of (lowercase) user-agents is
+    given, the rules of other user-agents are skipped, except for the
+    wildcard group `*`."""
+    crawls = sorted(crawls)
+    strings = StringTable()
+    host_ids = dict()
+    ruleset_ids = dict()
+    rule_offsets = array('Q', [0])
+    rule_agents, rule_paths, rule_directives = array('I'), array('I'), array('B')
+    directive_index = {d: i for i, d in enumerate(directives)}
+    hosts, parts = [], []
+
+    for crawl_id, crawl in enumerate(crawls):
+        # ruleset ids by robots.txt URL
+        url_rulesets = dict()
+        path = rulesets_path(crawl, rulesets_location)
+        if os.path.exists(path):
+            for url, ruleset in read_serialized_rulesets(path):
+                fp = fingerprint(ruleset)
+                ruleset_id = ruleset_ids.get(fp)
+                if ruleset_id is None:
+                    ruleset_id = len(ruleset_ids)
+                    ruleset_ids[fp] = ruleset_id
+                    for agent, rules in json.loads(ruleset).items():
+                        if useragents is not None and agent != '*' \
+                                and agent.lower() not in useragents:
+                            continue
+                        agent_id = strings.intern(agent)
+                        for directive, paths in rules.items():
+                            for p in paths:
+                                rule_agents.append(agent_id)
+                                rule_paths.append(strings.intern(p))
+                                rule_directives.append(directive_index[directive])
+                    rule_offsets.append(len(rule_agents))
+                url_rulesets[url] = ruleset_id
+        else:
+            logging.warning('No rulesets for crawl %s: %s not found', crawl, path)
+
+        df = pd.read_parquet(captures_location, columns=capture_columns,
+                             filters=[('crawl', '==', crawl)])
+        part = np.zeros(df.shape[0], dtype=capture_dtype)
+        part['crawl'] = crawl_id
+        part['rank'] = df['rank'].fillna(-1).to_numpy()
+        part['fetch_status'] = df['fetch_status'].fillna(-1).to_numpy()
+        part['url'] = strings.intern_all(df['url'])
+        part['fetch_redirect'] = strings.intern_all(df['fetch_redirect'])
+        part['content_mime_type'] = strings.intern_all(df['content_mime_type'])
+        part['content_mime_detected'] = strings.intern_all(df['content_mime_detected'])
+        part['ruleset'] = np.fromiter((url_rulesets.get(url, NONE) for url in df['url']),
+                                      dtype=np.uint32, count=df.shape[0])
+        hosts.append(np.fromiter((host_ids.setdefault(h, len(host_ids)) for h in df['host']),
+                                 dtype=np.uint32, count=df.shape[0]))
+        parts.append(part)
+        logging.info('Crawl %s: %d captures, %d rulesets', crawl, df.shape[0], len(url_rulesets))
+
+    # sort the hosts by name and the captures by host, crawl and URL
+    host_names = list(host_ids)
+    del host_ids
+    host_order = sorted(range(len(host_names)), key=host_names.__getitem__)
+    host_position = np.empty(len(host_names), dtype=np.uint32)
+    host_position[host_order] = np.arange(len(host_names), dtype=np.uint32)
+    captures = np.concatenate(parts) if parts else np.zeros(0, dtype=capture_dtype)
+    capture_hosts = host_position[np.concatenate(hosts)] if hosts \
+        else np.zeros(0, dtype=np.uint32)
+    del parts, hosts
+    order = np.lexsort((captures['url'], captures['crawl'], capture_hosts))
+    captures = captures[order]
+    capture_hosts = capture_hosts[order]
+    host_captures = np.searchsorted(capture_hosts, np.arange(len(host_names) + 1)) \
+                      .astype('<u8')
+
+    rules = np.zeros(len(rule_agents), dtype=rule_dtype)
+    rules['user_agent'] = np.frombuffer(rule_agents, dtype=np.uint32)
+    rules['path'] = np.frombuffer(rule_paths, dtype=np.uint32)
+    rules['directive'] = np.frombuffer(rule_directives, dtype=np.uint8)
+
+    os.makedirs(output_path, exist_ok=True)
+    write_strings([host_names[i] for i in host_order], output_path, 'hosts')
+    host_captures.tofile(os.path.join(output_path, 'hosts.captures'))
+    captures.tofile(os.path.join(output_path, 'captures'))
+    write_strings(list(strings.ids), output_path, 'strings')
+    np.frombuffer(rule_offsets, dtype='<u8').tofile(os.path.join(output_path,
+                                                                 'rulesets.offsets'))
+    rules.tofile(os.path.join(output_path, 'rules'))
+    # written last: the store is complete
+    meta = {
+        'format': store_format,
+        'version': store_version,
+        'crawls': crawls,
+        'hosts': len(host_names),
+        'captures': captures.shape[0],
+        'rulesets': len(ruleset_ids),
+        'rules': rules.shape[0],
+        'strings': len(strings),
+        'user_agents_filtered': useragents is not None,
+    }
+    with open(os.path.join(output_path, 'meta.json'), 'w') as fh:
+        json.dump(meta, fh, indent=1)
+    logging.info('Store written to %s: %d hosts, %d captures, %d distinct rulesets, %d rules',
+                 output_path, meta['hosts'], meta['captures'], meta['rulesets'], meta['rules'])
+    return meta
+
+
+class StringArray:
+    """Read-only sequence of strings stored as concatenated UTF-8 and
+    offsets, decoded on access (supports `bisect` if sorted)"""
+
+    def __init__(self, offsets: np.ndarray, data: np.ndarray):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        if i < 0:
+            i += len(self)
+        return self.data[self.offsets[i]:self.offsets[i + 1]].tobytes().decode('utf-8')
+
+
+class RobotstxtStore:
+    """Reader of a store written by `build_store`, all files are
+    memory-mapped. The rulesets compiled to check paths are kept in an
+    LRU cache of `max_compiled` rulesets."""
+
+    def __init__(self, path: str, max_compiled: int = 1000):
+        with open(os.path.join(path, 'meta.json')) as fh:
+            self.meta = json.load(fh)
+        if self.meta.get('format') != store_format or self.meta.get('version') != store_version:
+            raise ValueError('Not a robots.txt store (version %d): %s' % (store_version, path))
+        self.path = path
+        self.crawls = self.meta['crawls']
+        self.crawl_ids = {crawl: i for i, crawl in enumerate(self.crawls)}
+        self.hosts = StringArray(self._map('hosts.offsets', '<u8'), self._map('hosts.data', 'u1'))
+        self.host_captures = self._map('hosts.captures', '<u8')
+        self.captures = self._map('captures', capture_dtype)
+        self.strings = StringArray(self._map('strings.offsets', '<u8'),
+                                   self._map('strings.data', 'u1'))
+        self.ruleset_offsets = self._map('rulesets.offsets', '<u8')
+        self.rules = self._map('rules', rule_dtype)
+        self.max_compiled = max_compiled
+        self.compiled = OrderedDict()
+
+    def _map(self, name: str, dtype) -> np.ndarray:
+        path = os.path.join(self.path, name)
+        if os.path.getsize(path) == 0:
+            # empty files cannot be memory-mapped
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode='r')
+
+    def _string(self, i: int):
+        if i == NONE:
+            return None
+        return self.strings[i]
+
+    def host_index(self, host: str):
+        """Index of the host, or None if not contained in the store"""
+        i = bisect_left(self.hosts, host)
+        if i < len(self.hosts) and self.hosts[i] == host:
+            return i
+        return None
+
+    def _crawl_range(self, first_crawl: str = None, last_crawl: str = None) -> tuple:
+        """Crawl ids (first, last + 1) of a range of crawls (inclusive)"""
+        first, last = 0, len(self.crawls)
+        if first_crawl is not None:
+            first = bisect_left(self.crawls, first_crawl)
+        if last_crawl is not None:
+            last = bisect_left(self.crawls, last_crawl)
+            if last < len(self.crawls) and self.crawls[last] == last_crawl:
+                last += 1
+        return first, last
+
+    def _capture(self, host: str, record) -> Capture:
+        ruleset = int(record['ruleset'])
+        return Capture(host,
+                       self.crawls[record['crawl']],
+                       self._string(record['url']),
+                       int(record['rank']),
+                       int(record['fetch_status']),
+                       self._string(record['fetch_redirect']),
+                       self._string(record['content_mime_type']),
+                       self._string(record['content_mime_detected']),
+                       None if ruleset == NONE else ruleset)
+
+    def _host_captures(self, i: int, first: int, last: int) -> list:
+        start, end = int(self.host_captures[i]), int(self.host_captures[i + 1])
+        crawl = self.captures['crawl'][start:end]
+        lo, hi = np.searchsorted(crawl, [first, last])
+        host = self.hosts[i]
+        return [self._capture(host, self.captures[j])
+                for j in range(start + int(lo), start + int(hi))]
+
+    def lookup(self, host: str, first_crawl: str = None, last_crawl: str = None) -> list:
+        """Captures of a host, optionally only in a range of crawls"""
+        i = self.host_index(host)
+        if i is None:
+            return []
+        return self._host_captures(i, *self._crawl_range(first_crawl, last_crawl))
+
+    def range(self, start_host: str, end_host: str, first_crawl: str = None,
+              last_crawl: str = None):
+        """Iterate over the captures of all hosts with start_host <= host < end_host
+        (sorted by name), optionally only in a range of crawls"""
+        first, last = self._crawl_range(first_crawl, last_crawl)
+        for i in range(bisect_left(self.hosts, start_host), bisect_left(self.hosts, end_host)):
+            yield from self._host_captures(i, first, last)
+
+    def ruleset(self, ruleset_id: int) -> dict:
+        """Rules of a ruleset by user-agent, in the format of the extracted
+        rulesets: {user-agent: {directive: [paths]}}"""
+        rules = self.rules[self.ruleset_offsets[ruleset_id]:self.ruleset_offsets[ruleset_id + 1]]
+        ruleset = dict()
+        for agent, path, directive in rules.tolist():
+            ruleset.setdefault(self.strings[agent], dict()) \
+                   .setdefault(directives[directive], []).append(self.strings[path])
+        return ruleset
+
+    def rules_for(self, capture: Capture, user_agent: str) -> tuple:
+        """Rules which apply to a user-agent (following RFC 9309: the
+        group(s) matching the product token, or the wildcard group).
+        Returns a tuple (matched group, rules), the matched group is
+        None if there are no rules for the user-agent."""
+        if capture.ruleset is None:
+            return None, {}
+        ruleset = self.ruleset(capture.ruleset)
+        for group in (normalize_user_agent(user_agent), '*'):
+            rules = {}
+            for agent, agent_rules in ruleset.items():
+                if normalize_user_agent(agent) == group:
+                    for directive, paths in agent_rules.items():
+                        rules.setdefault(directive, []).extend(paths)
+            if rules:
+                return group, rules
+        return None, {}
+
+    def is_allowed(self, capture: Capture, user_agent: str, path: str):
+        """Whether the path may be fetched by the user-agent, None if
+        the capture has no ruleset"""
+        if capture.ruleset is None:
+            return None
+        return self.robotstxt(capture.ruleset).is_allowed(user_agent, path)
+
+    def robotstxt(self, ruleset_id: int) -> RobotsTxt:
+        """Compiled ruleset, see `robotstxt_matcher.RobotsTxt`"""
+        robotstxt = self.compiled.get(ruleset_id)
+        if robotstxt is not None:
+            self.compiled.move_to_end(ruleset_id)
+            return robotstxt
+        # not shared with other RobotsTxt objects: the memory used is
+        # bounded by the size of the cache
+        robotstxt = RobotsTxt(self.ruleset(ruleset_id), shared=False)
+        self.compiled[ruleset_id] = robotstxt
+        if len(self.compiled) > self.max_compiled:
+            self.compiled.popitem(last=False)
+        return robotstxt
+
+
+def capture_result(store: RobotstxtStore, capture: Capture, args) -> dict:
+    res = capture._asdict()
+    if args.user_agent:
+        group, rules = store.rules_for(capture, args.user_agent)
+        res['user_agent_group'] = group
+        res['rules'] = rules
+        if args.path is not None:
+            res['allowed'] = store.is_allowed(capture, args.user_agent, args.path)
+    elif args.rules and capture.ruleset is not None:
+        res['rules'] = store.ruleset(capture.ruleset)
+    return res
+
+
+def lookup(args):
+    store = RobotstxtStore(args.store)
+    first, last = args.first_crawl, args.last_crawl
+    if args.crawl:
+        first = last = args.crawl
+    for capture in store.lookup(args.host, first, last):
+        print(json.dumps(capture_result(store, capture, args)))
+
+
+def host_range(args):
+    store = RobotstxtStore(args.store)
+    first, last = args.first_crawl, args.last_crawl
+    if args.crawl:
+        first = last = args.crawl
+    for n, capture in enumerate(store.range(args.start_host, args.end_host, first, last)):
+        if args.limit and n >= args.limit:
+            break
+        print(json.dumps(capture_result(store, capture, args)))
+
+
+def build(args):
+    useragents = None
+    if args.user_agents:
+        useragents = read_useragents(args.user_agents)
+    build_store(args.crawl_data_set, args.captures_location, args.rulesets_location,
+                args.output_path, useragents)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    p = subparsers.add_parser('build', help='Build the store',
+                              formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    p.add_argument('captures_location',
+                   help='Capture table (Parquet, partitioned by crawl), result of'
+                   ' get_robotstxt_captures_athena.py')
+    p.add_argument('rulesets_location',
+                   help='Directory containing the ruleset files `{crawl}-rulesets.jsonl.zst`')
+    p.add_argument('output_path', help='Output directory of the store')
+    p.add_argument('crawl_data_set', nargs='+',
+                   help='Common Crawl crawl dataset(s) to process, eg. CC-MAIN-2022-33')
+    p.add_argument('--user_agents', default=None,
+                   help='CSV file with user-agents (lowercase, first column)'
+                   ' whose rules are kept, e.g. data/top-k-sample/user-agents-frequent.csv.'
+                   ' If not given, all rules are kept')
+    p.set_defaults(func=build)
+
+    def add_query_arguments(p):
+        p.add_argument('--crawl', default=None, help='Only captures of this crawl')
+        p.add_argument('--first_crawl', default=None,
+                       help='Only captures of this and later crawls')
+        p.add_argument('--last_crawl', default=None,
+                       help='Only captures of this and earlier crawls')
+        p.add_argument('--user_agent', default=None,
+                       help='Show the rules which apply to this user-agent')
+        p.add_argument('--path', default=None,
+                       help='Check whether this URL path is allowed for the user-agent'
+                       ' (requires --user_agent)')
+        p.add_argument('--rules', action='store_true',
+                       help='Show the rules of all user-agents')
+
+    p = subparsers.add_parser('lookup', help='Captures and rules of a host',
+                              formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    p.add_argument('store', help='Location of the store')
+    p.add_argument('host', help='Host name, eg. www.example.com')
+    add_query_arguments(p)
+    p.set_defaults(func=lookup)
+
+    p = subparsers.add_parser('range', help='Captures and rules of a range of hosts'
+                              ' (start_host <= host < end_host)',
+                              formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    p.add_argument('store', help='Location of the store')
+    p.add_argument('start_host', help='First host name of the range')
+    p.add_argument('end_host', help='End of the range (exclusive)')
+    p.add_argument('--limit', type=int, default=0,
+                   help='Max. number of captures shown, 0 means no limit')
+    add_query_arguments(p)
+    p.set_defaults(func=host_range)
+
+    args = parser.parse_args()
+    if getattr(args, 'path', None) is not None and not args.user_agent:
+        parser.error('Option --path requires --user_agent')
+    args.func(args)
@@ -0,0 +1,14 @@
+"""Tests of the robots.txt processing. Run `python -m unittest` (or
+`python -m pytest tests`) in the directory `src/`.
+"""
+
+import os
+import sys
+
+# the Spark job and the scripts are not installed as packages,
+# add their directories to the module search path (same as the notebooks do)
+_src_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for _dir in ('cc-pyspark', 'script'):
+    _path = os.path.join(_src_dir, _dir)
+    if _path not in sys.path:
+        sys.path.append(_path)
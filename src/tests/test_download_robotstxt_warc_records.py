@@ -0,0 +1,182 @@
+"""Download WARC records from a local HTTP server which serves synthetic
+WARC files, with and without support of range requests, missing WARC
+files and temporary failures."""
+
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import unittest
+
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pandas as pd
+
+from warcio.archiveiterator import ArchiveIterator
+
+from benchmark import synthetic
+from download_robotstxt_warc_records import download_warc_records
+
+
+crawl = 'CC-MAIN-2025-05'
+
+
+class WarcFileHandler(BaseHTTPRequestHandler):
+    """Serve the WARC files of the server, the path prefix selects the
+    behavior:
+     - `/range/`: range requests supported (HTTP 206)
+     - `/norange/`: range requests ignored, full content sent (HTTP 200)
+     - `/flaky/`: the first request fails with HTTP 503
+     - `/missing/`: HTTP 404"""
+
+    def do_GET(self):
+        _, mode, name = self.path.split('/', 2)
+        self.server.requests[mode] += 1
+        data = self.server.files.get(name)
+        if mode == 'missing' or data is None:
+            self.send_error(404)
+            return
+        if mode == 'flaky' and self.server.requests[mode] == 1:
+            self.send_error(503)
+            return
+        m = re.fullmatch(r'bytes=(\d+)-(\d+)', self.headers.get('Range', ''))
+        if mode == 'norange' or m is None:
+            self.send_response(200)
+        else:
+            start, end = int(m.group(1)), int(m.group(2)) + 1
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes %d-%d/%d' % (start, end - 1, len(data)))
+            data = data[start:end]
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class DownloadWarcRecordsTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.mkdtemp()
+        path = synthetic.write_warc(os.path.join(cls.tmp_dir, 'robotstxt.warc.gz'), 50)
+        with open(path, 'rb') as fh:
+            cls.warc = fh.read()
+        # offsets and lengths of the response records (skip the warcinfo record)
+        cls.records = list()
+        with open(path, 'rb') as fh:
+            it = ArchiveIterator(fh)
+            for record in it:
+                if record.rec_type == 'response':
+                    record.content_stream().read()
+                    it.read_to_end()
+                    cls.records.append((it.get_record_offset(), it.get_record_length()))
+
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), WarcFileHandler)
+        cls.server.files = {'robotstxt.warc.gz': cls.warc}
+        cls.server.requests = Counter()
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        logging.disable(logging.CRITICAL)
+
+    @classmethod
+    def tearDownClass(cls):
+        logging.disable(logging.NOTSET)
+        cls.server.shutdown()
+        cls.server.server_close()
+        shutil.rmtree(cls.tmp_dir)
+
+    def setUp(self):
+        self.server.requests.clear()
+        self.input_location = tempfile.mkdtemp(dir=self.tmp_dir)
+        self.output_location = tempfile.mkdtemp(dir=self.tmp_dir)
+        self.args = SimpleNamespace(
+            input_location=self.input_location,
+            output_location=self.output_location,
+            base_url='http://127.0.0.1:%d/' % self.server.server_address[1],
+            num_connections=4, max_range_gap=1024, max_range_size=4096,
+            max_retries=1, timeout=10)
+
+    def write_download_list(self, modes: list):
+        """Download list with all records of the WARC file, served once
+        per mode"""
+        rows = [(mode + '/robotstxt.warc.gz', offset, length)
+                for mode in modes for offset, length in self.records]
+        output_dir = os.path.join(self.input_location, 'crawl=' + crawl)
+        os.makedirs(output_dir, exist_ok=True)
+        pd.DataFrame(rows, columns=['warc_filename', 'warc_record_offset',
+                                    'warc_record_length']) \
+          .to_csv(os.path.join(output_dir, 'robotstxt-captures-' + crawl + '.csv'), index=False)
+
+    def output_path(self) -> str:
+        return os.path.join(self.output_location, 'crawl=' + crawl,
+                            'robotstxt-captures-' + crawl + '.warc.gz')
+
+    def expected(self, n: int = 1) -> bytes:
+        return b''.join(self.warc[offset:(offset + length)]
+                        for offset, length in self.records) * n
+
+    def checkpointed(self) -> list:
+        with open(self.output_path() + '.checkpoint') as fh:
+            return [line.split('"')[3] for line in fh]
+
+    def test_range_requests(self):
+        self.write_download_list(['range'])
+        self.assertEqual(download_warc_records(crawl, self.args), self.output_path())
+        with open(self.output_path(), 'rb') as fh:
+            self.assertEqual(fh.read(), self.expected())
+        # records are merged into fewer range requests
+        self.assertLess(self.server.requests['range'], len(self.records))
+
+    def test_range_requests_not_supported(self):
+        self.write_download_list(['norange'])
+        self.assertEqual(download_warc_records(crawl, self.args), self.output_path())
+        with open(self.output_path(), 'rb') as fh:
+            self.assertEqual(fh.read(), self.expected())
+        # the first range request, then a single pass over the WARC file
+        self.assertEqual(self.server.requests['norange'], 2)
+
+    def test_retry_failed_request(self):
+        self.write_download_list(['flaky'])
+        self.assertEqual(download_warc_records(crawl, self.args), self.output_path())
+        with open(self.output_path(), 'rb') as fh:
+            self.assertEqual(fh.read(), self.expected())
+
+    def test_missing_warc_file(self):
+        self.write_download_list(['missing', 'range'])
+        # incomplete download, the missing WARC file does not stop the others
+        self.assertIsNone(download_warc_records(crawl, self.args))
+        with open(self.output_path(), 'rb') as fh:
+            self.assertEqual(fh.read(), self.expected())
+        self.assertEqual(self.server.requests['missing'], 1)  # not retried
+        self.assertEqual(self.checkpointed(), ['range/robotstxt.warc.gz'])
+
+        # resumed download: only the failed WARC file is fetched again
+        self.server.requests.clear()
+        self.assertIsNone(download_warc_records(crawl, self.args))
+        self.assertEqual(self.server.requests['range'], 0)
+        self.assertEqual(self.server.requests['missing'], 1)
+        with open(self.output_path(), 'rb') as fh:
+            self.assertEqual(fh.read(), self.expected())
+
+    def test_download_list_changed(self):
+        self.write_download_list(['missing', 'range'])
+        self.assertIsNone(download_warc_records(crawl, self.args))
+
+        # new download list: the previous download is discarded
+        self.server.requests.clear()
+        self.write_download_list(['range', 'norange'])
+        self.assertEqual(download_warc_records(crawl, self.args), self.output_path())
+        self.assertGreater(self.server.requests['range'], 0)
+        with open(self.output_path(), 'rb') as fh:
+            self.assertEqual(fh.read(), self.expected(2))
+        self.assertEqual(sorted(self.checkpointed()), ['norange/robotstxt.warc.gz',
+                                                       'range/robotstxt.warc.gz'])
+
+
+if __name__ == '__main__':
+    unittest.main()
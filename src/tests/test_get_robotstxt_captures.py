@@ -0,0 +1,200 @@
+"""Resolve redirect targets, and look up robots.txt captures with the
+local backend (DuckDB) on a small synthetic columnar index, per crawl
+and in batched mode, following redirects"""
+
+import glob
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from urllib.parse import urljoin, urlparse
+
+import pandas as pd
+
+from get_robotstxt_captures_athena import url_host_names, urls_join
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+
+script = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                      'script', 'get_robotstxt_captures_athena.py')
+
+crawls = ['CC-MAIN-2025-05', 'CC-MAIN-2025-08']
+
+topdomains = pd.DataFrame({'rank': [1, 2, 3],
+                           'host': ['a.com', 'www.b.org', 'c.net'],
+                           'domain': ['a.com', 'b.org', 'c.net']}) \
+               .astype({'rank': 'int32'})
+
+
+def cc_index_rows(crawl: str) -> list:
+    """Captures of one crawl: a.com redirects to www.a.com, www.b.org is
+    captured twice (only the most recent capture is used), c.net is not
+    captured in the second crawl, other.com is not in the top domains"""
+    second = (crawl == crawls[1])
+    rows = [
+        ('https://a.com/robots.txt', 'a.com', 301, 'https://www.a.com/robots.txt'),
+        ('https://www.a.com/robots.txt', 'www.a.com', 200, None),
+        ('https://www.b.org/robots.txt', 'www.b.org', 404, None),
+        ('https://www.b.org/robots.txt', 'www.b.org', 200, None),
+        ('https://other.com/robots.txt', 'other.com', 200, None),
+    ]
+    if not second:
+        rows.append(('http://c.net/robots.txt', 'c.net', 200, None))
+    return [{'url': url,
+             'url_host_tld': host.rsplit('.', 1)[1],
+             'url_host_registered_domain': host.split('.', 1)[1] if host.startswith('www.')
+                                           else host,
+             'url_host_name': host,
+             'url_protocol': url.split(':', 1)[0],
+             'url_path': '/robots.txt',
+             'url_query': None,
+             # the second capture of a URL is the more recent one
+             'fetch_time': pd.Timestamp('2025-01-01') + pd.Timedelta(days=i),
+             'fetch_status': status,
+             'warc_filename': 'crawl-data/%s/robotstxt/%05d.warc.gz' % (crawl, i),
+             'warc_record_offset': 1000 * i,
+             'warc_record_length': 500 + i,
+             'fetch_redirect': redirect,
+             'content_mime_type': 'text/plain',
+             'content_mime_detected': 'text/plain'}
+            for i, (url, host, status, redirect) in enumerate(rows)]
+
+
+class RedirectTargetsTest(unittest.TestCase):
+
+    # relative redirect targets resolved by string concatenation (simple)
+    # or by urljoin (all others)
+    simple_targets = [('https://a.com/robots.txt', '/robots.txt?'),
+                      ('https://a.com/robots.txt', '/en/robots.txt'),
+                      ('http://b.org:8080/robots.txt', '/robots.txt')]
+    other_targets = [('https://a.com/robots.txt', 'robots.txt?lang=en'),
+                     ('https://a.com/robots.txt', '//www.a.com/robots.txt'),
+                     ('https://a.com/x/robots.txt', '../robots.txt'),
+                     ('https://a.com/robots.txt', '/robots.txt?lang=en'),
+                     ('https://a.com/robots.txt', '')]
+
+    # host names extracted by the regular expression (simple)
+    # or by urlparse (all others)
+    simple_urls = ['https://www.a.com/robots.txt', 'http://User@B.org:8080/robots.txt',
+                   'https://c.net']
+    other_urls = ['https://[::1]/robots.txt', 'https://[2001:db8::1]:8443/robots.txt',
+                  'ftp://d.com/robots.txt', 'https://ä.com/robots.txt', '/robots.txt']
+
+    def check_urls_join(self, pairs: list):
+        base_urls = pd.Series([b for b, _ in pairs], dtype=str)
+        targets = pd.Series([t for _, t in pairs], dtype=str)
+        self.assertEqual(urls_join(base_urls, targets).tolist(),
+                         [urljoin(b, t) for b, t in pairs])
+
+    def check_url_host_names(self, urls: list):
+        hosts = url_host_names(pd.Series(urls, dtype=str))
+        self.assertEqual([None if pd.isna(h) else h for h in hosts],
+                         [urlparse(url).hostname or None for url in urls])
+
+    def test_urls_join(self):
+        self.check_urls_join(self.simple_targets)
+        self.check_urls_join(self.simple_targets + self.other_targets)
+        for pair in self.other_targets:
+            self.check_urls_join([pair])
+        self.check_urls_join(self.other_targets)
+        self.check_urls_join([])
+
+    def test_url_host_names(self):
+        self.check_url_host_names(self.simple_urls)
+        self.check_url_host_names(self.simple_urls + self.other_urls)
+        for url in self.other_urls:
+            self.check_url_host_names([url])
+        self.check_url_host_names(self.other_urls)
+        self.check_url_host_names([])
+
+    def test_index_not_reset(self):
+        # masked subsets of a column, as passed by redirect_targets_write
+        pairs = self.other_targets + self.simple_targets
+        base_urls = pd.Series([b for b, _ in pairs], index=range(10, 10 + len(pairs)), dtype=str)
+        targets = pd.Series([t for _, t in pairs], index=base_urls.index, dtype=str)
+        joined = urls_join(base_urls[1::2], targets[1::2])
+        self.assertEqual(joined.index.tolist(), base_urls.index[1::2].tolist())
+        self.assertEqual(joined.tolist(), [urljoin(b, t) for b, t in pairs[1::2]])
+
+
+@unittest.skipIf(duckdb is None, 'DuckDB not installed')
+class LocalBackendTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.mkdtemp()
+        cls.cc_index = os.path.join(cls.tmp_dir, 'cc-index')
+        for crawl in crawls:
+            path = os.path.join(cls.cc_index, 'crawl=' + crawl, 'subset=robotstxt')
+            os.makedirs(path)
+            pd.DataFrame(cc_index_rows(crawl)) \
+              .astype({'fetch_status': 'int32', 'warc_record_offset': 'int64',
+                       'warc_record_length': 'int32'}) \
+              .to_parquet(os.path.join(path, 'part-00000.parquet'))
+        cls.topdomains = os.path.join(cls.tmp_dir, 'topdomains.parquet')
+        topdomains.to_parquet(cls.topdomains)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp_dir)
+
+    def run_lookup(self, name: str, options: list) -> pd.DataFrame:
+        output = os.path.join(self.tmp_dir, name)
+        subprocess.run([sys.executable, script,
+                        os.path.join(output, 'captures'),
+                        os.path.join(output, 'redirects'),
+                        os.path.join(output, 'tmp'),
+                        '--backend', 'local',
+                        '--local_cc_index', self.cc_index,
+                        '--local_topdomains', self.topdomains] + options + crawls,
+                       check=True, capture_output=True)
+        # partitions are read one by one: the columns `from_*` are
+        # missing in the results of the per-crawl initial lookups
+        dfs = list()
+        for path in sorted(glob.glob(os.path.join(output, 'captures', 'crawl=*', 'redirects=*'))):
+            df = pd.read_parquet(path)
+            crawl, redirects = path.split(os.sep)[-2:]
+            df['crawl'] = crawl.split('=')[1]
+            df['redirects'] = int(redirects.split('=')[1])
+            dfs.append(df)
+        df = pd.concat(dfs, ignore_index=True)
+        return df.sort_values(['crawl', 'redirects', 'host', 'url']).reset_index(drop=True)
+
+    def check_captures(self, df: pd.DataFrame):
+        for crawl in crawls:
+            d = df[(df['crawl'] == crawl) & (df['redirects'] == 0)]
+            expected = ['a.com', 'www.b.org'] + (['c.net'] if crawl == crawls[0] else [])
+            self.assertEqual(sorted(d['host']), sorted(expected))
+            b = d[d['host'] == 'www.b.org'].iloc[0]
+            self.assertEqual(b['fetch_status'], 200)
+            # the redirect of a.com is followed
+            d = df[(df['crawl'] == crawl) & (df['redirects'] == 1)]
+            self.assertEqual(d['host'].tolist(), ['a.com'])
+            self.assertEqual(d['url'].tolist(), ['https://www.a.com/robots.txt'])
+            self.assertEqual(d['from_url'].tolist(), ['https://a.com/robots.txt'])
+            self.assertEqual(d['orig_url'].tolist(), ['https://a.com/robots.txt'])
+        # no redirects to follow at depth 1
+        self.assertEqual(sorted(df['redirects'].unique()), [0, 1])
+
+    def test_per_crawl(self):
+        self.check_captures(self.run_lookup('per-crawl', []))
+
+    def test_batched(self):
+        df = self.run_lookup('batched', ['--batch', '--batch_size', '1'])
+        self.check_captures(df)
+        # same results as the lookups per crawl
+        df_per_crawl = self.run_lookup('per-crawl-2', [])
+        columns = ['crawl', 'redirects', 'host', 'domain', 'rank', 'url', 'fetch_status',
+                   'warc_filename', 'warc_record_offset', 'from_url']
+        pd.testing.assert_frame_equal(df[columns].astype(str), df_per_crawl[columns].astype(str))
+
+
+if __name__ == '__main__':
+    unittest.main()
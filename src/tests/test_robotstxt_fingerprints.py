@@ -0,0 +1,60 @@
+"""Fingerprints of serialized rulesets do not depend on the code path
+(ruleset lines split without parsing or parsed and serialized again)
+nor on whether ujson is installed"""
+
+import json as stdlib_json
+import os
+import shutil
+import tempfile
+import unittest
+
+from unittest import mock
+
+import robotstxt_fingerprints
+import robotstxt_parser
+
+from robotstxt_fingerprints import read_serialized_rulesets, serialize_ruleset
+
+
+rulesets = [
+    {'*': {'disallow': ['/private/', '/tmp/']}},
+    {'GPTBot': {'disallow': ['/']}, '*': {'allow': ['/public/'], 'disallow': ['/']}},
+    {'*': {'disallow': ['/café/', '/\U0001f600', '/﻿', '/�', '/\x7f']}},
+    {'*': {'disallow': ['/"quoted"', '/back\\slash', '/tab\there', '/\x00\x1f']}},
+    {'botä': {'allow': ['']}},
+]
+
+
+class SerializeRulesetTest(unittest.TestCase):
+
+    def test_same_bytes_as_parser(self):
+        for ruleset in rulesets:
+            expected = robotstxt_parser.json.dumps(ruleset).encode('utf-8')
+            self.assertEqual(serialize_ruleset(ruleset), expected)
+            with mock.patch.object(robotstxt_fingerprints, 'json', stdlib_json):
+                self.assertEqual(serialize_ruleset(ruleset), expected)
+
+    def test_fallback_lines(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, 'rulesets.jsonl')
+            with open(path, 'w') as fh:
+                for i, ruleset in enumerate(rulesets):
+                    url = 'https://www.site%d.com/robots.txt' % i
+                    serialized = robotstxt_parser.json.dumps(ruleset)
+                    # written by ruleset_json, and reformatted (not split without parsing)
+                    fh.write(robotstxt_parser.ruleset_json(url, serialized) + '\n')
+                    fh.write(stdlib_json.dumps({url: ruleset}, indent=1).replace('\n', '')
+                             + '\n')
+            for json_module in (robotstxt_fingerprints.json, stdlib_json):
+                with mock.patch.object(robotstxt_fingerprints, 'json', json_module):
+                    serialized = list(read_serialized_rulesets(path))
+                self.assertEqual(len(serialized), 2 * len(rulesets))
+                for i in range(0, len(serialized), 2):
+                    self.assertEqual(serialized[i], serialized[i + 1])
+        finally:
+            shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
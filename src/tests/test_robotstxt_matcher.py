@@ -0,0 +1,135 @@
+"""Evaluate URL paths against robots.txt rulesets (RFC 9309)"""
+
+import unittest
+
+from robotstxt_matcher import RobotsTxt, Ruleset, evaluate, normalize_path, normalize_user_agent
+
+
+class RulesetTest(unittest.TestCase):
+
+    def assertAllowed(self, rules: dict, paths: dict):
+        ruleset = Ruleset(rules)
+        for path, allowed in paths.items():
+            self.assertEqual(ruleset.is_allowed(path), allowed, (rules, path))
+        self.assertEqual(ruleset.are_allowed(list(paths)), list(paths.values()))
+
+    def test_longest_match(self):
+        self.assertAllowed({'disallow': ['/a/'], 'allow': ['/a/b/']},
+                           {'/a/': False, '/a/c': False, '/a/b/': True, '/a/b/c': True,
+                            '/b/': True, '/': True})
+        self.assertAllowed({'allow': ['/a/'], 'disallow': ['/a/b/']},
+                           {'/a/c': True, '/a/b/c': False})
+
+    def test_allow_wins_ties(self):
+        self.assertAllowed({'disallow': ['/a'], 'allow': ['/a']}, {'/a': True, '/ab': True})
+        self.assertAllowed({'disallow': ['/a*'], 'allow': ['/a$']},
+                           {'/a': True, '/ab': False})
+        self.assertAllowed({'disallow': ['/*.php'], 'allow': ['/a.php']},
+                           {'/a.php': True, '/b.php': False})
+
+    def test_wildcard(self):
+        self.assertAllowed({'disallow': ['/*.php']},
+                           {'/index.php': False, '/a/b.php?x=1': False, '/index.html': True})
+        self.assertAllowed({'disallow': ['/a*b*c']},
+                           {'/abc': False, '/a/x/b/y/c/z': False, '/acb': True})
+        self.assertAllowed({'disallow': ['*']}, {'/': False, '/a': False})
+        # longer wildcard rule beats shorter prefix rule
+        self.assertAllowed({'allow': ['/a'], 'disallow': ['/a*.pdf']},
+                           {'/a/doc.pdf': False, '/a/doc.html': True})
+
+    def test_end_anchor(self):
+        self.assertAllowed({'disallow': ['/a$']}, {'/a': False, '/a/': True, '/ab': True})
+        self.assertAllowed({'disallow': ['/*.pdf$']},
+                           {'/a.pdf': False, '/a.pdf?x': True, '/a.pdfx': True})
+        self.assertAllowed({'disallow': ['/'], 'allow': ['/$']},
+                           {'/': True, '/a': False})
+
+    def test_empty_disallow(self):
+        self.assertAllowed({'disallow': ['']}, {'/': True, '/a': True})
+        self.assertAllowed({'disallow': ['', '/b']}, {'/a': True, '/b': False})
+        self.assertAllowed({}, {'/a': True})
+
+    def test_robotstxt_always_allowed(self):
+        self.assertAllowed({'disallow': ['/']}, {'/robots.txt': True, '': False, '/x': False})
+        self.assertAllowed({'disallow': ['/x']}, {'': True})
+
+    def test_percent_encoding(self):
+        self.assertEqual(normalize_path('/a%3cb'), '/a%3Cb')
+        self.assertEqual(normalize_path('/café'), '/caf%C3%A9')
+        self.assertEqual(normalize_path('/a b'), '/a%20b')
+        self.assertEqual(normalize_path('/100%'), '/100%')
+        # case of the hex digits does not matter
+        self.assertAllowed({'disallow': ['/a%3cb']}, {'/a%3Cb': False, '/a%3cb': False,
+                                                      '/a<b': True})
+        self.assertAllowed({'disallow': ['/a%3Cb']}, {'/a%3cb': False})
+        # non-ASCII characters are compared percent-encoded
+        self.assertAllowed({'disallow': ['/café']}, {'/caf%C3%A9/': False, '/caf%c3%a9': False,
+                                                     '/café/menu': False, '/cafe': True})
+        self.assertAllowed({'disallow': ['/caf%c3%a9*$']}, {'/café': False})
+
+
+class RobotsTxtTest(unittest.TestCase):
+
+    robotstxt = RobotsTxt({
+        '*': {'disallow': ['/private/']},
+        'Googlebot': {'disallow': ['/nogoogle/']},
+        'googlebot-news': {'allow': ['/'], 'disallow': ['/archive/']},
+        'GPTBot': {'disallow': ['/']},
+        'gptbot': {'allow': ['/public/']},
+    })
+
+    def test_normalize_user_agent(self):
+        self.assertEqual(normalize_user_agent('Googlebot/2.1'), 'googlebot')
+        self.assertEqual(normalize_user_agent(' GPTBot '), 'gptbot')
+        self.assertEqual(normalize_user_agent('*'), '*')
+        self.assertEqual(normalize_user_agent('Googlebot-News'), 'googlebot-news')
+
+    def test_group_selection(self):
+        is_allowed = self.robotstxt.is_allowed
+        # the group matching the product token is used, not the wildcard group
+        self.assertTrue(is_allowed('Googlebot/2.1', '/private/'))
+        self.assertFalse(is_allowed('Googlebot/2.1', '/nogoogle/'))
+        self.assertFalse(is_allowed('Googlebot-News', '/archive/'))
+        self.assertTrue(is_allowed('Googlebot-News', '/nogoogle/'))
+        # other crawlers: wildcard group
+        self.assertFalse(is_allowed('CCBot/2.0', '/private/'))
+        self.assertTrue(is_allowed('CCBot/2.0', '/nogoogle/'))
+
+    def test_groups_merged(self):
+        # groups addressing the same user-agent are merged
+        self.assertFalse(self.robotstxt.is_allowed('GPTBot', '/private/'))
+        self.assertTrue(self.robotstxt.is_allowed('GPTBot', '/public/page'))
+
+    def test_no_wildcard_group(self):
+        robotstxt = RobotsTxt({'GPTBot': {'disallow': ['/']}})
+        self.assertFalse(robotstxt.is_allowed('GPTBot', '/a'))
+        self.assertTrue(robotstxt.is_allowed('CCBot', '/a'))
+
+    def test_not_shared(self):
+        n_shared = len(RobotsTxt._compiled)
+        robotstxt = RobotsTxt({'*': {'disallow': ['/not-shared/']}}, shared=False)
+        self.assertFalse(robotstxt.is_allowed('CCBot', '/not-shared/'))
+        self.assertEqual(len(RobotsTxt._compiled), n_shared)
+
+
+class EvaluateTest(unittest.TestCase):
+
+    def test_evaluate(self):
+        robotstxts = {
+            'www.example.com': RobotsTxt({'*': {'disallow': ['/private/']},
+                                          'GPTBot': {'disallow': ['/']}}),
+            'example.org': RobotsTxt({}),
+        }
+        queries = [('www.example.com', 'CCBot', '/'),
+                   ('www.example.com', 'GPTBot', '/'),
+                   ('www.example.com', 'CCBot', '/private/x'),
+                   ('example.org', 'GPTBot', '/private/x'),
+                   ('unknown.net', 'CCBot', '/'),
+                   ('www.example.com', 'CCBot', '/public/')]
+        self.assertEqual(evaluate(robotstxts, queries),
+                         [True, False, False, True, None, True])
+        self.assertEqual(evaluate(robotstxts, []), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+"""Parity of the single-pass tokenizer with the regex cascade it
+replaced (see `benchmark/reference.py`)"""
+
+import unittest
+
+import robotstxt_parser
+
+from benchmark import synthetic
+from benchmark.reference import tokenize_regex_cascade
+
+
+# lines covering the edge cases, joined by `\n` or `\r\n`
+edge_case_lines = [
+    b'User-agent: *',
+    b'user-agent:GPTBot',
+    b'  USER-AGENT  :   CCBot   ',
+    b'Disallow: /private/  # comment',
+    b'Disallow:',
+    b'Disallow: #',
+    b'Allow: /a b\tc',
+    b'Allow:\t/tab\t',
+    b'Disallow: /a\t\t b',
+    b'Disallow: /nbsp\xc2\xa0value\xc2\xa0',
+    b'Disallow: /\xef\xbb\xbfbom-in-value',
+    b'\xef\xbb\xbfDisallow: /bom-at-line-start',
+    b'Disallow: /caf\xc3\xa9/',
+    b'Disallow: /latin1-caf\xe9/',
+    b'Disallow: /invalid\xff\xfe\x80',
+    b'Crawl-delay: 10',
+    b'Sitemap: https://www.example.com/sitemap.xml',
+    b'Clean-param: ref /articles/',
+    b'Host: www.example.com',
+    b'hostname: www.example.com',
+    b'Noindex: /tmp/',
+    b'Request-rate: 1/10',
+    b'Disalow: /typo/',
+    b'a-b-: unknown',
+    b'a-b: unknown directive',
+    b'_x_: underscore',
+    b'x-robots-tag : noindex',
+    b'<meta name="robots" content="noindex">',
+    b'\xff\xfe: not utf-8',
+    b'no colon at all',
+    b'# comment',
+    b'   # indented comment',
+    b'',
+    b'   ',
+    b'\t',
+    b'User-agent: *',
+]
+
+
+class TokenizeParityTest(unittest.TestCase):
+
+    def assertParity(self, payload: bytes):
+        self.assertEqual(list(robotstxt_parser.tokenize(payload)),
+                         list(tokenize_regex_cascade(payload)), payload)
+
+    def test_edge_cases(self):
+        for line_break in (b'\n', b'\r\n'):
+            payload = line_break.join(edge_case_lines)
+            self.assertParity(payload)
+            self.assertParity(payload + line_break)
+
+    def test_single_lines(self):
+        for line in edge_case_lines:
+            for line_break in (b'', b'\n', b'\r\n'):
+                self.assertParity(line + line_break)
+
+    def test_empty_payload(self):
+        self.assertParity(b'')
+
+    def test_synthetic_payloads(self):
+        for kind in synthetic.robotstxt_kinds:
+            if kind == 'cr_only':
+                continue
+            for payload in synthetic.robotstxt_bodies(20, 0, kind):
+                if payload.startswith(robotstxt_parser.bom):
+                    payload = payload[3:]
+                self.assertParity(payload)
+
+    def test_cr_line_breaks(self):
+        # intended difference: bare `\r` is a line break
+        payload = b'User-agent: *\rDisallow: /private/\rAllow: /\r'
+        self.assertEqual(list(robotstxt_parser.tokenize(payload)),
+                         [('user-agent', '*'), ('disallow', '/private/'), ('allow', '/')])
+        # the regex cascade sees one line, the value ends at the first `\r`
+        self.assertEqual(list(tokenize_regex_cascade(payload)), [('user-agent', '*')])
+
+
+if __name__ == '__main__':
+    unittest.main()
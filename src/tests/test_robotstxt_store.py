@@ -0,0 +1,127 @@
+"""Build a robots.txt store from a small capture table and rulesets,
+and look up hosts, ranges of hosts and rules"""
+
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+
+import pandas as pd
+import zstandard
+
+import robotstxt_parser
+
+from robotstxt_fingerprints import rulesets_path
+from robotstxt_matcher import RobotsTxt
+from robotstxt_store import RobotstxtStore, build_store
+
+
+crawls = ['CC-MAIN-2025-05', 'CC-MAIN-2025-08']
+hosts = ['www.b.com', 'www.a.com', 'www.c.org']
+
+
+def ruleset(crawl: str, host: str) -> dict:
+    # the rules of www.a.com for GPTBot change in the second crawl
+    gptbot = ['/news/'] if (host == 'www.a.com' and crawl == crawls[0]) else ['/']
+    return {'*': {'disallow': ['/private/']},
+            'GPTBot': {'allow': ['/public/'], 'disallow': gptbot}}
+
+
+class RobotstxtStoreTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        logging.disable(logging.CRITICAL)
+        cls.tmp_dir = tempfile.mkdtemp()
+        rulesets_location = os.path.join(cls.tmp_dir, 'rulesets')
+        os.makedirs(rulesets_location)
+        rows = list()
+        for crawl in crawls:
+            with open(rulesets_path(crawl, rulesets_location), 'wb') as fh:
+                with zstandard.ZstdCompressor().stream_writer(fh) as writer:
+                    for rank, host in enumerate(hosts, 1):
+                        url = 'https://%s/robots.txt' % host
+                        serialized = robotstxt_parser.json.dumps(ruleset(crawl, host))
+                        writer.write((robotstxt_parser.ruleset_json(url, serialized)
+                                      + '\n').encode('utf-8'))
+                        rows.append((crawl, host, rank, url, 200, None, 'text/plain',
+                                     'text/plain'))
+            # capture without robots.txt rules
+            rows.append((crawl, 'www.d.net', 4, 'https://www.d.net/robots.txt', 404,
+                         None, 'text/html', 'text/html'))
+        captures_location = os.path.join(cls.tmp_dir, 'captures')
+        pd.DataFrame(rows, columns=['crawl', 'host', 'rank', 'url', 'fetch_status',
+                                    'fetch_redirect', 'content_mime_type',
+                                    'content_mime_detected']) \
+          .to_parquet(captures_location, partition_cols=['crawl'])
+        cls.store_path = os.path.join(cls.tmp_dir, 'store')
+        cls.meta = build_store(list(reversed(crawls)), captures_location, rulesets_location,
+                               cls.store_path)
+
+    @classmethod
+    def tearDownClass(cls):
+        logging.disable(logging.NOTSET)
+        shutil.rmtree(cls.tmp_dir)
+
+    def setUp(self):
+        self.store = RobotstxtStore(self.store_path)
+
+    def test_meta(self):
+        self.assertEqual(self.meta['crawls'], crawls)
+        self.assertEqual(self.meta['hosts'], 4)
+        self.assertEqual(self.meta['captures'], 8)
+        # identical rulesets are stored once
+        self.assertEqual(self.meta['rulesets'], 2)
+
+    def test_lookup(self):
+        captures = self.store.lookup('www.a.com')
+        self.assertEqual([c.crawl for c in captures], crawls)
+        self.assertEqual(captures[0].rank, 2)
+        self.assertEqual(captures[0].url, 'https://www.a.com/robots.txt')
+        for capture in captures:
+            self.assertEqual(self.store.ruleset(capture.ruleset),
+                             ruleset(capture.crawl, 'www.a.com'))
+        self.assertEqual([c.crawl for c in self.store.lookup('www.a.com', crawls[1])],
+                         crawls[1:])
+        self.assertEqual([c.crawl for c in self.store.lookup('www.a.com', None, crawls[0])],
+                         crawls[:1])
+        self.assertEqual(self.store.lookup('www.example.com'), [])
+
+    def test_no_ruleset(self):
+        capture = self.store.lookup('www.d.net', crawls[0], crawls[0])[0]
+        self.assertEqual(capture.fetch_status, 404)
+        self.assertIsNone(capture.ruleset)
+        self.assertIsNone(capture.fetch_redirect)
+        self.assertEqual(self.store.rules_for(capture, 'GPTBot'), (None, {}))
+        self.assertIsNone(self.store.is_allowed(capture, 'GPTBot', '/'))
+
+    def test_range(self):
+        captures = list(self.store.range('www.a', 'www.c'))
+        self.assertEqual([(c.host, c.crawl) for c in captures],
+                         [(h, c) for h in ('www.a.com', 'www.b.com') for c in crawls])
+
+    def test_rules(self):
+        first, second = self.store.lookup('www.a.com')
+        self.assertEqual(self.store.rules_for(first, 'GPTBot/1.0'),
+                         ('gptbot', {'allow': ['/public/'], 'disallow': ['/news/']}))
+        self.assertEqual(self.store.rules_for(first, 'CCBot'),
+                         ('*', {'disallow': ['/private/']}))
+        self.assertFalse(self.store.is_allowed(first, 'GPTBot', '/news/today'))
+        self.assertTrue(self.store.is_allowed(first, 'GPTBot', '/sports/'))
+        self.assertFalse(self.store.is_allowed(second, 'GPTBot', '/sports/'))
+        self.assertTrue(self.store.is_allowed(second, 'GPTBot', '/public/'))
+        self.assertTrue(self.store.is_allowed(second, 'CCBot', '/sports/'))
+
+    def test_compiled_rulesets_bounded(self):
+        store = RobotstxtStore(self.store_path, max_compiled=1)
+        n_shared = len(RobotsTxt._compiled)
+        for _ in range(3):
+            for capture in store.range('www.a', 'www.d'):
+                store.is_allowed(capture, 'GPTBot', '/sports/')
+        self.assertEqual(len(store.compiled), 1)
+        self.assertEqual(len(RobotsTxt._compiled), n_shared)
+
+
+if __name__ == '__main__':
+    unittest.main()